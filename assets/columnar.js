@@ -0,0 +1,79 @@
+/**
+ * Columnar v1 - decoder for the binary record exports (columnar.py)
+ *   const docs = await Columnar.load('docs');  // docs.bin, else docs.json
+ */
+
+(function () {
+    const TYPES = { u8: Uint8Array, u16: Uint16Array, u32: Uint32Array, f64: Float64Array };
+    const bit = (bits, i) => (bits[i >> 3] >> (i & 7)) & 1;
+
+    // ArrayBuffer -> { rows, names, columns: { name: Array } }
+    const decode = (buffer) => {
+        const view = new DataView(buffer);
+        if (String.fromCharCode(...new Uint8Array(buffer, 0, 4)) !== 'ECOL') throw new Error('Not a columnar file');
+        const headerLen = view.getUint32(4, true);
+        const utf8 = new TextDecoder();
+        const header = JSON.parse(utf8.decode(new Uint8Array(buffer, 8, headerLen)));
+        const base = 8 + headerLen;
+        const n = header.rows;
+        const array = (b) => new TYPES[b.type](buffer, base + b.offset, b.length);
+
+        const columns = {};
+        const present = {};
+        for (const col of header.columns) {
+            const out = new Array(n);
+            if (col.present) present[col.name] = array(col.present);
+            if (col.kind === 'dict') {
+                const codes = array(col.codes);
+                for (let i = 0; i < n; i++) out[i] = codes[i] ? col.values[codes[i] - 1] : null;
+            } else if (col.kind === 'str' || col.kind === 'json') {
+                const offsets = array(col.offsets);
+                const text = utf8.decode(array(col.data));
+                const nulls = col.nulls ? array(col.nulls) : null;
+                const parse = col.kind === 'json' ? JSON.parse : (s) => s;
+                for (let i = 0; i < n; i++) {
+                    out[i] = nulls && bit(nulls, i) ? null : parse(text.substring(offsets[i], offsets[i + 1]));
+                }
+            } else if (col.kind === 'num') {
+                const values = array(col.values);
+                for (let i = 0; i < n; i++) out[i] = Number.isNaN(values[i]) ? null : values[i];
+            } else if (col.kind === 'bool') {
+                const bits = array(col.bits);
+                for (let i = 0; i < n; i++) out[i] = bit(bits, i) === 1;
+            } else {
+                throw new Error(`Columnar: unknown column kind ${col.kind}`);
+            }
+            columns[col.name] = out;
+        }
+        return { rows: n, names: header.columns.map(c => c.name), columns, present };
+    };
+
+    // Columns back to the record objects the JSON export holds
+    const toRecords = (table) => {
+        const records = new Array(table.rows);
+        for (let i = 0; i < table.rows; i++) {
+            const record = {};
+            for (const name of table.names) {
+                const present = table.present[name];
+                if (present && !bit(present, i)) continue;
+                record[name] = table.columns[name][i];
+            }
+            records[i] = record;
+        }
+        return records;
+    };
+
+    const load = async (name) => {
+        try {
+            const res = await fetch(`${name}.bin`);
+            if (res.ok) return toRecords(decode(await res.arrayBuffer()));
+        } catch (e) {
+            console.warn(`Columnar: ${name}.bin unavailable, using JSON`, e);
+        }
+        const res = await fetch(`${name}.json`);
+        if (!res.ok) throw new Error(`${name}.json: ${res.status}`);
+        return res.json();
+    };
+
+    window.Columnar = { decode, toRecords, load };
+})();
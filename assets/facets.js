@@ -0,0 +1,110 @@
+/**
+ * Facets v1 - bitmap facet index over docs.json (facets.py)
+ *   const facets = await Facets.load();
+ *   const mask = facets.mask({ topic: 'Alchemy', period: ['Medieval', 'Renaissance'] });
+ *   facets.rows(mask)            -> docs.json positions
+ *   facets.counts(mask, 'period') -> [{ label, value }]
+ */
+
+(function () {
+    const popcount = (x) => {
+        x -= (x >>> 1) & 0x55555555;
+        x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+        return (((x + (x >>> 4)) & 0x0F0F0F0F) * 0x01010101) >>> 24;
+    };
+
+    const decodeBitmap = (b64) => {
+        const bin = atob(b64);
+        const bytes = new Uint8Array(bin.length);
+        for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+        return new Uint32Array(bytes.buffer);
+    };
+
+    class FacetIndex {
+        constructor(data) {
+            this.docs = data.docs;
+            this.check = data.check;
+            this.dimensions = data.dimensions;
+            this.values = data.values;
+            this.cells = data.cells;
+            this.words = (data.docs + 31) >>> 5;
+            this.bitmaps = {};
+            for (const dim of data.dimensions) this.bitmaps[dim] = data.bitmaps[dim].map(decodeBitmap);
+        }
+
+        // True when docs[] is the catalogue these bitmaps were built against
+        aligned(docs) {
+            return docs.length >= this.docs && (this.docs === 0 ||
+                (docs[0].id === this.check.first && docs[this.docs - 1].id === this.check.last));
+        }
+
+        // { dim: value | [values] }: OR within a dimension, AND across dimensions
+        mask(selection = {}) {
+            const out = new Uint32Array(this.words).fill(0xFFFFFFFF);
+            if (this.docs & 31) out[this.words - 1] = (1 << (this.docs & 31)) - 1;
+            for (const [dim, picked] of Object.entries(selection)) {
+                if (picked == null || !this.bitmaps[dim]) continue;
+                const union = new Uint32Array(this.words);
+                for (const value of [].concat(picked)) {
+                    const k = this.values[dim].indexOf(value);
+                    if (k < 0) continue;
+                    const bits = this.bitmaps[dim][k];
+                    for (let w = 0; w < this.words; w++) union[w] |= bits[w];
+                }
+                for (let w = 0; w < this.words; w++) out[w] &= union[w];
+            }
+            return out;
+        }
+
+        rows(mask) {
+            const out = [];
+            for (let w = 0; w < this.words; w++) {
+                let word = mask[w];
+                while (word) {
+                    const low = word & -word;
+                    out.push((w << 5) + 31 - Math.clz32(low));
+                    word ^= low;
+                }
+            }
+            return out;
+        }
+
+        size(mask) {
+            let n = 0;
+            for (let w = 0; w < this.words; w++) n += popcount(mask[w]);
+            return n;
+        }
+
+        // Documents per value of `dim` within the mask
+        counts(mask, dim) {
+            return this.values[dim].map((label, k) => {
+                const bits = this.bitmaps[dim][k];
+                let value = 0;
+                for (let w = 0; w < this.words; w++) value += popcount(mask[w] & bits[w]);
+                return { label, value };
+            });
+        }
+
+        // Exact count for a selection from the cube cells alone
+        count(selection = {}) {
+            const wanted = this.dimensions.map(dim => {
+                const picked = selection[dim];
+                return picked == null ? null : new Set([].concat(picked).map(v => this.values[dim].indexOf(v)));
+            });
+            return this.cells.reduce((sum, cell) =>
+                wanted.every((set, d) => !set || set.has(cell[d])) ? sum + cell[cell.length - 1] : sum, 0);
+        }
+    }
+
+    const load = async (url = 'facets.json') => {
+        try {
+            const res = await fetch(url);
+            return res.ok ? new FacetIndex(await res.json()) : null;
+        } catch (e) {
+            console.warn('Facets: index unavailable', e);
+            return null;
+        }
+    };
+
+    window.Facets = { load, FacetIndex };
+})();
@@ -4,6 +4,7 @@
 
 (function () {
     let omniIndex = { items: [] };
+    let searchIndex = null; // Compact prefix/trigram index (build_omni_index.py)
     let fuse = null;
     let isOpen = false;
     let selectedIndex = 0;
@@ -75,6 +76,14 @@
             // Adjust path based on current window location
             const depth = window.location.pathname.split('/').filter(p => p).length;
             const prefix = window.location.pathname.includes('docs/') ? '../' : '';
+            const sRes = await fetch(prefix + 'data/snapshots/omni_search_index.json');
+            if (sRes.ok) {
+                searchIndex = await sRes.json();
+                filteredItems = searchIndex.items.slice(0, 10).map(toItem);
+                renderResults();
+                return;
+            }
+            // Older snapshots only ship the flat index
             const res = await fetch(prefix + 'data/snapshots/omni_index.json');
             if (res.ok) {
                 omniIndex = await res.json();
@@ -84,6 +93,76 @@
         } catch (e) { console.error("Failed to load Omni Index", e); }
     };
 
+    // --- Indexed Search ---
+    // Items are pre-sorted by boost, so posting lists are already ranked.
+    // A keystroke costs one prefix lookup plus a bounded verification pass;
+    // trigram overlap fills in typo-tolerant matches when prefixes run dry.
+    const toItem = (row) => ({ id: row[0], kind: row[1], title: row[2], subtitle: row[3], route: row[4] });
+
+    const tokenize = (text) => (text || '').toLowerCase().normalize('NFKD')
+        .replace(/[\u0300-\u036f]/g, '').match(/[\p{L}\p{N}]+/gu) || [];
+
+    const hasWordPrefix = (text, token) => text.startsWith(token) || text.includes(' ' + token);
+
+    const trigramsOf = (text) => {
+        const padded = `  ${text} `;
+        const grams = new Set();
+        for (let i = 0; i < padded.length - 2; i++) grams.add(padded.slice(i, i + 3));
+        return grams;
+    };
+
+    // Enough of a token's trigrams appear in the text to count as a typo of one of its words
+    const minShared = (grams) => Math.max(2, Math.ceil(grams.size * 0.4));
+    const fuzzyHas = (textGrams, grams) => {
+        let n = 0;
+        grams.forEach(g => { if (textGrams.has(g)) n++; });
+        return n >= minShared(grams);
+    };
+
+    const searchIndexed = (query, limit = 15) => {
+        const tokens = tokenize(query);
+        if (tokens.length === 0) return searchIndex.items.slice(0, 10).map(toItem);
+
+        // Lead with the token whose full posting list is shortest; the rest are verified per candidate.
+        // Prefixes under prefix_full chars are truncated, so they only lead when nothing else can.
+        const full = searchIndex.prefix_full || Infinity;
+        const postings = (t) => searchIndex.prefixes[t.slice(0, searchIndex.prefix_max)] || [];
+        const lead = tokens.reduce((a, b) => {
+            const aFull = a.length >= full, bFull = b.length >= full;
+            if (aFull !== bFull) return bFull ? b : a;
+            if (!bFull) return b.length > a.length ? b : a;
+            return postings(b).length < postings(a).length ? b : a;
+        });
+        const results = [];
+        for (const i of postings(lead)) {
+            if (tokens.every(t => hasWordPrefix(searchIndex.items[i][6], t))) {
+                results.push(i);
+                if (results.length >= limit) break;
+            }
+        }
+
+        if (results.length < limit) {
+            const grams = trigramsOf(tokens.join(' '));
+            const tokenGrams = tokens.map(trigramsOf);
+            const shared = new Map();
+            grams.forEach(g => (searchIndex.trigrams[g] || []).forEach(i => shared.set(i, (shared.get(i) || 0) + 1)));
+            const seen = new Set(results);
+            // Every token must still match, exactly or as a near-miss, so extra words narrow the results
+            const verified = (i) => {
+                const text = searchIndex.items[i][6];
+                const textGrams = trigramsOf(text);
+                return tokens.every((t, k) => hasWordPrefix(text, t) || fuzzyHas(textGrams, tokenGrams[k]));
+            };
+            [...shared.entries()]
+                .filter(([i, n]) => n >= minShared(grams) && !seen.has(i))
+                .sort((a, b) => b[1] - a[1] || a[0] - b[0])
+                .filter(([i]) => verified(i))
+                .slice(0, limit - results.length)
+                .forEach(([i]) => results.push(i));
+        }
+        return results.map(i => toItem(searchIndex.items[i]));
+    };
+
     const togglePalette = () => {
         const overlay = document.getElementById('omni-overlay');
         isOpen = !isOpen;
@@ -96,7 +175,9 @@
     };
 
     const updateResults = (query) => {
-        if (!query) {
+        if (searchIndex) {
+            filteredItems = searchIndexed(query);
+        } else if (!query) {
             filteredItems = omniIndex.items.slice(0, 10);
         } else {
             const q = query.toLowerCase();
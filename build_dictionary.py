@@ -1,9 +1,18 @@
+import os
 import sqlite3
 import json
 import re
 import uuid
+import argparse
 
-DB_PATH = "esoteric_v5.db"
+from scan import init_chunk_index
+from instrumentation import profiling
+import settings
+
+DB_PATH = settings.LEXICON_DB
+CORPUS_DB = settings.DB_PATH  # scan.py writes chunks (and chunks_fts) to the main database
+EVIDENCE_PER_ENTRY = 3   # Context windows kept per headword (one per document)
+CONTEXT_TOKENS = 32      # Snippet width around the match
 
 # Heuristic Keywords
 STAGES = {
@@ -39,9 +48,92 @@ def classify_meaning(text):
     if spir > phys: return "Spiritual"
     return "Ambivalent"
 
-def build_dictionary():
+# ---------------------------------------------------------
+# Corpus Evidence
+# ---------------------------------------------------------
+# Every headword and its synonyms become one FTS5 query
+# against the chunks_fts index (see scan.init_chunk_index):
+# each term is an index lookup ranked by bm25, not a scan of
+# the corpus, and all citations land in one executemany.
+# The chunks live in the main database (CORPUS_DB), the
+# entries in the lexicon; each side gets its own connection.
+# ---------------------------------------------------------
+
+EVIDENCE_SQL = '''
+    SELECT c.doc_id, snippet(chunks_fts, 0, '', '', '…', ?)
+    FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+    WHERE chunks_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+'''
+
+def fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def open_corpus(corpus_path=CORPUS_DB):
+    """Connection to the database holding chunks, with chunks_fts ready; None if there are no chunks yet."""
+    if not os.path.exists(corpus_path):
+        return None
+    corpus = sqlite3.connect(corpus_path)
+    if not corpus.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks'").fetchone():
+        corpus.close()
+        return None
+    init_chunk_index(corpus)
+    return corpus
+
+def harvest_evidence(conn, per_entry=EVIDENCE_PER_ENTRY, corpus_path=CORPUS_DB):
+    """Replaces the corpus citations of every entry with its best-ranked context windows."""
+    corpus = open_corpus(corpus_path)
+    if corpus is None:
+        print(f"⚠️ No chunks in {corpus_path} (run scan.py --enrich); corpus citations left as they are.")
+        return 0, 0
+    try:
+        return collect_evidence(conn, corpus, per_entry)
+    finally:
+        corpus.close()
+
+def collect_evidence(conn, corpus, per_entry):
+    cursor = conn.cursor()
+    search = corpus.cursor()
+
+    cursor.execute("SELECT id, headword FROM dictionary_entries")
+    terms = {entry_id: [headword] for entry_id, headword in cursor.fetchall() if headword}
+    cursor.execute("SELECT entry_id, synonym FROM entry_synonyms")
+    for entry_id, synonym in cursor.fetchall():
+        if entry_id in terms and synonym:
+            terms[entry_id].append(synonym)
+
+    rows = []
+    for entry_id, words in terms.items():
+        phrases = [fts_phrase(w.strip()) for w in dict.fromkeys(words) if re.search(r"\w", w)]
+        if not phrases:
+            continue
+        search.execute(EVIDENCE_SQL, (CONTEXT_TOKENS, " OR ".join(phrases), per_entry * 4))
+        seen_docs = set()
+        for doc_id, context in search.fetchall():
+            if doc_id in seen_docs:
+                continue
+            seen_docs.add(doc_id)
+            rows.append((entry_id, doc_id, context, None, "Corpus"))
+            if len(seen_docs) == per_entry:
+                break
+
+    cursor.executemany("DELETE FROM entry_sources WHERE entry_id = ? AND source_type = 'Corpus'", [(e,) for e in terms])
+    cursor.executemany('''
+        INSERT INTO entry_sources (entry_id, doc_id, citation_text, page_reference, source_type)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return len(terms), len(rows)
+
+def build_dictionary(evidence_only=False):
     print("Synthesizing Dictionary Entries...")
     conn = sqlite3.connect(DB_PATH)
+    if evidence_only:
+        entries, citations = harvest_evidence(conn)
+        print(f"Harvested {citations} corpus citations for {entries} entries.")
+        conn.close()
+        return
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -101,12 +193,19 @@ def build_dictionary():
             "Antigravity V7 Engine"
         ))
         
-        # Link back to raw entity for source tracking (simulated)
-        # In V7 full implementation, we'd insert into entry_sources here
-        
     conn.commit()
+
+    # 2. Link entries back to the corpus through entry_sources
+    conn.row_factory = None
+    entries, citations = harvest_evidence(conn)
+    print(f"Harvested {citations} corpus citations for {entries} entries.")
+
     conn.close()
     print("Dictionary Build Complete.")
 
 if __name__ == "__main__":
-    build_dictionary()
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--evidence-only", action="store_true", help="Only refresh corpus citations in entry_sources")
+        args = parser.parse_args()
+        build_dictionary(evidence_only=args.evidence_only)
@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+
+# ---------------------------------------------------------
+# Run Checkpoints
+# ---------------------------------------------------------
+# Long runs (scan --enrich, mine_images) record themselves in
+# `runs` and every finished file in `run_files`. File marks
+# go in the same transaction as that batch's data rows, so
+# after a crash the database holds exactly the batches whose
+# files are marked done. `--resume` picks up the newest
+# unfinished run with the same parameters and skips its done
+# files; writers are idempotent per file, so a batch that
+# was half-written and rolled back is simply redone.
+# ---------------------------------------------------------
+
+BATCH_FILES = 100
+
+def init_runs_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        script TEXT,
+        params TEXT,
+        status TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        files_done INTEGER DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS run_files (
+        run_id INTEGER,
+        file_key TEXT,
+        status TEXT,
+        finished_at TEXT,
+        PRIMARY KEY (run_id, file_key),
+        FOREIGN KEY(run_id) REFERENCES runs(id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_runs_script ON runs(script, status)")
+    conn.commit()
+
+class Checkpoint:
+    """One run's progress; call done()/failed() per file and commit() per batch."""
+    def __init__(self, conn, script, params, resume=False, batch=BATCH_FILES):
+        init_runs_schema(conn)
+        self.conn = conn
+        self.batch = batch
+        self.pending = []
+        self.completed = set()
+        params = json.dumps(params, sort_keys=True)
+        cursor = conn.cursor()
+
+        self.run_id = None
+        if resume:
+            cursor.execute('''
+                SELECT id FROM runs WHERE script = ? AND params = ? AND status != 'completed'
+                ORDER BY id DESC LIMIT 1
+            ''', (script, params))
+            row = cursor.fetchone()
+            if row:
+                self.run_id = row[0]
+                cursor.execute("SELECT file_key FROM run_files WHERE run_id = ? AND status = 'done'", (self.run_id,))
+                self.completed = {r[0] for r in cursor.fetchall()}
+                cursor.execute("UPDATE runs SET status = 'running' WHERE id = ?", (self.run_id,))
+                print(f"Resuming run #{self.run_id}: {len(self.completed)} files already done.")
+            else:
+                print(f"No unfinished {script} run with these parameters; starting fresh.")
+        if self.run_id is None:
+            cursor.execute("INSERT INTO runs (script, params, status, started_at) VALUES (?, ?, 'running', ?)",
+                           (script, params, datetime.now().isoformat()))
+            self.run_id = cursor.lastrowid
+        conn.commit()
+
+    def is_done(self, key):
+        return key in self.completed
+
+    def done(self, key):
+        self.pending.append((self.run_id, key, "done", datetime.now().isoformat()))
+        if len(self.pending) >= self.batch:
+            self.commit()
+
+    def failed(self, key):
+        # Recorded for the audit trail; failed files are retried on resume
+        self.pending.append((self.run_id, key, "error", datetime.now().isoformat()))
+
+    def commit(self):
+        """Marks the pending files and commits them together with the caller's writes."""
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+            INSERT INTO run_files (run_id, file_key, status, finished_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(run_id, file_key) DO UPDATE SET status = excluded.status, finished_at = excluded.finished_at
+        ''', self.pending)
+        self.completed.update(key for _, key, status, _ in self.pending if status == "done")
+        cursor.execute("UPDATE runs SET files_done = ? WHERE id = ?", (len(self.completed), self.run_id))
+        self.conn.commit()
+        self.pending = []
+
+    def finish(self, status="completed"):
+        self.commit()
+        self.conn.execute("UPDATE runs SET status = ?, finished_at = ? WHERE id = ?",
+                          (status, datetime.now().isoformat(), self.run_id))
+        self.conn.commit()
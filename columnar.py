@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import math
+import struct
+import argparse
+
+# ---------------------------------------------------------
+# Columnar Export
+# ---------------------------------------------------------
+# A compact binary twin of a JSON list of records (docs.json
+# -> docs.bin), decoded in the browser by assets/columnar.js.
+# Each key becomes one column:
+#   dict  low-cardinality strings (topic, period, author):
+#         the distinct values once, then one u8/u16/u32 code
+#         per row (0 = null)
+#   str   other strings: one UTF-8 blob + u32 offsets in
+#         UTF-16 units, so the decoder runs TextDecoder once
+#         per column and slices with substring()
+#   num   f64 per row, NaN = null
+#   bool  one bit per row
+#   json  anything else (lists, objects, mixed types, ints
+#         beyond 2^53): each value as JSON text, stored like
+#         a str column and parsed back on decode
+# Layout: "ECOL" | u32 header length | JSON header | buffers,
+# each 8-byte aligned so typed arrays view the response
+# directly. Keys missing from some rows get a presence
+# bitmap and are left off those rows again when decoded.
+# docs.json is still written for anything that wants JSON.
+# ---------------------------------------------------------
+
+MAGIC = b"ECOL"
+VERSION = 1
+DICT_RATIO = 0.5        # A string column is dictionary-encoded when distinct/rows <= this
+MAX_EXACT_INT = 2 ** 53 # Larger ints do not survive f64
+
+def pad8(n):
+    return (8 - n % 8) % 8
+
+def is_number(v):
+    if isinstance(v, bool):
+        return False
+    return isinstance(v, float) or (isinstance(v, int) and abs(v) <= MAX_EXACT_INT)
+
+def column_kind(values):
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, bool) for v in present):
+        return "bool"
+    if present and all(is_number(v) for v in present):
+        return "num"
+    if not all(isinstance(v, str) for v in present):
+        return "json"
+    distinct = len(set(present))
+    return "dict" if distinct <= max(1, len(values) * DICT_RATIO) else "str"
+
+def code_type(size):
+    if size < 0xFF:
+        return "u8", "B"
+    if size < 0xFFFF:
+        return "u16", "H"
+    return "u32", "I"
+
+def encode_table(rows):
+    """Encodes a list of dicts into the columnar layout; returns bytes."""
+    names = []
+    for row in rows:
+        for key in row:
+            if key not in names:
+                names.append(key)
+
+    n = len(rows)
+    body = bytearray()
+    columns = []
+
+    def add_buffer(data, type_name, length):
+        body.extend(b"\0" * pad8(len(body)))
+        offset = len(body)
+        body.extend(data)
+        return {"offset": offset, "type": type_name, "length": length}
+
+    for name in names:
+        values = [row.get(name) for row in rows]
+        col = {"name": name, "kind": column_kind(values)}
+        if any(name not in row for row in rows):
+            present = bytearray((n + 7) // 8)
+            for i, row in enumerate(rows):
+                if name in row:
+                    present[i >> 3] |= 1 << (i & 7)
+            col["present"] = add_buffer(bytes(present), "u8", len(present))
+
+        if col["kind"] == "dict":
+            col["values"] = sorted(set(str(v) for v in values if v is not None))
+            codes = {v: i + 1 for i, v in enumerate(col["values"])}
+            type_name, fmt = code_type(len(codes))
+            data = struct.pack(f"<{n}{fmt}", *[0 if v is None else codes[str(v)] for v in values])
+            col["codes"] = add_buffer(data, type_name, n)
+        elif col["kind"] in ("str", "json"):
+            if col["kind"] == "json":
+                values = [None if v is None else json.dumps(v, separators=(",", ":"), ensure_ascii=False) for v in values]
+            blob, offsets, nulls = [], [0], bytearray((n + 7) // 8)
+            for i, v in enumerate(values):
+                if v is None:
+                    nulls[i >> 3] |= 1 << (i & 7)
+                    v = ""
+                blob.append(v)
+                offsets.append(offsets[-1] + len(v.encode("utf-16-le")) // 2)
+            col["offsets"] = add_buffer(struct.pack(f"<{n + 1}I", *offsets), "u32", n + 1)
+            data = "".join(blob).encode("utf-8")
+            col["data"] = add_buffer(data, "u8", len(data))
+            if any(nulls):
+                col["nulls"] = add_buffer(bytes(nulls), "u8", len(nulls))
+        elif col["kind"] == "num":
+            data = struct.pack(f"<{n}d", *[math.nan if v is None else float(v) for v in values])
+            col["values"] = add_buffer(data, "f64", n)
+        else:
+            bits = bytearray((n + 7) // 8)
+            for i, v in enumerate(values):
+                if v:
+                    bits[i >> 3] |= 1 << (i & 7)
+            col["bits"] = add_buffer(bytes(bits), "u8", len(bits))
+        columns.append(col)
+
+    header = json.dumps({"version": VERSION, "rows": n, "columns": columns},
+                        separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    header += b" " * pad8(8 + len(header))
+    return MAGIC + struct.pack("<I", len(header)) + header + bytes(body)
+
+def decode_table(data):
+    """Inverse of encode_table (for checks and Python consumers); returns a list of dicts."""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a columnar file")
+    header_len = struct.unpack_from("<I", data, 4)[0]
+    header = json.loads(data[8:8 + header_len])
+    base = 8 + header_len
+    n = header["rows"]
+    formats = {"u8": "B", "u16": "H", "u32": "I", "f64": "d"}
+
+    def read(buf):
+        return struct.unpack_from(f"<{buf['length']}{formats[buf['type']]}", data, base + buf["offset"])
+
+    def bit(bits, i):
+        return bool(bits[i >> 3] & (1 << (i & 7)))
+
+    cols, present = {}, {}
+    for col in header["columns"]:
+        kind = col["kind"]
+        if "present" in col:
+            present[col["name"]] = read(col["present"])
+        if kind == "dict":
+            values = [None] + col["values"]
+            cols[col["name"]] = [values[c] for c in read(col["codes"])]
+        elif kind in ("str", "json"):
+            offsets = read(col["offsets"])
+            start = base + col["data"]["offset"]
+            text = data[start:start + col["data"]["length"]].decode("utf-8").encode("utf-16-le")
+            nulls = read(col["nulls"]) if "nulls" in col else None
+            cols[col["name"]] = [None if nulls and bit(nulls, i) else text[offsets[i] * 2:offsets[i + 1] * 2].decode("utf-16-le")
+                                 for i in range(n)]
+            if kind == "json":
+                cols[col["name"]] = [None if v is None else json.loads(v) for v in cols[col["name"]]]
+        elif kind == "num":
+            cols[col["name"]] = [None if math.isnan(v) else (int(v) if v.is_integer() else v) for v in read(col["values"])]
+        else:
+            bits = read(col["bits"])
+            cols[col["name"]] = [bit(bits, i) for i in range(n)]
+
+    rows = []
+    for i in range(n):
+        row = {}
+        for col in header["columns"]:
+            name = col["name"]
+            if name in present and not bit(present[name], i):
+                continue
+            row[name] = cols[name][i]
+        rows.append(row)
+    return rows
+
+def write_columnar(rows, path):
+    """Writes rows to `path` atomically; returns the byte size."""
+    data = encode_table(rows)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON list of records to the columnar binary format")
+    parser.add_argument("source", nargs="?", default="docs/docs.json")
+    parser.add_argument("--out", help="Output path (default: source with .bin)")
+    args = parser.parse_args()
+    with open(args.source, "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    if not isinstance(rows, list):
+        sys.exit(f"{args.source} is not a list of records")
+    out = args.out or os.path.splitext(args.source)[0] + ".bin"
+    size = write_columnar(rows, out)
+    print(f"📦 {len(rows)} rows: {os.path.getsize(args.source):,} B JSON -> {size:,} B columnar ({out})")
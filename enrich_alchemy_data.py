@@ -1,7 +1,8 @@
 import sqlite3
 import json
+import settings
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
 
 ENTITIES = {
     "Alchemy Material": [
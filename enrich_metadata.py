@@ -1,8 +1,9 @@
 import sqlite3
 import os
 import re
+import settings
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
 
 def enrich():
     conn = sqlite3.connect(DB_NAME)
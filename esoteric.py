@@ -0,0 +1,106 @@
+import os
+import sys
+import argparse
+
+# ---------------------------------------------------------
+# esoteric: one entry point for every tool
+# ---------------------------------------------------------
+# Subcommands are a name -> script table; nothing behind a
+# command (pypdf, fitz, bs4, numpy) is imported until that
+# command runs, and it runs exactly as `python <script>`
+# would, with its own flags. `esoteric --help`, `stats` and
+# `config` only touch argparse, json and sqlite3, so they
+# return in tens of milliseconds.
+#   python esoteric.py scan --enrich
+#   python esoteric.py --config lab.json rebuild --dry-run
+# ---------------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "scan": ("scan.py", "Catalog the PDF library and export docs/*.json"),
+    "chats": ("ingest_chats.py", "Ingest chat exports, prompts and tables"),
+    "mine": ("mining_pipeline.py", "Run miner stages in one pass over the library"),
+    "images": ("mine_images.py", "Extract images, hashes and thumbnails"),
+    "cluster-images": ("scripts/cluster_images.py", "Group near-duplicate images"),
+    "candidates": ("scripts/mine_candidate_terms.py", "Mine candidate dictionary terms"),
+    "seed-dictionary": ("scripts/seed_dictionary.py", "Seed dictionary entries from candidates"),
+    "dictionary": ("build_dictionary.py", "Build the lexicon and harvest corpus evidence"),
+    "scholarly": ("ingest_scholarly_data.py", "Ingest the scholarly compendium"),
+    "fix-links": ("scripts/fix_links.py", "Repair document paths in docs.json"),
+    "audit": ("scripts/audit_metadata_v10.py", "Grade metadata richness"),
+    "atlas": ("scripts/build_atlas.py", "Match the gazetteer and write places.json"),
+    "lineage": ("scripts/mine_lineage.py", "Mine the Golden Chain lineage"),
+    "lineage-analytics": ("scripts/lineage_analytics.py", "Precompute lineage reachability and centrality"),
+    "graph-layout": ("scripts/build_graph_layout.py", "Lay out the knowledge graph into LOD tiles"),
+    "matrix": ("scripts/build_matrix.py", "Build the document similarity matrix"),
+    "coverage": ("scripts/dictionary_coverage.py", "Report dictionary coverage"),
+    "recommendations": ("scripts/build_recommendations.py", "Build reading recommendations"),
+    "omni": ("scripts/build_omni_index.py", "Build the omni palette search index"),
+    "semantic": ("semantic_index.py", "Build, fold into or query the LSA semantic index"),
+    "facets": ("facets.py", "Build the facet cube and doc-id bitmaps"),
+    "snapshot": ("snapshots.py", "Record row hashes and write a what's-new delta"),
+    "rebuild": ("rebuild.py", "Incrementally rebuild everything"),
+    "serve": ("serve.py", "Serve docs/ and the query API locally"),
+}
+
+STATS_TABLES = ["documents", "chunks", "entities", "relationships", "chats", "chat_messages",
+                "prompts", "images", "dictionary_entries", "places"]
+
+def run_script(script, args):
+    """Runs a tool as __main__ with its own argv, importing it only now."""
+    import runpy
+    path = os.path.join(BASE_DIR, script)
+    sys.argv = [path] + args
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+def show_stats(args):
+    import sqlite3
+    import settings
+    parser = argparse.ArgumentParser(prog="esoteric stats", description="Row counts for the main tables")
+    parser.add_argument("--db", default=settings.DB_PATH)
+    opts = parser.parse_args(args)
+    if not os.path.exists(opts.db):
+        raise SystemExit(f"Database not found: {opts.db}")
+    conn = sqlite3.connect(f"file:{opts.db}?mode=ro", uri=True)
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in STATS_TABLES:
+        if table in existing:
+            print(f"{table:20} {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>10}")
+    conn.close()
+
+def show_config(args):
+    import json
+    import settings
+    print(f"# {settings.CONFIG_FILE}{'' if os.path.exists(settings.CONFIG_FILE) else ' (not found; defaults)'}")
+    print(json.dumps(settings.SETTINGS, indent=2))
+
+BUILTINS = {
+    "stats": (show_stats, "Row counts for the main tables"),
+    "config": (show_config, "Print the effective settings"),
+}
+
+def main(argv=None):
+    listing = "\n".join(f"  {name:18} {help_text}" for name, (_, help_text) in {**BUILTINS, **COMMANDS}.items())
+    parser = argparse.ArgumentParser(
+        prog="esoteric",
+        description="Esoteric research workbench",
+        epilog=f"commands:\n{listing}\n\nRun `esoteric <command> --help` for a command's own options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--config", help="Settings file (default: esoteric.json next to this script)")
+    parser.add_argument("command", choices=sorted({**BUILTINS, **COMMANDS}), metavar="command", help="One of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Passed through to the command")
+    opts = parser.parse_args(argv)
+
+    if opts.config:
+        # Read by settings.py on first import, in this process or a child
+        os.environ["ESOTERIC_CONFIG"] = os.path.abspath(opts.config)
+    if opts.command in BUILTINS:
+        BUILTINS[opts.command][0](opts.args)
+    else:
+        run_script(COMMANDS[opts.command][0], opts.args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import json
+import base64
+import sqlite3
+import argparse
+import settings
+
+# ---------------------------------------------------------
+# Facet Index
+# ---------------------------------------------------------
+# Library filters used to rescan the whole catalogue on every
+# click. One grouped query over `documents` now yields the
+# full cube topic x period x century x language x
+# author-bucket: each cell carries its count and the
+# positions of its documents in docs.json. Those positions
+# are ORed into one bitmap per facet value, so the portal
+# (assets/facets.js) answers a filter by ANDing the selected
+# dimensions' bitmaps and counts by popcount:
+#   docs/facets.json  values, base64 bitmaps, cube cells
+# Authors are bucketed: the AUTHOR_BUCKETS most frequent get
+# their own value, the rest fall into "Other".
+# ---------------------------------------------------------
+
+FACETS_FILE = "facets.json"
+DIMENSIONS = ["topic", "period", "century", "language", "author_bucket"]
+AUTHOR_BUCKETS = 30
+
+def build_facets(conn, author_buckets=AUTHOR_BUCKETS):
+    """The cube in one pass: {dimensions, values, bitmaps, cells}, positions in rowid order (docs.json order)."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        WITH top_authors AS (
+            SELECT author FROM documents
+            WHERE author IS NOT NULL AND author NOT IN ('', 'Unknown')
+            GROUP BY author ORDER BY COUNT(*) DESC, author LIMIT ?
+        ),
+        numbered AS (
+            SELECT ROW_NUMBER() OVER (ORDER BY rowid) - 1 AS ordinal, id, topic, period, century, language, author
+            FROM documents
+        )
+        SELECT n.topic, n.period, n.century, n.language,
+               CASE WHEN n.author IS NULL OR n.author IN ('', 'Unknown') THEN 'Unknown'
+                    WHEN t.author IS NOT NULL THEN n.author
+                    ELSE 'Other' END AS author_bucket,
+               COUNT(*), group_concat(n.ordinal)
+        FROM numbered n
+        LEFT JOIN top_authors t ON t.author = n.author
+        GROUP BY 1, 2, 3, 4, 5
+    ''', (author_buckets,))
+    groups = cursor.fetchall()
+
+    total = sum(g[5] for g in groups)
+    values = {dim: sorted({g[d] for g in groups}, key=lambda v: (v is None, str(v))) for d, dim in enumerate(DIMENSIONS)}
+    lookup = {dim: {v: k for k, v in enumerate(values[dim])} for dim in DIMENSIONS}
+
+    # Bitmaps are padded to whole 32-bit words for Uint32Array views
+    nbytes = (total + 31) // 32 * 4
+    bits = {dim: [bytearray(nbytes) for _ in values[dim]] for dim in DIMENSIONS}
+
+    cells = []
+    for g in groups:
+        coords = [lookup[dim][g[d]] for d, dim in enumerate(DIMENSIONS)]
+        targets = [bits[dim][k] for dim, k in zip(DIMENSIONS, coords)]
+        for ordinal in map(int, str(g[6]).split(",")):
+            for bitmap in targets:
+                bitmap[ordinal >> 3] |= 1 << (ordinal & 7)
+        cells.append(coords + [g[5]])
+    cells.sort()
+
+    encode = lambda b: base64.b64encode(bytes(b)).decode("ascii")
+    ends = cursor.execute("SELECT (SELECT id FROM documents ORDER BY rowid LIMIT 1), "
+                          "(SELECT id FROM documents ORDER BY rowid DESC LIMIT 1)").fetchone()
+    return {
+        "version": 1,
+        "docs": total,
+        # docs.json ids at the first and last position, so a client can tell the bitmaps still line up
+        "check": {"first": ends[0], "last": ends[1]},
+        "dimensions": DIMENSIONS,
+        "values": values,
+        "bitmaps": {dim: [encode(b) for b in bits[dim]] for dim in DIMENSIONS},
+        "cells": cells,
+    }
+
+def write_facets(conn, export_path):
+    facets = build_facets(conn)
+    path = os.path.join(export_path, FACETS_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(facets, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, path)
+    return facets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the facet cube and bitmaps for the library view")
+    parser.add_argument("--db", default=settings.DB_PATH)
+    parser.add_argument("--dir", default=settings.EXPORT_DIR)
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db)
+    facets = write_facets(conn, args.dir)
+    conn.close()
+    sizes = ", ".join(f"{dim} {len(facets['values'][dim])}" for dim in DIMENSIONS)
+    print(f"🧮 {facets['docs']} docs in {len(facets['cells'])} cube cells ({sizes})")
+    print(f"💾 Saved to {os.path.join(args.dir, FACETS_FILE)}")
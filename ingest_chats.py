@@ -5,6 +5,14 @@ import re
 import json
 from datetime import datetime
 from bs4 import BeautifulSoup
+from instrumentation import RunReport, profiling
+import settings
+
+# Columns ingest relies on that scan.init_db's chat_messages lacked
+CHAT_MESSAGE_COLUMNS = {
+    "role": "TEXT",
+    "order_index": "INTEGER",
+}
 
 def init_chats_db(conn):
     """Adds chat-related tables to the schema."""
@@ -33,6 +41,15 @@ def init_chats_db(conn):
         FOREIGN KEY(chat_id) REFERENCES chats(id)
     )
     ''')
+    # scan.init_db may have created chat_messages first with its older (sender) schema
+    cursor.execute("PRAGMA table_info(chat_messages)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, decl in CHAT_MESSAGE_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE chat_messages ADD COLUMN {column} {decl}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_order ON chat_messages(chat_id, order_index)")
+    # Matches the keyset scan.export_messages pages on
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_export ON chat_messages(chat_id, COALESCE(order_index, -1), id)")
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS prompts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -219,7 +236,9 @@ def extract_prompts(messages, scholars, current_topic):
             })
     return prompts
 
-def ingest_all_chats(db_path, chats_dir):
+def ingest_all_chats(db_path, chats_dir, report=None):
+    owns_report = report is None
+    report = report or RunReport("ingest_chats.py")
     conn = sqlite3.connect(db_path)
     init_chats_db(conn)
     cursor = conn.cursor()
@@ -250,97 +269,104 @@ def ingest_all_chats(db_path, chats_dir):
         foldername = os.path.basename(dirpath)
         
         try:
-            chat_data = parse_chat_html(html_file)
-            chat_id = hashlib.md5(html_file.encode()).hexdigest()[:12]
+            with report.item(html_file):
+                with report.span("parse"):
+                    chat_data = parse_chat_html(html_file)
+                chat_id = hashlib.md5(html_file.encode()).hexdigest()[:12]
             
-            topic = "General"
-            topic_match = re.search(r'__(.*?)__', html_file)
-            if topic_match:
-                topic = topic_match.group(1).replace("-", " ")
-            elif "_" in foldername:
-                parts = foldername.split("_")
-                if len(parts) > 1: topic = parts[1].replace("-", " ")
+                topic = "General"
+                topic_match = re.search(r'__(.*?)__', html_file)
+                if topic_match:
+                    topic = topic_match.group(1).replace("-", " ")
+                elif "_" in foldername:
+                    parts = foldername.split("_")
+                    if len(parts) > 1: topic = parts[1].replace("-", " ")
 
-            cursor.execute('''
-            INSERT OR REPLACE INTO chats (id, title, created_at, path, topic)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (chat_id, chat_data['title'], chat_data['created_at'], html_file, topic))
-            
-            cursor.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
-            cursor.execute("DELETE FROM tables WHERE chat_id = ?", (chat_id,))
-            for msg in chat_data['messages']:
                 cursor.execute('''
-                INSERT INTO chat_messages (chat_id, role, content, order_index)
-                VALUES (?, ?, ?, ?)
-                ''', (chat_id, msg['role'], msg['content'], msg['index']))
+                INSERT OR REPLACE INTO chats (id, title, created_at, path, topic)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (chat_id, chat_data['title'], chat_data['created_at'], html_file, topic))
+            
+                cursor.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
+                cursor.execute("DELETE FROM tables WHERE chat_id = ?", (chat_id,))
+                with report.span("messages"):
+                    for msg in chat_data['messages']:
+                        cursor.execute('''
+                        INSERT INTO chat_messages (chat_id, role, content, order_index)
+                        VALUES (?, ?, ?, ?)
+                        ''', (chat_id, msg['role'], msg['content'], msg['index']))
                 
-                # --- [NEW] Table Mining (V5/V9.3) ---
-                has_extracted_table = False
+                        # --- [NEW] Table Mining (V5/V9.3) ---
+                        has_extracted_table = False
                 
-                # 1. Markdown Table Mining
-                if "|" in msg['content'] and "---" in msg['content']:
-                    table_matches = re.findall(r'(\|.*\|.*\n\|[\s|:-]+\n(?:\|.*\|.*\n)+)', msg['content'])
-                    for full_table in table_matches:
-                        has_extracted_table = True
-                        save_table(cursor, chat_id, full_table, msg, chat_data, topic)
+                        # 1. Markdown Table Mining
+                        if "|" in msg['content'] and "---" in msg['content']:
+                            table_matches = re.findall(r'(\|.*\|.*\n\|[\s|:-]+\n(?:\|.*\|.*\n)+)', msg['content'])
+                            for full_table in table_matches:
+                                has_extracted_table = True
+                                save_table(cursor, chat_id, full_table, msg, chat_data, topic)
 
-                # 2. HTML Table Mining (V9.3)
-                if not has_extracted_table and "<table>" in msg.get('html', ''):
-                    temp_soup = BeautifulSoup(msg['html'], 'html.parser')
-                    html_tables = temp_soup.find_all('table')
-                    for table_tag in html_tables:
-                        # Convert HTML table back to Markdown for consistency in the Lab
-                        md_table = html_table_to_markdown(table_tag)
-                        if md_table:
-                            save_table(cursor, chat_id, md_table, msg, chat_data, topic)
+                        # 2. HTML Table Mining (V9.3)
+                        if not has_extracted_table and "<table>" in msg.get('html', ''):
+                            temp_soup = BeautifulSoup(msg['html'], 'html.parser')
+                            html_tables = temp_soup.find_all('table')
+                            for table_tag in html_tables:
+                                # Convert HTML table back to Markdown for consistency in the Lab
+                                md_table = html_table_to_markdown(table_tag)
+                                if md_table:
+                                    save_table(cursor, chat_id, md_table, msg, chat_data, topic)
 
-                # Scholar Linking (Optimized)
-                if scholar_regex:
-                    matches = set(scholar_regex.findall(msg['content']))
-                    for scholar_name in matches:
-                        # Find original case name from map
-                        # This works because scholars_map contains the key in its original case
-                        # but our regex is case-insensitive. We need the original key.
-                        # For simplicity, we can just find the key that matches case-insensitively.
-                        orig_name = next((s for s in scholars if s.lower() == scholar_name.lower()), scholar_name)
-                        ent_id = scholars_map.get(orig_name)
-                        if ent_id:
-                            cursor.execute("INSERT OR IGNORE INTO relationships (source_id, target_id, type) VALUES (?, ?, ?)", (chat_id, ent_id, "DISCUSSED"))
+                        # Scholar Linking (Optimized)
+                        if scholar_regex:
+                            matches = set(scholar_regex.findall(msg['content']))
+                            for scholar_name in matches:
+                                # Find original case name from map
+                                # This works because scholars_map contains the key in its original case
+                                # but our regex is case-insensitive. We need the original key.
+                                # For simplicity, we can just find the key that matches case-insensitively.
+                                orig_name = next((s for s in scholars if s.lower() == scholar_name.lower()), scholar_name)
+                                ent_id = scholars_map.get(orig_name)
+                                if ent_id:
+                                    cursor.execute("INSERT OR IGNORE INTO relationships (source_id, target_id, type) VALUES (?, ?, ?)", (chat_id, ent_id, "DISCUSSED"))
 
-            cursor.execute("DELETE FROM prompts WHERE chat_id = ?")
-            prompts = extract_prompts(chat_data['messages'], scholars, topic)
-            for p in prompts:
-                cursor.execute('''
-                INSERT INTO prompts (chat_id, text, move_type, opus_stage, mentions_topic, mentions_figure, mentions_text, mentions_scholar, order_index)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (chat_id, p['text'], p['move'], p['opus_stage'], p['mentions_topic'], p['mentions_figure'], p['mentions_text'], p['mentions_scholar'], p['index']))
-                q_count += 1
+                cursor.execute("DELETE FROM prompts WHERE chat_id = ?", (chat_id,))
+                with report.span("prompts"):
+                    prompts = extract_prompts(chat_data['messages'], scholars, topic)
+                for p in prompts:
+                    cursor.execute('''
+                    INSERT INTO prompts (chat_id, text, move_type, opus_stage, mentions_topic, mentions_figure, mentions_text, mentions_scholar, order_index)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (chat_id, p['text'], p['move'], p['opus_stage'], p['mentions_topic'], p['mentions_figure'], p['mentions_text'], p['mentions_scholar'], p['index']))
+                    q_count += 1
 
-            chat_count += 1
-            if chat_count % 50 == 0:
-                print(f"  Ingested {chat_count} chats...")
-                conn.commit()
+                chat_count += 1
+                report.count("chats")
+                report.count("messages", len(chat_data['messages']))
+                report.count("prompts", len(prompts))
+                if chat_count % 50 == 0:
+                    print(f"  Ingested {chat_count} chats...")
+                    conn.commit()
                 
         except Exception as e:
-            # print(f"Error ingesting {foldername}: {e}")
+            print(f"Error ingesting {foldername}: {e}")
+            report.error(html_file, e)
             continue
 
     conn.commit()
     conn.close()
     print(f"Ingestion complete. Chats: {chat_count}. Prompts: {q_count}.")
+    if owns_report:
+        report.write()
+        report.print_summary()
 
 if __name__ == "__main__":
-    DB_PATH = "esoteric.db"
-    CHATS_DIR = r"e:\pdf\esoteric studies chats"
-    
-    print(f"Checking path: {CHATS_DIR}")
-    if os.path.exists(CHATS_DIR):
-        print("Path exists! Starting walk...")
-        ingest_all_chats(DB_PATH, CHATS_DIR)
-    else:
-        print(f"Chats directory not found: {CHATS_DIR}")
-        # Try alternate path
-        ALT_DIR = "/pdf/esoteric studies chats"
-        print(f"Checking alt path: {ALT_DIR}")
-        if os.path.exists(ALT_DIR):
-            ingest_all_chats(DB_PATH, ALT_DIR)
+    with profiling():
+        # First configured chats folder that exists (see settings.CHATS_DIRS)
+        for chats_dir in settings.CHATS_DIRS:
+            print(f"Checking path: {chats_dir}")
+            if os.path.exists(chats_dir):
+                print("Path exists! Starting walk...")
+                ingest_all_chats(settings.DB_PATH, chats_dir)
+                break
+        else:
+            print(f"Chats directory not found: {', '.join(settings.CHATS_DIRS)}")
@@ -1,9 +1,11 @@
 import sqlite3
 import re
 import os
-import uuid
+import hashlib
+from instrumentation import profiling
+import settings
 
-DB_PATH = "esoteric_v5.db"
+DB_PATH = settings.LEXICON_DB
 # Use absolute path relative to this script
 COMPENDIUM_MD = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scholarly_compendium.md"))
 
@@ -34,6 +36,78 @@ SOURCES = [
     }
 ]
 
+# ---------------------------------------------------------
+# Note Linking
+# ---------------------------------------------------------
+# Blocks are segmented into sentences (abbreviation-aware),
+# and each sentence is tokenized once and walked through a
+# word trie of entity names, so linking costs one pass over
+# the text however many entities exist. Note ids hash
+# (source, sentence, entity): reruns upsert the same rows.
+# ---------------------------------------------------------
+
+MIN_SENTENCE = 20
+ABBREVIATIONS = {"e.g", "i.e", "cf", "c", "ca", "fl", "d", "b", "st", "dr", "mr", "vol", "vols", "ed", "eds",
+                 "trans", "p", "pp", "ch", "fig", "no", "viz", "etc", "al", "op", "cit", "ibid", "repr"}
+SENTENCE_END = re.compile(r'([.!?])["\')\]]*\s+(?=["\'(\[]?[A-Z0-9ÀÉÈÎÖÜ])|\n\s*\n|\n(?=\s*(?:[-*#]|\d+\.)\s)')
+WORD = re.compile(r"\w+(?:['’-]\w+)*")
+
+NOTE_SQL = '''
+    INSERT INTO reference_notes (id, source_id, subject_type, subject_id, claim_text, stance, confidence)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        claim_text = excluded.claim_text,
+        stance = excluded.stance,
+        confidence = excluded.confidence
+'''
+
+def split_sentences(text):
+    """Splits on terminal punctuation, paragraph breaks and list items, skipping abbreviations and initials."""
+    sentences, start = [], 0
+    for m in SENTENCE_END.finditer(text):
+        if m.group(1) == ".":
+            prev = re.search(r"([\w.]+)\.$", text[start:m.start(1) + 1])
+            word = prev.group(1).lower() if prev else ""
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue
+        sentences.append(text[start:m.end(1) if m.group(1) else m.start()].strip(" \n\t-*#>"))
+        start = m.end()
+    sentences.append(text[start:].strip(" \n\t-*#>"))
+    return [s for s in sentences if len(s) > MIN_SENTENCE]
+
+def build_name_trie(entities_map):
+    """Word trie over lowercased entity names; terminal nodes hold the entity id under None."""
+    trie = {}
+    for name, eid in entities_map.items():
+        words = WORD.findall(name)
+        if not words:
+            continue
+        node = trie
+        for w in words:
+            node = node.setdefault(w, {})
+        node[None] = eid
+    return trie
+
+def find_mentions(sentence, trie):
+    """Entity ids mentioned in a sentence, in first-seen order (nested names included)."""
+    tokens = WORD.findall(sentence.lower())
+    found = {}
+    for i in range(len(tokens)):
+        node = trie.get(tokens[i])
+        j = i + 1
+        while node is not None:
+            if None in node:
+                found.setdefault(node[None], None)
+            if j == len(tokens):
+                break
+            node = node.get(tokens[j])
+            j += 1
+    return list(found)
+
+def note_id(source_id, sentence, entity_id):
+    digest = hashlib.sha256(f"{source_id}\x1f{sentence}\x1f{entity_id}".encode("utf-8")).hexdigest()
+    return f"note_{digest[:24]}"
+
 def ingest_scholarly_data():
     if not os.path.exists(COMPENDIUM_MD):
         print(f"File not found: {COMPENDIUM_MD}")
@@ -42,11 +116,6 @@ def ingest_scholarly_data():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    # Clear existing Reference Data (idempotent)
-    cursor.execute("DELETE FROM reference_sources")
-    cursor.execute("DELETE FROM reference_notes")
-    # cursor.execute("DELETE FROM evidence_spans") 
-
     print("Inserting Reference Sources...")
     for src in SOURCES:
         cursor.execute('''
@@ -61,36 +130,24 @@ def ingest_scholarly_data():
     for row in cursor.fetchall():
         ent_id = row[0]
         name = row[1]
-        entities_map[name.lower()] = ent_id
-    
+        if name:
+            entities_map[name.lower()] = ent_id
+    trie = build_name_trie(entities_map)
+
     print(f"Loaded {len(entities_map)} entities for linking.")
 
     with open(COMPENDIUM_MD, "r", encoding="utf-8") as f:
         content = f.read()
 
     # Define processing logic
+    notes = []
+
     def process_text_block(block_text, source_id):
-        # Naive sentence splitting
-        sentences = [s.strip() for s in block_text.split('. ') if len(s.strip()) > 20]
-        
         count = 0
-        for sent in sentences:
-            # Check for entity mentions
-            linked_ids = []
-            sent_lower = sent.lower()
-            for name, eid in entities_map.items():
-                if name in sent_lower:
-                     linked_ids.append(eid)
-            
-            # If entities found, creating specific notes
-            if linked_ids:
-                for eid in linked_ids:
-                    note_id = str(uuid.uuid4())
-                    cursor.execute('''
-                        INSERT INTO reference_notes (id, source_id, subject_type, subject_id, claim_text, stance, confidence)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (note_id, source_id, "entity", eid, sent, "Analyzes", 0.85))
-                    count += 1
+        for sent in split_sentences(block_text):
+            for eid in find_mentions(sent, trie):
+                notes.append((note_id(source_id, sent, eid), source_id, "entity", eid, sent, "Analyzes", 0.85))
+                count += 1
         return count
 
     # 1. Obrist Analysis
@@ -115,17 +172,26 @@ def ingest_scholarly_data():
             term_lower = term.lower().strip()
             if term_lower in entities_map:
                 eid = entities_map[term_lower]
-                note_id = str(uuid.uuid4())
-                cursor.execute('''
-                    INSERT INTO reference_notes (id, source_id, subject_type, subject_id, claim_text, stance, confidence)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (note_id, "src_abraham_1998", "entity", eid, definition, "Defines", 1.0))
+                notes.append((note_id("src_abraham_1998", definition, eid), "src_abraham_1998", "entity", eid, definition, "Defines", 1.0))
                 c += 1
         print(f"  Abraham: Created {c} definitions.")
 
+    cursor.executemany(NOTE_SQL, notes)
+
+    # Drop only this ingest's notes that no longer appear in the compendium
+    cursor.execute("CREATE TEMP TABLE seen_notes (id TEXT PRIMARY KEY)")
+    cursor.executemany("INSERT OR IGNORE INTO seen_notes (id) VALUES (?)", [(n[0],) for n in notes])
+    cursor.execute(f'''
+        DELETE FROM reference_notes
+        WHERE source_id IN ({",".join("?" for _ in SOURCES)})
+          AND id NOT IN (SELECT id FROM seen_notes)
+    ''', [src['id'] for src in SOURCES])
+    print(f"  Upserted {len(notes)} notes; pruned {cursor.rowcount} stale.")
+
     conn.commit()
     conn.close()
     print("V8 Reference Layer Ingestion Complete.")
 
 if __name__ == "__main__":
-    ingest_scholarly_data()
+    with profiling():
+        ingest_scholarly_data()
@@ -1,7 +1,8 @@
 import sqlite3
+import settings
 
 def init_metrics():
-    conn = sqlite3.connect('esoteric.db')
+    conn = sqlite3.connect(settings.DB_PATH)
     cursor = conn.cursor()
     
     cursor.execute("DROP TABLE IF EXISTS metrics")
@@ -34,7 +35,7 @@ def init_metrics():
     
     conn.commit()
     conn.close()
-    print("Metrics table initialized in esoteric.db")
+    print(f"Metrics table initialized in {settings.DB_PATH}")
 
 if __name__ == "__main__":
     init_metrics()
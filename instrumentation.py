@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import heapq
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# ---------------------------------------------------------
+# Run Instrumentation
+# ---------------------------------------------------------
+# A RunReport collects, for one script run:
+#   - spans: wall time and call count per named phase
+#     (extract, parse, match, sql, json, ...)
+#   - counters: files, pages, rows, errors, ...
+#   - items: per-file timings, keeping the slowest N and the
+#     share of total time eaten by the slowest 5%
+#   - errors: the first few failures with their location
+# write() appends one JSON object per run to a JSON-lines
+# file, so runs can be compared with jq or pandas.
+# ---------------------------------------------------------
+
+REPORT_FILE = "reports/runs.jsonl"
+SLOWEST_N = 20
+MAX_ERRORS = 50
+TAIL_FRACTION = 0.05
+
+class RunReport:
+    def __init__(self, script=None, slowest=SLOWEST_N):
+        self.script = script or os.path.basename(sys.argv[0])
+        self.started_at = datetime.now().isoformat()
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.errors = []
+        self.slowest_n = slowest
+        self.slowest = []       # min-heap of (seconds, key)
+        self.durations = []
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += time.perf_counter() - start
+            entry[1] += 1
+
+    @contextmanager
+    def item(self, key):
+        """Times one unit of work (usually a file) for the slowest-N table."""
+        start = time.perf_counter()
+        try:
+            with ACTIVE_PROFILER.document() if ACTIVE_PROFILER else nullcontext():
+                yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.durations.append(seconds)
+            if len(self.slowest) < self.slowest_n:
+                heapq.heappush(self.slowest, (seconds, key))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, key))
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def error(self, where, exc):
+        self.count("errors")
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"where": where, "type": type(exc).__name__, "message": str(exc)[:300]})
+
+    def tail_share(self):
+        """Fraction of item time spent in the slowest TAIL_FRACTION of items."""
+        total = sum(self.durations)
+        if not total:
+            return 0.0
+        k = max(1, int(len(self.durations) * TAIL_FRACTION))
+        return sum(heapq.nlargest(k, self.durations)) / total
+
+    def as_dict(self):
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started_at": self.started_at,
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "spans": {name: {"seconds": round(s, 3), "calls": n} for name, (s, n) in self.spans.items()},
+            "counters": self.counters,
+            "items": len(self.durations),
+            "tail_share": round(self.tail_share(), 3),
+            "slowest": [{"key": key, "seconds": round(s, 3)} for s, key in sorted(self.slowest, reverse=True)],
+            "errors": self.errors,
+        }
+
+    def write(self, path=REPORT_FILE):
+        report = self.as_dict()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        return report
+
+    def print_summary(self, top=5):
+        report = self.as_dict()
+        spans = sorted(report["spans"].items(), key=lambda kv: -kv[1]["seconds"])
+        print(f"⏱  {self.script}: {report['seconds']}s; " +
+              ", ".join(f"{name} {s['seconds']}s" for name, s in spans))
+        if self.counters:
+            print("   " + ", ".join(f"{k}={v}" for k, v in sorted(self.counters.items())))
+        if report["items"]:
+            print(f"   Slowest {int(TAIL_FRACTION * 100)}% of {report['items']} items took "
+                  f"{report['tail_share'] * 100:.0f}% of item time:")
+            for s in report["slowest"][:top]:
+                print(f"     {s['seconds']:>8.2f}s  {s['key']}")
+
+# ---------------------------------------------------------
+# Opt-in Profiling
+# ---------------------------------------------------------
+# Any entry point wrapped in `with profiling():` accepts
+#   --profile cpu|mem    cProfile or tracemalloc
+#   --profile-every N    only profile every Nth document
+# The flags are taken out of sys.argv before the script's own
+# argparse runs. Results go to reports/profiles/ (.prof for
+# snakeviz/pstats, .txt with the top allocations) and the top
+# hotspots are printed. Sampling hooks into RunReport.item:
+# the whole run is profiled until the first document arrives,
+# then only sampled documents are. A script that never reports
+# documents therefore keeps its whole-run profile. Only this
+# process is profiled, not multiprocessing workers.
+# ---------------------------------------------------------
+
+PROFILE_DIR = "reports/profiles"
+PROFILE_TOP = 25
+ACTIVE_PROFILER = None
+
+class Profiler:
+    def __init__(self, mode=None, name=None, every=None, out_dir=PROFILE_DIR):
+        self.mode = mode
+        self.name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.every = every if every and every > 1 else None
+        self.out_dir = out_dir
+        self.seen = 0
+        self.samples = 0
+        self.cpu = None
+        self.whole_run = False  # Profiling everything until sampling takes over
+        self.allocations = {}   # (filename, lineno) -> [bytes, blocks]
+        self.peak = 0
+
+    def __enter__(self):
+        global ACTIVE_PROFILER
+        if self.mode:
+            ACTIVE_PROFILER = self
+            self.whole_run = True
+        if self.mode == "cpu":
+            import cProfile
+            self.cpu = cProfile.Profile()
+            self.cpu.enable()
+        elif self.mode == "mem":
+            import tracemalloc
+            tracemalloc.start(1)
+        return self
+
+    def _start_sampling(self):
+        """Drops the whole-run profile once documents are being reported."""
+        self.whole_run = False
+        if self.mode == "cpu":
+            import cProfile
+            self.cpu.disable()
+            self.cpu = cProfile.Profile()
+        else:
+            import tracemalloc
+            tracemalloc.stop()
+
+    @contextmanager
+    def document(self):
+        """Profiles this unit of work if it falls on the sampling stride."""
+        self.seen += 1
+        if not self.mode or not self.every:
+            yield
+            return
+        if self.whole_run:
+            self._start_sampling()
+        if (self.seen - 1) % self.every:
+            yield
+            return
+        self.samples += 1
+        if self.mode == "cpu":
+            self.cpu.enable()
+            try:
+                yield
+            finally:
+                self.cpu.disable()
+        else:
+            import tracemalloc
+            tracemalloc.start(1)
+            try:
+                yield
+            finally:
+                # Allocations made by this document that were still alive at its end
+                self._collect(tracemalloc.take_snapshot())
+                self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+    def _collect(self, snapshot):
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            entry = self.allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+
+    def __exit__(self, *exc):
+        global ACTIVE_PROFILER
+        if not self.mode:
+            return False
+        ACTIVE_PROFILER = None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, f"{self.name}-{self.mode}-{datetime.now():%Y%m%d-%H%M%S}")
+        if self.whole_run:
+            sampled = " (whole run; no documents were reported to sample)" if self.every else ""
+        else:
+            sampled = f" ({self.samples} of {self.seen} documents sampled)"
+
+        if self.mode == "cpu":
+            if self.whole_run:
+                self.cpu.disable()
+            # pstats refuses a profile that never recorded a call
+            if not self.cpu.getstats():
+                print(f"🔬 CPU profile{sampled}: nothing recorded")
+                return False
+            import pstats
+            self.cpu.dump_stats(stem + ".prof")
+            print(f"🔬 CPU profile{sampled} -> {stem}.prof")
+            pstats.Stats(self.cpu).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            return False
+
+        import tracemalloc
+        if self.whole_run:
+            snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            snapshot.dump(stem + ".tracemalloc")
+            self._collect(snapshot)
+        top = sorted(self.allocations.items(), key=lambda kv: -kv[1][0])[:PROFILE_TOP]
+        lines = [f"Peak traced memory: {self.peak / 1024 / 1024:.1f} MiB{sampled}"]
+        lines += [f"{size / 1024:>10.1f} KiB {count:>8} blocks  {filename}:{lineno}"
+                  for (filename, lineno), (size, count) in top]
+        with open(stem + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"🔬 Memory profile -> {stem}.txt")
+        print("\n".join(lines))
+        return False
+
+def profiling(name=None, argv=None):
+    """Builds a Profiler from --profile/--profile-every, removing them from sys.argv."""
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", choices=["cpu", "mem"])
+    parser.add_argument("--profile-every", type=int, default=None)
+    args, rest = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if argv is None:
+        sys.argv[1:] = rest
+    return Profiler(args.profile, name, args.profile_every)
@@ -2,6 +2,9 @@ import os
 import sqlite3
 import json
 import re
+from mining_pipeline import Stage, register_stage
+from instrumentation import profiling
+import settings
 
 # Try importing pypdf
 try:
@@ -11,8 +14,8 @@ except ImportError:
     HAS_PYPDF = False
 
 # Configuration
-DB_PATH = "esoteric_v5.db"
-ALCHEMY_DIR = r"e:\pdf\alchemy"
+DB_PATH = settings.LEXICON_DB
+ALCHEMY_DIR = settings.CORPUS_ROOTS["Alchemy"]
 
 # Seed Lists (Extendable)
 MATERIALS = [
@@ -49,6 +52,36 @@ def extract_text(filepath, max_pages=10):
         print(f"Error reading {filepath}: {e}")
         return ""
 
+CATEGORIES = [
+    (MATERIALS, "Alchemy Material", "material"),
+    (EQUIPMENT, "Alchemy Equipment", "equipment"),
+    (DEKNAMEN, "Alchemy Symbol", "symbol")
+]
+
+def find_alchemy_terms(text, filename):
+    """Yields (name, type, attributes) for every seed term found in lowercased text."""
+    for items, entity_type, category in CATEGORIES:
+        for item in items:
+            if re.search(r'\b' + re.escape(item) + r'\b', text):
+                attr = json.dumps({"source": filename, "category": category})
+                yield item.title(), entity_type, attr
+
+@register_stage("alchemy")
+class AlchemyStage(Stage):
+    db = DB_PATH     # Lexicon entities, like the standalone miner
+
+    def prepare(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS entities (id INTEGER PRIMARY KEY, name TEXT UNIQUE, type TEXT, attributes TEXT)")
+        conn.commit()
+
+    def accepts(self, ctx):
+        return ctx.in_folder("alchemy")
+
+    def process(self, ctx, writer):
+        for name, entity_type, attr in find_alchemy_terms(ctx.text(10, lower=True), ctx.filename):
+            writer.add("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)",
+                       (name, entity_type, attr))
+
 def mine_alchemy(db_path, scan_dir):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -74,32 +107,11 @@ def mine_alchemy(db_path, scan_dir):
         filename = os.path.basename(filepath)
         print(f"Scanning: {filename}...")
 
-        # Scan for Materials
-        for item in MATERIALS:
-            if re.search(r'\b' + re.escape(item) + r'\b', text):
-                attr = json.dumps({"source": filename, "category": "material"})
-                try:
-                    cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
-                                   (item.title(), "Alchemy Material", attr))
-                except: pass
-
-        # Scan for Equipment
-        for item in EQUIPMENT:
-            if re.search(r'\b' + re.escape(item) + r'\b', text):
-                attr = json.dumps({"source": filename, "category": "equipment"})
-                try:
-                    cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
-                                   (item.title(), "Alchemy Equipment", attr))
-                except: pass
-
-        # Scan for Deknamen
-        for item in DEKNAMEN:
-            if re.search(r'\b' + re.escape(item) + r'\b', text):
-                attr = json.dumps({"source": filename, "category": "symbol"})
-                try:
-                    cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
-                                   (item.title(), "Alchemy Symbol", attr))
-                except: pass
+        for name, entity_type, attr in find_alchemy_terms(text, filename):
+            try:
+                cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
+                               (name, entity_type, attr))
+            except: pass
         
         count += 1
         if count % 10 == 0: conn.commit()
@@ -109,7 +121,8 @@ def mine_alchemy(db_path, scan_dir):
     print("Alchemy Mining Complete.")
 
 if __name__ == "__main__":
-    if os.path.exists(ALCHEMY_DIR):
-        mine_alchemy(DB_PATH, ALCHEMY_DIR)
-    else:
-        print(f"Directory not found: {ALCHEMY_DIR}")
+    with profiling():
+        if os.path.exists(ALCHEMY_DIR):
+            mine_alchemy(DB_PATH, ALCHEMY_DIR)
+        else:
+            print(f"Directory not found: {ALCHEMY_DIR}")
@@ -2,6 +2,9 @@ import os
 import sqlite3
 import json
 import re
+from mining_pipeline import Stage, register_stage
+from instrumentation import profiling
+import settings
 
 # Try importing pypdf
 try:
@@ -11,8 +14,8 @@ except ImportError:
     HAS_PYPDF = False
 
 # Configuration
-DB_PATH = "esoteric_v5.db"
-HERMETIC_DIR = r"e:\pdf\hermetic"
+DB_PATH = settings.LEXICON_DB
+HERMETIC_DIR = settings.CORPUS_ROOTS["Hermetic"]
 
 # Period Lists & Key Figures
 PERIODS = {
@@ -38,6 +41,30 @@ def extract_text(filepath, max_pages=10):
         print(f"Error reading {filepath}: {e}")
         return ""
 
+def find_hermetic_figures(text, filename):
+    """Yields (name, period, attributes) for each known figure found in lowercased text."""
+    for period, figures in PERIODS.items():
+        for figure in figures:
+            if re.search(r'\b' + re.escape(figure.lower()) + r'\b', text):
+                attr = json.dumps({"source": filename, "period": period, "category": "figure"})
+                yield figure.title(), period, attr
+
+@register_stage("hermetic")
+class HermeticStage(Stage):
+    db = DB_PATH     # Lexicon entities, like the standalone miner
+
+    def prepare(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS entities (id INTEGER PRIMARY KEY, name TEXT UNIQUE, type TEXT, attributes TEXT)")
+        conn.commit()
+
+    def accepts(self, ctx):
+        return ctx.in_folder("hermetic")
+
+    def process(self, ctx, writer):
+        for figure, period, attr in find_hermetic_figures(ctx.text(10, lower=True), ctx.filename):
+            writer.add("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)",
+                       (figure, "Hermetic Figure", attr))
+
 def mine_hermetic(db_path, scan_dir):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -65,15 +92,12 @@ def mine_hermetic(db_path, scan_dir):
 
         found_periods = set()
 
-        for period, figures in PERIODS.items():
-            for figure in figures:
-                if re.search(r'\b' + re.escape(figure.lower()) + r'\b', text):
-                    found_periods.add(period)
-                    attr = json.dumps({"source": filename, "period": period, "category": "figure"})
-                    try:
-                        cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
-                                       (figure.title(), "Hermetic Figure", attr))
-                    except: pass
+        for figure, period, attr in find_hermetic_figures(text, filename):
+            found_periods.add(period)
+            try:
+                cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
+                               (figure, "Hermetic Figure", attr))
+            except: pass
         
         # Determine likely period of the text itself
         if found_periods:
@@ -91,7 +115,8 @@ def mine_hermetic(db_path, scan_dir):
     print("Hermetic Mining Complete.")
 
 if __name__ == "__main__":
-    if os.path.exists(HERMETIC_DIR):
-        mine_hermetic(DB_PATH, HERMETIC_DIR)
-    else:
-        print(f"Directory not found: {HERMETIC_DIR}")
+    with profiling():
+        if os.path.exists(HERMETIC_DIR):
+            mine_hermetic(DB_PATH, HERMETIC_DIR)
+        else:
+            print(f"Directory not found: {HERMETIC_DIR}")
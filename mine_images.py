@@ -3,70 +3,392 @@ import fitz  # PyMuPDF
 import sqlite3
 import hashlib
 import json
+import argparse
+from multiprocessing import Pool, cpu_count
+from mining_pipeline import Stage, register_stage
+import instrumentation
+from instrumentation import profiling
+from checkpoints import Checkpoint
+import settings
 
-DB_NAME = "esoteric.db"
+# NumPy is only needed for perceptual hashes
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Pillow is only needed for WebP derivatives
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+DB_NAME = settings.DB_PATH
 OUTPUT_DIR = "docs/vault"
+IMAGES_JSON = "docs/images.json"
 MIN_WIDTH = 50
 MIN_HEIGHT = 50
+COMMIT_EVERY = 20   # Documents between commits
+HASH_SIDE = 64      # Pixmaps are shrunk towards this before hashing
+
+# Derivative kind -> (vault subfolder, bounding box, WebP quality)
+DERIVATIVES = {
+    "thumb": ("thumbs", 256, 70),
+    "preview": ("previews", 1024, 80),
+}
+
+# Columns added to `images` after the original schema
+IMAGE_COLUMNS = {
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "dhash": "TEXT",
+    "phash": "TEXT",
+    "cluster_id": "TEXT",
+    "thumb_path": "TEXT",
+    "thumb_width": "INTEGER",
+    "thumb_height": "INTEGER",
+    "preview_path": "TEXT",
+    "preview_width": "INTEGER",
+    "preview_height": "INTEGER",
+}
+
+# Hashes already in the vault, set per worker process by init_worker
+KNOWN_HASHES = set()
+
+def init_image_schema(conn):
+    """Adds the dimension/perceptual-hash columns to an existing images table."""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(images)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, decl in IMAGE_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE images ADD COLUMN {column} {decl}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_cluster ON images(cluster_id)")
+    # One row per mined document, so documents without qualifying images are not re-opened every run
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_mined_docs (
+            doc_id TEXT PRIMARY KEY,
+            images INTEGER,
+            mined_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+# ---------------------------------------------------------
+# Perceptual Hashes
+# ---------------------------------------------------------
+# dHash compares neighbouring pixels of a 9x8 grayscale
+# thumbnail; pHash keeps the sign of the low 8x8 DCT terms
+# of a 32x32 thumbnail against their median. Both survive
+# rescans, resizing and recompression, so the same plate in
+# two printings lands a few bits apart. Hashes are stored
+# as 16-char hex strings (64 bits).
+# ---------------------------------------------------------
+
+def area_resize(pixels, height, width):
+    """Box-filter downsample of a 2-D array to (height, width)."""
+    ys = np.linspace(0, pixels.shape[0], height + 1).astype(int)
+    xs = np.linspace(0, pixels.shape[1], width + 1).astype(int)
+    if (np.diff(ys) == 0).any() or (np.diff(xs) == 0).any():
+        # Smaller than the target: nearest-neighbour upsample
+        return pixels[ys[:-1]][:, xs[:-1]]
+    pixels = np.add.reduceat(pixels, ys[:-1], axis=0) / np.diff(ys)[:, None]
+    return np.add.reduceat(pixels, xs[:-1], axis=1) / np.diff(xs)[None, :]
+
+def dct_matrix(n):
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+DCT_32 = dct_matrix(32) if HAS_NUMPY else None
+
+def bits_to_hex(bits):
+    return np.packbits(bits.flatten()).tobytes().hex()
+
+def hash_pixels(pixels):
+    """(dhash, phash) hex strings for a 2-D grayscale float array."""
+    small = area_resize(pixels, 8, 9)
+    dhash = bits_to_hex(small[:, 1:] > small[:, :-1])
+
+    coeffs = DCT_32 @ area_resize(pixels, 32, 32) @ DCT_32.T
+    low = coeffs[:8, :8].flatten()
+    phash = bits_to_hex(low > np.median(low[1:]))
+    return dhash, phash
+
+def perceptual_hashes(pix):
+    """(dhash, phash) for a PyMuPDF Pixmap, or (None, None) if it cannot be hashed."""
+    if not HAS_NUMPY or pix.colorspace is None:
+        return None, None
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    # Halve in place while both sides stay above HASH_SIDE
+    steps = 0
+    while min(pix.width, pix.height) >> (steps + 1) >= HASH_SIDE:
+        steps += 1
+    if steps:
+        pix.shrink(steps)
+    pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return hash_pixels(pixels.astype(np.float32))
+
+def hamming(a, b):
+    """Bit distance between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def mine_document_images(doc, doc_id, topic, known_hashes=None):
+    """Saves qualifying images of an open PyMuPDF document to the vault; yields image rows."""
+    known_hashes = KNOWN_HASHES if known_hashes is None else known_hashes
+    seen_xrefs = set()
+    for page_index in range(len(doc)):
+        page = doc[page_index]
+        image_list = page.get_images(full=True)
+
+        for img in image_list:
+            # (xref, smask, width, height, ...): dedup and size-filter before extracting
+            xref, width, height = img[0], img[2], img[3]
+            if xref in seen_xrefs:
+                continue
+            seen_xrefs.add(xref)
+
+            # Basic size filter to avoid icons/UI elements
+            if width < MIN_WIDTH or height < MIN_HEIGHT:
+                continue
+
+            base_image = doc.extract_image(xref)
+            if not base_image:
+                continue
+            image_bytes = base_image["image"]
+            ext = base_image["ext"]
+
+            img_hash = hashlib.sha256(image_bytes).hexdigest()
+            img_id = img_hash[:16]
+            img_filename = f"{img_id}.{ext}"
+
+            # Save to vault (skip the disk entirely for images we already hold)
+            dhash = phash = None
+            if img_hash not in known_hashes:
+                try:
+                    dhash, phash = perceptual_hashes(fitz.Pixmap(doc, xref))
+                except Exception:
+                    pass
+                img_save_path = os.path.join(OUTPUT_DIR, img_filename)
+                if not os.path.exists(img_save_path):
+                    tmp_path = f"{img_save_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(image_bytes)
+                    os.replace(tmp_path, img_save_path)
+                known_hashes.add(img_hash)
+
+            yield (img_id, doc_id, page_index + 1, f"vault/{img_filename}", img_hash, topic,
+                   width, height, dhash, phash)
+
+# Rows for already-known images carry no hashes; keep the stored ones,
+# and keep the canonical path of images folded into a cluster
+INSERT_IMAGE_SQL = '''
+    INSERT INTO images (id, doc_id, page_number, path, sha256, domain, width, height, dhash, phash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        doc_id = excluded.doc_id,
+        page_number = excluded.page_number,
+        path = CASE WHEN images.cluster_id IS NOT NULL AND images.cluster_id != images.id
+                    THEN images.path ELSE excluded.path END,
+        domain = excluded.domain,
+        width = excluded.width,
+        height = excluded.height,
+        dhash = COALESCE(excluded.dhash, images.dhash),
+        phash = COALESCE(excluded.phash, images.phash)
+'''
+
+MARK_MINED_SQL = "INSERT OR REPLACE INTO image_mined_docs (doc_id, images) VALUES (?, ?)"
+
+@register_stage("images")
+class ImageStage(Stage):
+    def __init__(self):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        self.schema_ready = False
 
-def mine_images(db_path, root_dir):
+    def process(self, ctx, writer):
+        if not self.schema_ready:
+            init_image_schema(writer.conn)
+            self.schema_ready = True
+        found = 0
+        for row in mine_document_images(ctx.fitz_doc, ctx.doc_id, ctx.topic):
+            writer.add(INSERT_IMAGE_SQL, row)
+            found += 1
+        writer.add(MARK_MINED_SQL, (ctx.doc_id, found))
+
+    def finish(self, writer):
+        init_image_schema(writer.conn)
+        writer.flush()
+        build_derivatives(writer.conn)
+        export_images_json(writer.conn)
+
+# ---------------------------------------------------------
+# Derivatives
+# ---------------------------------------------------------
+# Galleries load a bounded thumbnail and a mid-size preview
+# (WebP) instead of the vault original. A derivative is
+# rebuilt only when it is missing or older than its source;
+# images sharing a vault file share its derivatives.
+# ---------------------------------------------------------
+
+def derivative_path(src_path, kind):
+    """vault/<id>.<ext> -> vault/<folder>/<id>.webp"""
+    folder = DERIVATIVES[kind][0]
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    return f"vault/{folder}/{stem}.webp"
+
+def render_derivatives(src_path):
+    """Worker: (src_path, {kind: (path, width, height)}, error) for one vault file."""
+    full_src = os.path.join("docs", src_path)
+    try:
+        src_mtime = os.path.getmtime(full_src)
+        out, image = {}, None
+        for kind, (_, box, quality) in DERIVATIVES.items():
+            rel = derivative_path(src_path, kind)
+            full = os.path.join("docs", rel)
+            if os.path.exists(full) and os.path.getmtime(full) >= src_mtime:
+                with Image.open(full) as done:
+                    out[kind] = (rel, done.width, done.height)
+                continue
+            if image is None:
+                image = Image.open(full_src)
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            derived = image.copy()
+            derived.thumbnail((box, box))
+            tmp = f"{full}.{os.getpid()}.tmp"
+            derived.save(tmp, "WEBP", quality=quality, method=4)
+            os.replace(tmp, full)
+            out[kind] = (rel, derived.width, derived.height)
+        return src_path, out, None
+    except Exception as e:
+        return src_path, {}, str(e)
+
+def build_derivatives(conn, workers=None):
+    """Renders missing/stale derivatives in parallel and records them; returns files processed."""
+    if not HAS_PIL:
+        print("Pillow not installed; skipping thumbnails and previews.")
+        return 0
+    for folder, _, _ in DERIVATIVES.values():
+        os.makedirs(os.path.join(OUTPUT_DIR, folder), exist_ok=True)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT path FROM images WHERE path IS NOT NULL")
+    sources = [r[0] for r in cursor.fetchall() if os.path.exists(os.path.join("docs", r[0]))]
+
+    done = 0
+    with Pool(workers or cpu_count()) as pool:
+        for src_path, out, error in pool.imap_unordered(render_derivatives, sources, chunksize=8):
+            if error:
+                print(f"  Error rendering {src_path}: {error}")
+                continue
+            thumb = out.get("thumb", (None, None, None))
+            preview = out.get("preview", (None, None, None))
+            cursor.execute('''
+                UPDATE images SET thumb_path = ?, thumb_width = ?, thumb_height = ?,
+                                  preview_path = ?, preview_width = ?, preview_height = ?
+                WHERE path = ?
+            ''', (*thumb, *preview, src_path))
+            done += 1
+            if done % 500 == 0:
+                conn.commit()
+    conn.commit()
+    return done
+
+def export_images_json(conn, export_path=IMAGES_JSON):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, doc_id, page_number, path, domain, width, height, cluster_id,
+               thumb_path, thumb_width, thumb_height, preview_path, preview_width, preview_height
+        FROM images ORDER BY doc_id, page_number, id
+    ''')
+    keys = [d[0] for d in cursor.description]
+    images = [dict(zip(keys, row)) for row in cursor.fetchall()]
+    with open(export_path, "w", encoding="utf-8") as f:
+        json.dump(images, f, indent=2)
+    return len(images)
+
+def init_worker(known_hashes):
+    global KNOWN_HASHES
+    KNOWN_HASHES = known_hashes
+
+def mine_path(task):
+    """Worker: mines one PDF, returns (path, rows, error)."""
+    doc_id, doc_path, topic = task
+    try:
+        doc = fitz.open(doc_path)
+        try:
+            rows = list(mine_document_images(doc, doc_id, topic))
+        finally:
+            doc.close()
+        return doc_path, rows, None
+    except Exception as e:
+        return doc_path, [], str(e)
+
+def mine_images(db_path, root_dir, workers=None, force=False, resume=False):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     conn = sqlite3.connect(db_path)
+    init_image_schema(conn)
     cursor = conn.cursor()
-    
+
     # Get all documents
     cursor.execute("SELECT id, path, topic FROM documents")
     docs = cursor.fetchall()
-    
+
+    cursor.execute("SELECT sha256 FROM images")
+    known_hashes = {r[0] for r in cursor.fetchall() if r[0]}
+    done_docs = set()
+    if not force:
+        # Documents mined before image_mined_docs existed only show up through their images
+        cursor.execute("SELECT doc_id FROM image_mined_docs UNION SELECT doc_id FROM images")
+        done_docs = {r[0] for r in cursor.fetchall()}
+
+    checkpoint = Checkpoint(conn, "mine_images.py", {"root": os.path.abspath(root_dir), "force": force},
+                            resume=resume, batch=COMMIT_EVERY)
+    tasks = [(doc_id, path, topic) for doc_id, path, topic in docs
+             if doc_id not in done_docs and not checkpoint.is_done(doc_id) and path and os.path.exists(path)]
+    doc_ids = {path: doc_id for doc_id, path, _ in tasks}
+    workers = workers or cpu_count()
+    print(f"Mining {len(tasks)} documents with {workers} workers ({len(done_docs)} already mined, {len(known_hashes)} images known)...")
+    if instrumentation.ACTIVE_PROFILER:
+        print("⚠️ --profile covers this process only; extraction runs in the worker processes and is not in the profile.")
+
     image_count = 0
-    
-    for doc_id, doc_path, topic in docs:
-        if not os.path.exists(doc_path):
-            continue
-            
-        print(f"Mining images from: {os.path.basename(doc_path)}...")
-        try:
-            doc = fitz.open(doc_path)
-            for page_index in range(len(doc)):
-                page = doc[page_index]
-                image_list = page.get_images(full=True)
-                
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    ext = base_image["ext"]
-                    
-                    # Basic size filter to avoid icons/UI elements
-                    if base_image["width"] < MIN_WIDTH or base_image["height"] < MIN_HEIGHT:
-                        continue
-                        
-                    img_hash = hashlib.sha256(image_bytes).hexdigest()
-                    img_id = img_hash[:16]
-                    img_filename = f"{img_id}.{ext}"
-                    img_save_path = os.path.join(OUTPUT_DIR, img_filename)
-                    
-                    # Save to vault
-                    if not os.path.exists(img_save_path):
-                        with open(img_save_path, "wb") as f:
-                            f.write(image_bytes)
-                    
-                    # Link in database
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO images (id, doc_id, page_number, path, sha256, domain)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (img_id, doc_id, page_index + 1, f"vault/{img_filename}", img_hash, topic))
-                    
-                    image_count += 1
-                    
-            doc.close()
-        except Exception as e:
-            # print(f"  Error mining {doc_path}: {e}")
-            continue
-            
-    conn.commit()
+    doc_count = 0
+
+    with Pool(workers, initializer=init_worker, initargs=(known_hashes,)) as pool:
+        for doc_path, rows, error in pool.imap_unordered(mine_path, tasks):
+            # Link in database
+            cursor.executemany(INSERT_IMAGE_SQL, rows)
+            image_count += len(rows)
+            doc_count += 1
+            if error:
+                print(f"  Error mining {os.path.basename(doc_path)}: {error}")
+                checkpoint.failed(doc_ids[doc_path])
+            else:
+                # Image rows and the document's marks commit together every COMMIT_EVERY documents
+                cursor.execute(MARK_MINED_SQL, (doc_ids[doc_path], len(rows)))
+                checkpoint.done(doc_ids[doc_path])
+            if doc_count % COMMIT_EVERY == 0:
+                print(f"  Mined {doc_count}/{len(tasks)} documents ({image_count} images)...")
+
+    checkpoint.finish()
+
+    rendered = build_derivatives(conn, workers)
+    exported = export_images_json(conn)
     conn.close()
-    print(f"Mining complete. Extracted {image_count} images.")
+    print(f"Mining complete. Extracted {image_count} images; derivatives for {rendered} files; {exported} images exported.")
 
 if __name__ == "__main__":
-    mine_images(DB_NAME, ".")
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+        parser.add_argument("--force", action="store_true", help="Re-mine documents that were already mined")
+        parser.add_argument("--resume", action="store_true", help="Continue the last unfinished run, skipping documents it completed")
+        args = parser.parse_args()
+        mine_images(DB_NAME, ".", workers=args.workers, force=args.force, resume=args.resume)
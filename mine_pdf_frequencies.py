@@ -3,6 +3,9 @@ import sqlite3
 import json
 import re
 from collections import Counter
+from mining_pipeline import Stage, register_stage
+from instrumentation import profiling
+import settings
 
 # Try importing pypdf
 try:
@@ -11,11 +14,9 @@ try:
 except ImportError:
     HAS_PYPDF = False
 
-DB_NAME = "esoteric.db"
-PATHS = {
-    "Alchemy": r"e:\pdf\alchemy",
-    "Hermetic": r"e:\pdf\hermetic"
-}
+DB_NAME = settings.DB_PATH
+PATHS = settings.CORPUS_ROOTS
+DOCS_PER_DOMAIN = 50    # Documents sampled per domain; the counters only need a representative slice
 
 STOPWORDS = {"the", "and", "that", "this", "from", "with", "which", "their", "they", "were", "been", "have", "would", "could", "should"}
 
@@ -34,6 +35,52 @@ def extract_text(filepath, max_pages=20):
         print(f"Error reading {filepath}: {e}")
         return ""
 
+def count_terms(text, word_counter, phrase_counter):
+    # Clean and tokenize
+    words = re.findall(r'\b[A-Z][a-z]{3,}\b|\b[a-z]{5,}\b', text)
+    
+    # Filter stopwords and lowercase small words
+    cleaned_words = [w for w in words if w.lower() not in STOPWORDS]
+    word_counter.update(cleaned_words)
+    
+    # Simple bigrams
+    if len(cleaned_words) > 1:
+        bigrams = [" ".join(cleaned_words[i:i+2]) for i in range(len(cleaned_words)-1)]
+        phrase_counter.update(bigrams)
+
+def top_candidates(domain, word_counter):
+    """Yields (name, type, attributes) for frequent capitalized words (names/jargon)."""
+    for name, count in word_counter.most_common(200):
+        if name[0].isupper() and count > 10:
+            attr = json.dumps({"source": "Frequency Mining", "frequency": count})
+            yield name, f"{domain} Topic", attr
+
+@register_stage("frequencies")
+class FrequencyStage(Stage):
+    """Accumulates per-domain counters over the first DOCS_PER_DOMAIN documents; writes once in finish()."""
+    def __init__(self):
+        self.counters = {domain: (Counter(), Counter()) for domain in PATHS}
+        self.seen = Counter()
+
+    def domain_of(self, ctx):
+        return next((d for d in PATHS if ctx.in_folder(d.lower())), None)
+
+    def accepts(self, ctx):
+        domain = self.domain_of(ctx)
+        return domain is not None and self.seen[domain] < DOCS_PER_DOMAIN
+
+    def process(self, ctx, writer):
+        domain = self.domain_of(ctx)
+        self.seen[domain] += 1
+        word_counter, phrase_counter = self.counters[domain]
+        count_terms(ctx.text(20), word_counter, phrase_counter)
+
+    def finish(self, writer):
+        for domain, (word_counter, _) in self.counters.items():
+            for name, entity_type, attr in top_candidates(domain, word_counter):
+                writer.add("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)",
+                           (name, entity_type, attr))
+
 def mine():
     if not HAS_PYPDF:
         print("pypdf not installed. Aborting.")
@@ -57,31 +104,17 @@ def mine():
                 if file.lower().endswith(".pdf"):
                     file_list.append(os.path.join(root, file))
 
-        print(f"Found {len(file_list)} PDFs. Processing top 50 for depth...")
-        for filepath in file_list[:50]:
+        print(f"Found {len(file_list)} PDFs. Processing top {DOCS_PER_DOMAIN} for depth...")
+        for filepath in file_list[:DOCS_PER_DOMAIN]:
             text = extract_text(filepath)
             if not text: continue
             
-            # Clean and tokenize
-            words = re.findall(r'\b[A-Z][a-z]{3,}\b|\b[a-z]{5,}\b', text)
-            
-            # Filter stopwords and lowercase small words
-            cleaned_words = [w for w in words if w.lower() not in STOPWORDS]
-            word_counter.update(cleaned_words)
-            
-            # Simple bigrams
-            if len(cleaned_words) > 1:
-                bigrams = [" ".join(cleaned_words[i:i+2]) for i in range(len(cleaned_words)-1)]
-                phrase_counter.update(bigrams)
+            count_terms(text, word_counter, phrase_counter)
 
         # Insert Top Words (Names/Jargon)
         # We only take capitalized words as potential names/entities
-        top_candidates = [w for w, count in word_counter.most_common(200) if w[0].isupper() and count > 10]
-        
         added = 0
-        for name in top_candidates:
-            entity_type = f"{domain} Topic"
-            attr = json.dumps({"source": "Frequency Mining", "frequency": word_counter[name]})
+        for name, entity_type, attr in top_candidates(domain, word_counter):
             try:
                 cursor.execute("INSERT OR IGNORE INTO entities (name, type, attributes) VALUES (?, ?, ?)", 
                                (name, entity_type, attr))
@@ -94,4 +127,5 @@ def mine():
     conn.close()
 
 if __name__ == "__main__":
-    mine()
+    with profiling():
+        mine()
@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import argparse
+import importlib
+from instrumentation import RunReport, profiling
+import settings
+
+# Try importing pypdf for text extraction
+try:
+    import pypdf
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+# ---------------------------------------------------------
+# Single-Pass Mining Pipeline
+# ---------------------------------------------------------
+# Every miner used to walk the disk on its own, re-open each
+# PDF and commit separately. Here each document is opened
+# once into a DocumentContext; registered miner stages then
+# run over the in-memory text/images and queue their writes
+# on a BatchWriter that flushes with executemany. Documents
+# are read from --db; a stage whose `db` is set (the lexicon
+# miners) writes to that database instead, through one
+# writer per database.
+# ---------------------------------------------------------
+
+DB_NAME = settings.DB_PATH
+MAX_PAGES = 20      # Deepest page window any stage asks for
+BATCH_DOCS = 25     # Documents between write flushes
+
+# Stage name -> module defining it (imported only when selected)
+STAGE_MODULES = {
+    "alchemy": "mine_alchemy_specialized",
+    "hermetic": "mine_hermetic_lineages",
+    "frequencies": "mine_pdf_frequencies",
+    "images": "mine_images",
+    "hermetic_deep": "scripts.mine_hermetic_deep",
+}
+
+STAGES = {}
+
+def register_stage(name):
+    """Class decorator used by miner modules to plug a stage into the pipeline."""
+    def wrap(cls):
+        cls.name = name
+        STAGES[name] = cls
+        return cls
+    return wrap
+
+class Stage:
+    """Base miner stage. Subclasses override accepts/process/finish."""
+    name = "stage"
+    db = None           # Database the stage writes to; None = the pipeline's --db
+
+    def prepare(self, conn):
+        """Called once with the stage's target connection before any document."""
+        pass
+
+    def accepts(self, ctx):
+        return True
+
+    def process(self, ctx, writer):
+        raise NotImplementedError
+
+    def finish(self, writer):
+        pass
+
+class DocumentContext:
+    """Per-document data produced once and shared by every stage."""
+    def __init__(self, doc_id, path, filename, topic, report=None):
+        self.doc_id = doc_id
+        self.path = path
+        self.filename = filename or os.path.basename(path)
+        self.topic = topic or "General"
+        self._pages = None
+        self._text_cache = {}
+        self._fitz_doc = None
+        self.report = report or RunReport()
+
+    @property
+    def pages(self):
+        if self._pages is None:
+            with self.report.span("extract"):
+                self._pages = extract_pages(self.path, MAX_PAGES, self.report)
+            self.report.count("pages", len(self._pages))
+        return self._pages
+
+    def text(self, max_pages=10, lower=False):
+        key = (max_pages, lower)
+        if key not in self._text_cache:
+            text = " ".join(p for p in self.pages[:max_pages] if p).strip()
+            self._text_cache[key] = text.lower() if lower else text
+        return self._text_cache[key]
+
+    def in_folder(self, keyword):
+        return keyword in self.path.lower() or keyword in self.topic.lower()
+
+    @property
+    def fitz_doc(self):
+        """PyMuPDF handle for image stages; opened at most once."""
+        if self._fitz_doc is None:
+            import fitz  # PyMuPDF
+            self._fitz_doc = fitz.open(self.path)
+        return self._fitz_doc
+
+    def close(self):
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+
+def extract_pages(filepath, max_pages, report=None):
+    if not HAS_PYPDF: return []
+    try:
+        reader = pypdf.PdfReader(filepath)
+        pages = []
+        for i in range(min(len(reader.pages), max_pages)):
+            try:
+                pages.append(reader.pages[i].extract_text() or "")
+            except Exception as e:
+                if report: report.error(f"{filepath}#page{i + 1}", e)
+                pages.append("")
+        return pages
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}")
+        if report: report.error(filepath, e)
+        return []
+
+class BatchWriter:
+    """Queues statements from all stages and flushes them grouped by SQL."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = {}
+        self.rows = 0
+
+    def add(self, sql, params):
+        self.pending.setdefault(sql, []).append(params)
+
+    def flush(self):
+        cursor = self.conn.cursor()
+        for sql, batch in self.pending.items():
+            cursor.executemany(sql, batch)
+            self.rows += len(batch)
+        self.pending = {}
+        self.conn.commit()
+
+def load_stages(names):
+    for name in names:
+        if name not in STAGES:
+            importlib.import_module(STAGE_MODULES[name])
+    return [STAGES[name]() for name in names]
+
+def run_pipeline(db_path, stage_names, limit=None, report=None):
+    owns_report = report is None
+    report = report or RunReport("mining_pipeline.py")
+    stages = load_stages(stage_names)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    writers = {db_path: BatchWriter(conn)}
+    stage_writers = {}
+    for stage in stages:
+        target = stage.db or db_path
+        if target not in writers:
+            writers[target] = BatchWriter(sqlite3.connect(target))
+        stage_writers[stage.name] = writers[target]
+        stage.prepare(writers[target].conn)
+
+    cursor.execute("SELECT id, path, filename, topic FROM documents")
+    docs = cursor.fetchall()
+    if limit: docs = docs[:limit]
+    print(f"Running stages [{', '.join(s.name for s in stages)}] over {len(docs)} documents...")
+
+    processed = 0
+    for doc_id, path, filename, topic in docs:
+        if not path or not os.path.exists(path):
+            continue
+        ctx = DocumentContext(doc_id, path, filename, topic, report)
+        try:
+            with report.item(path):
+                for stage in stages:
+                    if stage.accepts(ctx):
+                        with report.span(stage.name):
+                            stage.process(ctx, stage_writers[stage.name])
+        except Exception as e:
+            print(f"  Error mining {ctx.filename}: {e}")
+            report.error(path, e)
+        finally:
+            ctx.close()
+
+        processed += 1
+        report.count("files")
+        if processed % BATCH_DOCS == 0:
+            with report.span("sql"):
+                for writer in writers.values():
+                    writer.flush()
+            print(f"  Mined {processed} documents...")
+
+    for stage in stages:
+        with report.span(f"{stage.name}.finish"):
+            stage.finish(stage_writers[stage.name])
+    with report.span("sql"):
+        for writer in writers.values():
+            writer.flush()
+    for writer in writers.values():
+        writer.conn.close()
+    rows = sum(writer.rows for writer in writers.values())
+    report.count("rows", rows)
+    print(f"Pipeline complete. Documents: {processed}. Rows written: {rows}.")
+    if owns_report:
+        report.write()
+        report.print_summary()
+
+if __name__ == "__main__":
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--db", default=DB_NAME)
+        parser.add_argument("--stages", default=",".join(STAGE_MODULES), help="Comma-separated stage names")
+        parser.add_argument("--limit", type=int, default=None)
+        args = parser.parse_args()
+
+        # Stage modules register against the importable module, not __main__
+        import mining_pipeline
+        mining_pipeline.run_pipeline(args.db, [s.strip() for s in args.stages.split(",") if s.strip()], limit=args.limit)
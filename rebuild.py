@@ -0,0 +1,383 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import argparse
+from datetime import datetime
+import settings
+
+# ---------------------------------------------------------
+# Rebuild Runner
+# ---------------------------------------------------------
+# The whole rebuild as a DAG of stages. Each stage declares
+# its inputs and outputs:
+#   "table:<name>"  a table in the stage's database
+#   "table:<name>@<db>"  a table in another database
+#   "pdfs:<dir>"    the PDF tree under a directory
+#   "chats:<dir>"   the chat exports (*/index.html) under a directory
+#   anything else   a file path
+# A stage depends on every earlier stage whose outputs it
+# reads. Its fingerprint covers its script, command and
+# inputs; when that matches the last successful run (and its
+# output files exist) the stage is skipped. Ready stages run
+# concurrently, except that stages writing the same database
+# take turns.
+# ---------------------------------------------------------
+
+DB_NAME = settings.DB_PATH
+STATE_FILE = "data/snapshots/rebuild_state.json"
+JOBS = 4
+HASH_CHUNK = 1024 * 1024
+
+STAGES = [
+    {"name": "scan", "cmd": ["scan.py", "--enrich"],
+     "inputs": ["pdfs:."],
+     "outputs": ["table:documents", "table:chunks", "table:entities", "table:relationships"]},
+    {"name": "chats", "cmd": ["ingest_chats.py"],
+     "inputs": [f"chats:{d}" for d in settings.CHATS_DIRS],
+     "outputs": ["table:chats", "table:chat_messages", "table:prompts", "table:tables"]},
+    {"name": "miners", "cmd": ["mining_pipeline.py", "--stages", "frequencies,hermetic_deep"],
+     "inputs": ["table:documents", "mining_pipeline.py", "mine_pdf_frequencies.py", "scripts/mine_hermetic_deep.py"],
+     "outputs": ["table:entities", "table:documents"]},
+    {"name": "lexicon_miners", "cmd": ["mining_pipeline.py", "--stages", "alchemy,hermetic"], "db": settings.LEXICON_DB,
+     "inputs": [f"table:documents@{settings.DB_PATH}", "mining_pipeline.py", "mine_alchemy_specialized.py",
+                "mine_hermetic_lineages.py"],
+     "outputs": ["table:entities"]},
+    {"name": "images", "cmd": ["mine_images.py"],
+     "inputs": ["table:documents", "mining_pipeline.py"],
+     "outputs": ["table:images", "table:image_mined_docs", "docs/images.json"]},
+    {"name": "image_clusters", "cmd": ["scripts/cluster_images.py"],
+     "inputs": ["table:images"],
+     "outputs": ["table:images"]},
+    {"name": "candidates", "cmd": ["scripts/mine_candidate_terms.py", "--stream"],
+     "inputs": ["table:chunks"],
+     "outputs": ["docs/candidate_terms.json"]},
+    {"name": "seed_dictionary", "cmd": ["scripts/seed_dictionary.py"],
+     "inputs": ["docs/candidate_terms.json"],
+     "outputs": ["table:dictionary_entries"]},
+    {"name": "dictionary", "cmd": ["build_dictionary.py"], "db": settings.LEXICON_DB,
+     "inputs": ["table:entities", f"table:chunks@{settings.DB_PATH}", "table:entry_synonyms", "scan.py"],
+     "outputs": ["table:dictionary_entries", "table:entry_sources"]},
+    {"name": "scholarly", "cmd": ["ingest_scholarly_data.py"], "db": settings.LEXICON_DB,
+     "inputs": ["table:entities", "../scholarly_compendium.md"],
+     "outputs": ["table:reference_sources", "table:reference_notes"]},
+    {"name": "export", "cmd": ["scan.py", "--dir", "docs"],
+     "inputs": ["table:documents", "table:chunks", "table:entities", "table:relationships", "table:chats",
+                "table:chat_messages", "table:prompts", "table:tables", "table:images", "table:metrics",
+                "table:reference_notes", "table:reference_sources", "table:entity_attributes"],
+     "outputs": ["docs/docs.json", "docs/docs.bin", "docs/facets.json", "docs/stats.json", "docs/lists.json", "docs/graph.json", "docs/search.json",
+                 "docs/chats.json", "docs/messages/index.json", "docs/entities.json", "docs/config.json"]},
+    {"name": "fix_links", "cmd": ["scripts/fix_links.py"],
+     "inputs": ["docs/docs.json", "pdfs:."],
+     "outputs": ["docs/docs.json", "docs/docs.bin", "table:file_catalog"]},
+    {"name": "audit", "cmd": ["scripts/audit_metadata_v10.py"],
+     "inputs": ["table:documents", "table:entities"],
+     "outputs": ["reports/metadata_richness_report.csv", "reports/metadata_richness_summary.json",
+                 "table:metadata_scores"]},
+    {"name": "atlas", "cmd": ["scripts/build_atlas.py"],
+     "inputs": ["table:chunks", "table:documents", "data/gazetteer.json"],
+     "outputs": ["docs/places.json", "table:places", "table:place_mentions"]},
+    {"name": "lineage", "cmd": ["scripts/mine_lineage.py"],
+     "inputs": [],
+     "outputs": ["docs/hermetic_lineage.json"]},
+    {"name": "lineage_analytics", "cmd": ["scripts/lineage_analytics.py"],
+     "inputs": ["docs/hermetic_lineage.json"],
+     "outputs": ["docs/lineage_analytics.json"]},
+    {"name": "graph_layout", "cmd": ["scripts/build_graph_layout.py"],
+     "inputs": ["table:documents", "table:entities", "table:relationships", "table:chats", "docs/config.json"],
+     "outputs": ["docs/graph/index.json"]},
+    {"name": "semantic", "cmd": ["semantic_index.py"],
+     "inputs": ["table:chunks", f"table:dictionary_entries@{settings.LEXICON_DB}"],
+     "outputs": ["data/semantic/meta.json", "data/semantic/vectors.f32"]},
+    {"name": "coverage", "cmd": ["scripts/dictionary_coverage.py"],
+     "inputs": ["table:dictionary_entries", "table:entities", "table:relationships"],
+     "outputs": ["docs/coverage.json"]},
+    {"name": "recommendations", "cmd": ["scripts/build_recommendations.py"],
+     "inputs": ["docs/docs.json", "docs/dictionary.json"],
+     "outputs": ["data/snapshots/recommendations.json"]},
+    {"name": "omni", "cmd": ["scripts/build_omni_index.py"],
+     "inputs": ["docs/docs.json", "docs/dictionary.json", "docs/entities.json"],
+     "outputs": ["data/snapshots/omni_index.json", "data/snapshots/omni_search_index.json"]},
+]
+
+def stage_db(stage):
+    return stage.get("db", DB_NAME)
+
+def table_ref(stage, resource):
+    """(database, table) for a "table:" resource; "@<db>" overrides the stage's database."""
+    name, _, db = resource[6:].partition("@")
+    return db or stage_db(stage), name
+
+def resource_key(stage, resource):
+    """Tables are qualified by database so esoteric.db and esoteric_v5.db never alias."""
+    if resource.startswith("table:"):
+        db, name = table_ref(stage, resource)
+        return f"{db}:table:{name}"
+    return resource
+
+def plan(stages):
+    """Dependencies: each stage waits on every earlier stage that writes one of its inputs."""
+    deps = {}
+    for i, stage in enumerate(stages):
+        wanted = {resource_key(stage, r) for r in stage["inputs"]}
+        deps[stage["name"]] = {
+            earlier["name"] for earlier in stages[:i]
+            if wanted & {resource_key(earlier, r) for r in earlier["outputs"]}
+        }
+    return deps
+
+# ---------------------------------------------------------
+# Fingerprints
+# ---------------------------------------------------------
+
+def init_table_versions(conn, tables):
+    """Per-table write counters bumped by triggers; existing tables only."""
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER DEFAULT 0)")
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    existing = {r[0] for r in cursor.fetchall()}
+    for table in tables:
+        if table not in existing:
+            continue
+        cursor.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+            END
+            ''')
+    conn.commit()
+
+def table_state(conn, table):
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM table_versions WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    if row is None:
+        return "absent"
+    count = cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    return f"{row[0]}/{count}"
+
+class Fingerprinter:
+    """Hashes stage inputs; file digests are reused while (size, mtime) are unchanged."""
+    def __init__(self, file_cache):
+        self.file_cache = file_cache
+
+    def file_digest(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "missing"
+        cached = self.file_cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(block)
+        self.file_cache[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def pdf_tree(self, root):
+        """Digest of (path, size, mtime) for every PDF, skipping dot-dirs and docs/."""
+        return self.file_tree(root, lambda name: name.lower().endswith(".pdf"))
+
+    def chat_tree(self, root):
+        """Digest of every chat export page under root (one index.html per session)."""
+        return self.file_tree(root, lambda name: name == "index.html")
+
+    def file_tree(self, root, wanted):
+        h = hashlib.sha256()
+        entries = []
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(".") and entry.name != "docs":
+                                stack.append(entry.path)
+                        elif wanted(entry.name):
+                            st = entry.stat()
+                            entries.append(f"{entry.path}\x1f{st.st_size}\x1f{st.st_mtime_ns}")
+            except OSError:
+                continue
+        for e in sorted(entries):
+            h.update(e.encode("utf-8", "surrogateescape"))
+        return f"{len(entries)}:{h.hexdigest()}"
+
+    def stage(self, stage):
+        parts = [json.dumps(stage["cmd"]), self.file_digest(stage["cmd"][0])]
+        tables = {}
+        for resource in stage["inputs"]:
+            if resource.startswith("table:"):
+                db, name = table_ref(stage, resource)
+                tables.setdefault(db, []).append(name)
+        conns = {}
+        for db, names in tables.items():
+            if os.path.exists(db):
+                conns[db] = sqlite3.connect(db, timeout=60)
+                init_table_versions(conns[db], names)
+        try:
+            for resource in sorted(stage["inputs"]):
+                if resource.startswith("table:"):
+                    db, name = table_ref(stage, resource)
+                    conn = conns.get(db)
+                    parts.append(f"{resource}={table_state(conn, name) if conn else 'absent'}")
+                elif resource.startswith("pdfs:"):
+                    parts.append(f"{resource}={self.pdf_tree(resource[5:])}")
+                elif resource.startswith("chats:"):
+                    parts.append(f"{resource}={self.chat_tree(resource[6:])}")
+                else:
+                    parts.append(f"{resource}={self.file_digest(resource)}")
+        finally:
+            for conn in conns.values():
+                conn.close()
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {"stages": {}, "files": {}}
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+def outputs_present(stage):
+    return all(os.path.exists(r) for r in stage["outputs"] if not r.startswith("table:"))
+
+# ---------------------------------------------------------
+# Runner
+# ---------------------------------------------------------
+
+async def run_stage(stage, log_dir):
+    log_path = os.path.join(log_dir, f"{stage['name']}.log")
+    with open(log_path, "wb") as log:
+        proc = await asyncio.create_subprocess_exec(sys.executable, *stage["cmd"], stdout=log, stderr=asyncio.subprocess.STDOUT)
+        return await proc.wait(), log_path
+
+async def rebuild(stages, force=False, jobs=JOBS, dry_run=False):
+    state = load_state()
+    fp = Fingerprinter(state.setdefault("files", {}))
+    deps = plan(stages)
+    by_name = {s["name"]: s for s in stages}
+    log_dir = os.path.join(os.path.dirname(STATE_FILE), "rebuild_logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    slots = asyncio.Semaphore(jobs)
+    db_locks = {}
+    done = {name: asyncio.Event() for name in by_name}
+    results = {}
+
+    def db_lock(db):
+        return db_locks.setdefault(db, asyncio.Lock())
+
+    async def fingerprint(stage):
+        """fp.stage installs version triggers (a write), so it holds the locks of every database it reads."""
+        dbs = sorted({table_ref(stage, r)[0] for r in stage["inputs"] if r.startswith("table:")})
+        for db in dbs:
+            await db_lock(db).acquire()
+        try:
+            return await asyncio.to_thread(fp.stage, stage)
+        finally:
+            for db in dbs:
+                db_lock(db).release()
+
+    async def execute(stage):
+        name = stage["name"]
+        try:
+            for dep in deps[name]:
+                await done[dep].wait()
+            if any(results.get(dep) in ("failed", "blocked") for dep in deps[name]):
+                results[name] = "blocked"
+                return
+
+            # Fingerprinting reads upstream tables, so it waits until they are final
+            key = await fingerprint(stage)
+            previous = state["stages"].get(name, {})
+            if not force and previous.get("fingerprint") == key and outputs_present(stage):
+                results[name] = "skipped"
+                print(f"  = {name} (unchanged)")
+                return
+            if dry_run:
+                results[name] = "would run"
+                print(f"  ? {name} (inputs changed)")
+                return
+
+            writes_db = any(r.startswith("table:") for r in stage["outputs"])
+            lock = db_lock(stage_db(stage)) if writes_db else None
+            async with slots:
+                if lock:
+                    await lock.acquire()
+                try:
+                    print(f"  > {name}: python {' '.join(stage['cmd'])}")
+                    started = time.perf_counter()
+                    code, log_path = await run_stage(stage, log_dir)
+                    seconds = round(time.perf_counter() - started, 2)
+                finally:
+                    if lock:
+                        lock.release()
+
+            if code != 0:
+                results[name] = "failed"
+                print(f"  ! {name} failed (exit {code}); see {log_path}")
+                return
+            # Stages may rewrite their own inputs; fingerprint the state they leave behind
+            state["stages"][name] = {
+                "fingerprint": await fingerprint(stage),
+                "finished_at": datetime.now().isoformat(),
+                "seconds": seconds,
+            }
+            save_state(state)
+            results[name] = "ran"
+            print(f"  ✓ {name} ({seconds}s)")
+        finally:
+            done[name].set()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(execute(s) for s in stages))
+    save_state(state)
+
+    summary = {}
+    for outcome in results.values():
+        summary[outcome] = summary.get(outcome, 0) + 1
+    print(f"Rebuild finished in {time.perf_counter() - started:.1f}s: " +
+          ", ".join(f"{n} {k}" for k, n in sorted(summary.items())))
+    return results
+
+def select(names):
+    if not names:
+        return STAGES
+    wanted = set(names.split(","))
+    unknown = wanted - {s["name"] for s in STAGES}
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+    return [s for s in STAGES if s["name"] in wanted]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental, concurrent rebuild of the whole corpus pipeline")
+    parser.add_argument("--only", default="", help="Comma-separated stage names (default: all)")
+    parser.add_argument("--force", action="store_true", help="Run stages even if their inputs are unchanged")
+    parser.add_argument("--jobs", type=int, default=JOBS, help="Stages allowed to run at once")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would run without running it")
+    parser.add_argument("--list", action="store_true", help="Print the stage graph and exit")
+    args = parser.parse_args()
+
+    stages = select(args.only)
+    if args.list:
+        for name, needs in plan(stages).items():
+            print(f"{name:18} <- {', '.join(sorted(needs)) or '-'}")
+    else:
+        asyncio.run(rebuild(stages, force=args.force, jobs=args.jobs, dry_run=args.dry_run))
@@ -5,6 +5,12 @@ import json
 import argparse
 import re
 from datetime import datetime
+from instrumentation import RunReport, profiling
+from checkpoints import Checkpoint
+from snapshots import take_snapshot
+from columnar import write_columnar
+from facets import write_facets
+import settings
 
 # Try importing pypdf for text extraction
 try:
@@ -14,8 +20,8 @@ except ImportError:
     HAS_PYPDF = False
 
 # --- Configuration ---
-DB_NAME = "esoteric.db"
-EXPORT_DIR = "docs"
+DB_NAME = settings.DB_PATH
+EXPORT_DIR = settings.EXPORT_DIR
 ROOT_DOCS_DIR = "."
 
 def init_db(conn):
@@ -64,6 +70,8 @@ def init_db(conn):
         FOREIGN KEY(target_id) REFERENCES entities(id)
     )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_relationships_source ON relationships(source_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_relationships_target ON relationships(target_id)")
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS images (
         id TEXT PRIMARY KEY,
@@ -99,7 +107,9 @@ def init_db(conn):
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         chat_id TEXT,
         sender TEXT,
+        role TEXT,
         content TEXT,
+        order_index INTEGER,
         FOREIGN KEY(chat_id) REFERENCES chats(id)
     )
     ''')
@@ -236,8 +246,129 @@ def init_db(conn):
     )
     ''')
     conn.commit()
+    init_entity_attributes(conn)
+    init_chunk_index(conn)
+    init_unique_links(conn)
 
-def extract_text_silent(filepath, max_pages=5):
+# Valid attribute objects only; anything else expands to no rows
+ATTRS_OBJECT = "CASE WHEN json_valid({0}) AND json_type({0}) = 'object' THEN {0} ELSE '{{}}' END"
+
+def init_entity_attributes(conn):
+    """
+    Normalised side table for entities.attributes, one row per key.
+    Triggers keep it in sync with every write to entities, so readers can
+    filter on indexed (key, value) pairs instead of decoding JSON per row.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entity_attributes'")
+    is_new = cursor.fetchone() is None
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS entity_attributes (
+        entity_id INTEGER,
+        key TEXT,
+        value,
+        PRIMARY KEY (entity_id, key),
+        FOREIGN KEY(entity_id) REFERENCES entities(id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entity_attributes_key_value ON entity_attributes(key, value)")
+
+    new_attrs = ATTRS_OBJECT.format("NEW.attributes")
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_entity_attributes_insert AFTER INSERT ON entities
+    BEGIN
+        INSERT OR REPLACE INTO entity_attributes (entity_id, key, value)
+        SELECT NEW.id, key, value FROM json_each({new_attrs});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_entity_attributes_update AFTER UPDATE OF attributes ON entities
+    BEGIN
+        DELETE FROM entity_attributes WHERE entity_id = OLD.id;
+        INSERT OR REPLACE INTO entity_attributes (entity_id, key, value)
+        SELECT NEW.id, key, value FROM json_each({new_attrs});
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_entity_attributes_delete AFTER DELETE ON entities
+    BEGIN
+        DELETE FROM entity_attributes WHERE entity_id = OLD.id;
+    END
+    ''')
+
+    if is_new:
+        # Backfill rows written before the side table existed
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO entity_attributes (entity_id, key, value)
+            SELECT e.id, j.key, j.value FROM entities e, json_each({ATTRS_OBJECT.format("e.attributes")}) j
+        ''')
+    conn.commit()
+
+def init_chunk_index(conn):
+    """
+    External-content FTS5 index over chunks.text_content, kept in sync by
+    triggers, so term lookups hit the inverted index instead of scanning text.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'")
+    is_new = cursor.fetchone() is None
+
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text_content, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_chunks_fts_insert AFTER INSERT ON chunks
+    BEGIN
+        INSERT INTO chunks_fts (rowid, text_content) VALUES (NEW.id, NEW.text_content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_chunks_fts_delete AFTER DELETE ON chunks
+    BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text_content) VALUES ('delete', OLD.id, OLD.text_content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_chunks_fts_update AFTER UPDATE OF text_content ON chunks
+    BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text_content) VALUES ('delete', OLD.id, OLD.text_content);
+        INSERT INTO chunks_fts (rowid, text_content) VALUES (NEW.id, NEW.text_content);
+    END
+    ''')
+
+    if is_new:
+        # Index chunks written before the FTS table existed
+        cursor.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+    conn.commit()
+
+def init_unique_links(conn):
+    """
+    One relationship row per (source, target, type) and one chunk per
+    (doc, text), so re-running or resuming a scan cannot duplicate them.
+    Rows duplicated by earlier runs are collapsed the first time through.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_relationships_unique'")
+    if cursor.fetchone():
+        return
+    cursor.execute('''
+        DELETE FROM relationships WHERE id NOT IN (
+            SELECT MIN(id) FROM relationships GROUP BY source_id, target_id, type
+        )
+    ''')
+    cursor.execute('''
+        DELETE FROM chunks WHERE id NOT IN (
+            SELECT MIN(id) FROM chunks GROUP BY doc_id, text_content
+        )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX idx_relationships_unique ON relationships(source_id, target_id, type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id)")
+    conn.commit()
+
+def extract_text_silent(filepath, max_pages=5, report=None):
     if not HAS_PYPDF: return ""
     try:
         reader = pypdf.PdfReader(filepath)
@@ -246,9 +377,13 @@ def extract_text_silent(filepath, max_pages=5):
             try:
                 page_text = reader.pages[i].extract_text()
                 if page_text: text += page_text + " "
-            except: continue
+                if report: report.count("pages")
+            except Exception as e:
+                if report: report.error(f"{filepath}#page{i + 1}", e)
+                continue
         return text.strip()
-    except:
+    except Exception as e:
+        if report: report.error(filepath, e)
         return ""
 
 def extract_meta_heuristics(text, filename, topic_movement):
@@ -294,12 +429,15 @@ def mine_names_heuristic(text):
             entities.append(full)
     return entities
 
-def scan_and_ingest(conn, root_dir, enrich=False):
+def scan_and_ingest(conn, root_dir, enrich=False, report=None, resume=False):
+    report = report or RunReport("scan.py")
     cursor = conn.cursor()
     target_path = os.path.normpath(root_dir)
     print(f"Target: {target_path}")
+    checkpoint = Checkpoint(conn, "scan.py", {"root": os.path.abspath(target_path), "enrich": enrich}, resume=resume)
     file_count = 0
     enriched_count = 0
+    skipped = 0
     
     for dirpath, dirnames, filenames in os.walk(target_path):
         # RELATIVE skip to allow folder names like 'brain' if they are in the library
@@ -313,54 +451,128 @@ def scan_and_ingest(conn, root_dir, enrich=False):
         for filename in filenames:
             if filename.lower().endswith(".pdf"):
                 filepath = os.path.join(dirpath, filename)
+                doc_id = None
                 try:
                     stats = os.stat(filepath)
                     doc_id = hashlib.md5(f"{filename}{stats.st_size}".encode()).hexdigest()[:12]
-                    
-                    # Read preamble for deep extraction
-                    preamble = extract_text_silent(filepath, max_pages=5)
-                    author, period = extract_meta_heuristics(preamble, filename, movement)
-                    
-                    # Clean title: Remove extension and author prefix if present
-                    clean_title = filename.rsplit(".", 1)[0]
-                    if " - " in clean_title: clean_title = clean_title.split(" - ", 1)[1].strip()
-
-                    cursor.execute('''
-                    INSERT OR REPLACE INTO documents (id, filename, path, topic, author, period, size, created_at, title)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (doc_id, filename, filepath, movement, author, period, stats.st_size, datetime.fromtimestamp(stats.st_ctime).isoformat(), clean_title))
-
-                    if enrich:
-                        text = extract_text_silent(filepath)
-                        if text:
-                            cursor.execute("INSERT INTO chunks (doc_id, text_content) VALUES (?, ?)", (doc_id, text[:2000]))
-                            names = mine_names_heuristic(text)
-                            for name in names:
-                                cursor.execute("INSERT OR IGNORE INTO entities (name, type) VALUES (?, ?)", (name, "Entity"))
-                                cursor.execute("SELECT id FROM entities WHERE name = ?", (name,))
-                                ent_id = cursor.fetchone()[0]
-                                cursor.execute("INSERT OR IGNORE INTO relationships (source_id, target_id, type) VALUES (?, ?, ?)", (doc_id, ent_id, "MENTIONS"))
-                            cursor.execute("UPDATE documents SET enriched = 1 WHERE id = ?", (doc_id,))
-                            enriched_count += 1
+                    if checkpoint.is_done(doc_id):
+                        skipped += 1
+                        continue
+
+                    with report.item(filepath):
+                        # Read preamble for deep extraction
+                        with report.span("extract"):
+                            preamble = extract_text_silent(filepath, max_pages=5, report=report)
+                        with report.span("parse"):
+                            author, period = extract_meta_heuristics(preamble, filename, movement)
+                        
+                        # Clean title: Remove extension and author prefix if present
+                        clean_title = filename.rsplit(".", 1)[0]
+                        if " - " in clean_title: clean_title = clean_title.split(" - ", 1)[1].strip()
+
+                        with report.span("sql"):
+                            cursor.execute('''
+                            INSERT OR REPLACE INTO documents (id, filename, path, topic, author, period, size, created_at, title)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (doc_id, filename, filepath, movement, author, period, stats.st_size, datetime.fromtimestamp(stats.st_ctime).isoformat(), clean_title))
+                        report.count("rows")
+
+                        if enrich:
+                            with report.span("extract"):
+                                text = extract_text_silent(filepath, report=report)
+                            if text:
+                                with report.span("match"):
+                                    names = mine_names_heuristic(text)
+                                with report.span("sql"):
+                                    # Re-enriching replaces the document's chunk rather than adding another
+                                    cursor.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+                                    cursor.execute("INSERT INTO chunks (doc_id, text_content) VALUES (?, ?)", (doc_id, text[:2000]))
+                                    for name in names:
+                                        cursor.execute("INSERT OR IGNORE INTO entities (name, type) VALUES (?, ?)", (name, "Entity"))
+                                        cursor.execute("SELECT id FROM entities WHERE name = ?", (name,))
+                                        ent_id = cursor.fetchone()[0]
+                                        cursor.execute("INSERT OR IGNORE INTO relationships (source_id, target_id, type) VALUES (?, ?, ?)", (doc_id, ent_id, "MENTIONS"))
+                                    cursor.execute("UPDATE documents SET enriched = 1 WHERE id = ?", (doc_id,))
+                                report.count("rows", 2 + 2 * len(names))
+                                enriched_count += 1
 
                     file_count += 1
+                    report.count("files")
+                    # Commits this batch's rows and file marks together every BATCH_FILES files
+                    with report.span("sql"):
+                        checkpoint.done(doc_id)
                     if file_count % 100 == 0:
                         print(f"  Processed {file_count} files...")
                         if enrich: print(f"  Enriched {enriched_count} files...")
-                        conn.commit()
                 except Exception as e:
                     print(f"Error processing {filename}: {e}")
+                    report.error(filepath, e)
+                    checkpoint.failed(doc_id or filepath)
                     continue
 
-    print(f"Scan complete. Cataloged: {file_count}. Enriched: {enriched_count}.")
-    conn.commit()
+    checkpoint.finish()
+    report.count("resumed_skips", skipped)
+    print(f"Scan complete. Cataloged: {file_count}. Enriched: {enriched_count}." +
+          (f" Skipped {skipped} already done." if skipped else ""))
+
+MESSAGE_PAGE = 2000     # Rows fetched per keyset page while exporting messages
+
+def export_messages(conn, export_path, static=False):
+    """
+    One messages/<chat_id>.json per chat plus messages/index.json, streamed
+    with keyset pagination on (chat_id, COALESCE(order_index, -1), id) so
+    memory holds one page and one chat at a time, and clients fetch only the
+    chats they show. The COALESCE keeps rows with a NULL order_index: a raw
+    row-value comparison against NULL is NULL and would drop them.
+    """
+    out_dir = os.path.join(export_path, "messages")
+    os.makedirs(out_dir, exist_ok=True)
+    index = {}
+
+    def flush(chat_id, messages):
+        if chat_id is None:
+            return
+        with open(os.path.join(out_dir, f"{chat_id}.json"), "w") as f:
+            json.dump(messages, f)
+        index[chat_id] = {"count": len(messages), "file": f"messages/{chat_id}.json"}
+
+    cursor = conn.cursor()
+    last = ("", -1, -1)
+    current, messages = None, []
+    while True:
+        cursor.execute('''
+            SELECT chat_id, role, content, order_index, id, COALESCE(order_index, -1) FROM chat_messages
+            WHERE (chat_id, COALESCE(order_index, -1), id) > (?, ?, ?)
+            ORDER BY chat_id, COALESCE(order_index, -1), id LIMIT ?
+        ''', (*last, MESSAGE_PAGE))
+        page = cursor.fetchall()
+        if not page:
+            break
+        for chat_id, role, content, order_index, _, _ in page:
+            if chat_id != current:
+                flush(current, messages)
+                current, messages = chat_id, []
+            if static:
+                content = "[CONTENT REDACTED FOR PUBLIC EXHIBIT]"
+            messages.append({"chat_id": chat_id, "role": role, "content": content, "index": order_index})
+        last = tuple(page[-1][i] for i in (0, 5, 4))
+    flush(current, messages)
+
+    # Chats that no longer exist lose their files
+    for name in os.listdir(out_dir):
+        if name.endswith(".json") and name != "index.json" and name[:-5] not in index:
+            os.remove(os.path.join(out_dir, name))
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump(index, f)
+    return len(index)
 
 def export_json(conn, export_path, static=False):
     cursor = conn.cursor()
     os.makedirs(export_path, exist_ok=True)
     
     # 1. Documents (Relative paths if static)
-    cursor.execute("SELECT id, filename, topic, author, period, size, created_at, path, century, language, summary, title FROM documents")
+    # rowid order: facets.json bitmaps address documents by their position here
+    cursor.execute("SELECT id, filename, topic, author, period, size, created_at, path, century, language, summary, title FROM documents ORDER BY rowid")
     docs = []
     for r in cursor.fetchall():
         path = r[7]
@@ -480,16 +692,23 @@ def export_json(conn, export_path, static=False):
         json.dump(all_ent, f, indent=2)
 
     # 5b. Lessons (For Lessons Lab)
-    cursor.execute("SELECT id, name, attributes FROM entities WHERE type = 'Lesson'")
+    cursor.execute('''
+        SELECT e.id, e.name,
+               COALESCE(c.value, 'General'), COALESCE(i.value, 'No insight provided.'), COALESCE(d.value, 'Unknown')
+        FROM entities e
+        LEFT JOIN entity_attributes c ON c.entity_id = e.id AND c.key = 'category'
+        LEFT JOIN entity_attributes i ON i.entity_id = e.id AND i.key = 'insight'
+        LEFT JOIN entity_attributes d ON d.entity_id = e.id AND d.key = 'designer'
+        WHERE e.type = 'Lesson'
+    ''')
     lessons = []
     for r in cursor.fetchall():
-        attrs = json.loads(r[2]) if r[2] else {}
         lessons.append({
             "id": f"L{str(r[0]).zfill(3)}",
             "title": r[1],
-            "category": attrs.get("category", "General"),
-            "insight": attrs.get("insight", "No insight provided."),
-            "designer": attrs.get("designer", "Unknown")
+            "category": r[2],
+            "insight": r[3],
+            "designer": r[4]
         })
     with open(os.path.join(export_path, "lessons.json"), "w") as f:
         json.dump(lessons, f, indent=2)
@@ -579,16 +798,7 @@ def export_json(conn, export_path, static=False):
     with open(os.path.join(export_path, "questions.json"), "w") as f:
         json.dump(all_questions, f, indent=2)
 
-    cursor.execute("SELECT chat_id, role, content, order_index FROM chat_messages")
-    all_messages = []
-    for r in cursor.fetchall():
-        content = r[2]
-        if static:
-            content = "[CONTENT REDACTED FOR PUBLIC EXHIBIT]"
-        all_messages.append({"chat_id": r[0], "role": r[1], "content": content, "index": r[3]})
-    
-    with open(os.path.join(export_path, "messages.json"), "w") as f:
-        json.dump(all_messages, f, indent=2)
+    export_messages(conn, export_path, static=static)
 
     # 6. Search Snippets
     search_index = {}
@@ -751,6 +961,8 @@ def export_json(conn, export_path, static=False):
     
     with open(os.path.join(export_path, "docs.json"), "w") as f:
         json.dump(full_docs, f, indent=2)
+    write_columnar(full_docs, os.path.join(export_path, "docs.bin"))
+    write_facets(conn, export_path)
 
     # 7. Project Metadata (Design Lab)
     # Parse task.md for stats
@@ -792,18 +1004,30 @@ def export_json(conn, export_path, static=False):
         }, f)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--dir", default=".")
-    parser.add_argument("--enrich", action="store_true")
-    parser.add_argument("--static", action="store_true")
-    args = parser.parse_args()
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--dir", default=".")
+        parser.add_argument("--enrich", action="store_true")
+        parser.add_argument("--static", action="store_true")
+        parser.add_argument("--resume", action="store_true", help="Continue the last unfinished scan of --dir, skipping files it completed")
+        args = parser.parse_args()
     
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    init_db(conn)
-    # Only ingest if not just exporting static
-    if args.dir != EXPORT_DIR:
-        scan_and_ingest(conn, args.dir, enrich=args.enrich)
+        report = RunReport("scan.py")
+        conn = sqlite3.connect(DB_NAME)
+        conn.row_factory = sqlite3.Row
+        init_db(conn)
+        # Only ingest if not just exporting static
+        if args.dir != EXPORT_DIR:
+            scan_and_ingest(conn, args.dir, enrich=args.enrich, report=report, resume=args.resume)
     
-    export_json(conn, EXPORT_DIR, static=args.static)
-    conn.close()
+        with report.span("json"):
+            export_json(conn, EXPORT_DIR, static=args.static)
+        # Row hashes for this export; the delta feeds the portal's "what's new"
+        with report.span("snapshot"):
+            delta = take_snapshot(conn)
+        print(f"Snapshot #{delta['id']}: " + (", ".join(
+            f"{t} +{c['counts']['added']} ~{c['counts']['changed']} -{c['counts']['removed']}"
+            for t, c in delta["tables"].items()) or "no changes"))
+        conn.close()
+        report.write()
+        report.print_summary()
@@ -2,80 +2,175 @@ import sqlite3
 import json
 import csv
 import os
-
-DB_NAME = "esoteric.db"
+import argparse
+from datetime import datetime
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
+
+DB_NAME = settings.DB_PATH
 OUTPUT_FILE = "reports/metadata_richness_report.csv"
-
-def calculate_grade(item, category):
-    score = 0
-    missing = []
-    
-    # Base Existence
-    if item.get('name') or item.get('title') or item.get('filename'):
-        score += 10
-    else:
-        missing.append("Name/Title")
-
-    # Type/Topic
-    if item.get('type') or item.get('topic'):
-        score += 10
-    else:
-        missing.append("Type/Topic")
-
-    # Period/Time
-    # Some items might have it in attributes
-    attrs = {}
-    if item.get('attributes'):
-        try:
-            attrs = json.loads(item['attributes'])
-        except:
-            pass
-            
-    if item.get('period') or attrs.get('period') or item.get('year'):
-        score += 20
-    else:
-        missing.append("Period")
-
-    # Summary/Description
-    summary = item.get('summary') or item.get('description') or attrs.get('description')
-    if summary and len(str(summary)) > 50:
-        score += 20
-    elif summary:
-        score += 10 # Partial points for short summary
-    else:
-        missing.append("Summary")
-
-    # Rich Attributes
-    if attrs and len(attrs.keys()) > 1:
-        score += 20
-    elif item.get('attributes'):
-        score += 5
-    else:
-        missing.append("Attributes")
-
-    # Specifics
-    if category == 'Document':
-        if item.get('author'):
-            score += 20
-        else:
-            missing.append("Author")
-    elif category == 'Entity':
-        # Entities get points for having specific domain fields
-        if attrs.get('domain') or attrs.get('category'):
-            score += 20
-        else:
-            missing.append("Domain")
-
-    # Grading Scale
-    if score >= 90: grade = 'A (Rich)'
-    elif score >= 80: grade = 'B (Good)'
-    elif score >= 60: grade = 'C (Passable)'
-    elif score >= 40: grade = 'D (Thin)'
-    else: grade = 'F (Skeleton)'
-
-    return score, grade, ", ".join(missing)
-
-def audit():
+SUMMARY_FILE = "reports/metadata_richness_summary.json"
+
+# ---------------------------------------------------------
+# Grading Rules (SQL)
+# ---------------------------------------------------------
+# The rubric is evaluated inside SQLite with json_extract so
+# no attributes blob is decoded in Python. Scores persist in
+# `metadata_scores`; triggers queue changed rows in
+# `metadata_dirty` so each audit only regrades what changed.
+#
+#   Name/Title 10 | Type/Topic 10 | Period 20 | Summary 20 (10 if short)
+#   Attributes 20 (5 if unparsed/single key) | Author or Domain 20
+# ---------------------------------------------------------
+
+def present(column):
+    """SQL equivalent of Python truthiness for a text column."""
+    return f"({column} IS NOT NULL AND {column} != '')"
+
+def truthy(expr):
+    """SQL equivalent of Python truthiness for a json_extract value."""
+    return f"({expr} IS NOT NULL AND {expr} NOT IN ('', 0, '[]', '{{}}'))"
+
+GRADE_SQL = '''
+    CASE WHEN score >= 90 THEN 'A (Rich)'
+         WHEN score >= 80 THEN 'B (Good)'
+         WHEN score >= 60 THEN 'C (Passable)'
+         WHEN score >= 40 THEN 'D (Thin)'
+         ELSE 'F (Skeleton)' END
+'''
+
+def document_scores_sql(where=""):
+    return f'''
+    SELECT 'Document' AS category, id, COALESCE(NULLIF(title, ''), filename) AS name, topic AS type,
+        (CASE WHEN {present('title')} OR {present('filename')} THEN 10 ELSE 0 END)
+      + (CASE WHEN {present('topic')} THEN 10 ELSE 0 END)
+      + (CASE WHEN {present('period')} THEN 20 ELSE 0 END)
+      + (CASE WHEN length(summary) > 50 THEN 20 WHEN {present('summary')} THEN 10 ELSE 0 END)
+      + (CASE WHEN {present('author')} THEN 20 ELSE 0 END) AS score,
+        rtrim(
+          (CASE WHEN {present('title')} OR {present('filename')} THEN '' ELSE 'Name/Title, ' END)
+       || (CASE WHEN {present('topic')} THEN '' ELSE 'Type/Topic, ' END)
+       || (CASE WHEN {present('period')} THEN '' ELSE 'Period, ' END)
+       || (CASE WHEN {present('summary')} THEN '' ELSE 'Summary, ' END)
+       || 'Attributes, '
+       || (CASE WHEN {present('author')} THEN '' ELSE 'Author, ' END), ', ') AS missing
+    FROM documents {where}
+    '''
+
+def entity_scores_sql(where=""):
+    # `a` is the attributes blob when it parses to a JSON object, else NULL
+    return f'''
+    SELECT 'Entity' AS category, id, name, type,
+        (CASE WHEN {present('name')} THEN 10 ELSE 0 END)
+      + (CASE WHEN {present('type')} THEN 10 ELSE 0 END)
+      + (CASE WHEN {truthy("json_extract(a, '$.period')")} THEN 20 ELSE 0 END)
+      + (CASE WHEN length(CAST(json_extract(a, '$.description') AS TEXT)) > 50 THEN 20
+              WHEN {truthy("json_extract(a, '$.description')")} THEN 10 ELSE 0 END)
+      + (CASE WHEN (SELECT COUNT(*) FROM json_each(a)) > 1 THEN 20
+              WHEN {present('attributes')} THEN 5 ELSE 0 END)
+      + (CASE WHEN {truthy("json_extract(a, '$.domain')")} OR {truthy("json_extract(a, '$.category')")} THEN 20 ELSE 0 END) AS score,
+        rtrim(
+          (CASE WHEN {present('name')} THEN '' ELSE 'Name/Title, ' END)
+       || (CASE WHEN {present('type')} THEN '' ELSE 'Type/Topic, ' END)
+       || (CASE WHEN {truthy("json_extract(a, '$.period')")} THEN '' ELSE 'Period, ' END)
+       || (CASE WHEN {truthy("json_extract(a, '$.description')")} THEN '' ELSE 'Summary, ' END)
+       || (CASE WHEN {present('attributes')} THEN '' ELSE 'Attributes, ' END)
+       || (CASE WHEN {truthy("json_extract(a, '$.domain')")} OR {truthy("json_extract(a, '$.category')")} THEN '' ELSE 'Domain, ' END), ', ') AS missing
+    FROM (SELECT *, CASE WHEN json_valid(attributes) AND json_type(attributes) = 'object' THEN attributes END AS a
+          FROM entities {where})
+    '''
+
+def init_audit_schema(conn):
+    """Creates the persisted score table plus change-tracking triggers."""
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metadata_scores (
+        category TEXT,
+        item_id,
+        name TEXT,
+        type TEXT,
+        score INTEGER,
+        grade TEXT,
+        missing_fields TEXT,
+        audited_at TEXT,
+        PRIMARY KEY (category, item_id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metadata_scores_score ON metadata_scores(score)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metadata_dirty (
+        category TEXT,
+        item_id,
+        PRIMARY KEY (category, item_id)
+    )
+    ''')
+    for table, category in [("documents", "Document"), ("entities", "Entity")]:
+        for event in ["INSERT", "UPDATE"]:
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_audit_{table}_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                INSERT OR IGNORE INTO metadata_dirty (category, item_id) VALUES ('{category}', NEW.id);
+            END
+            ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_audit_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM metadata_scores WHERE category = '{category}' AND item_id = OLD.id;
+        END
+        ''')
+    conn.commit()
+
+def refresh_scores(conn, full=False):
+    """Regrades dirty rows and rows never graded; returns the number of rows scored."""
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    refreshed = 0
+
+    for category, table, scores_sql in [("Document", "documents", document_scores_sql), ("Entity", "entities", entity_scores_sql)]:
+        where = "" if full else f'''
+            WHERE id IN (SELECT item_id FROM metadata_dirty WHERE category = '{category}')
+               OR NOT EXISTS (SELECT 1 FROM metadata_scores s WHERE s.category = '{category}' AND s.item_id = {table}.id)
+        '''
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO metadata_scores (category, item_id, name, type, score, grade, missing_fields, audited_at)
+            SELECT category, id, name, type, score, {GRADE_SQL}, missing, ?
+            FROM ({scores_sql(where)})
+        ''', (now,))
+        refreshed += cursor.rowcount
+
+    cursor.execute("DELETE FROM metadata_dirty")
+    conn.commit()
+    return refreshed
+
+def write_report(conn):
+    """Streams the report in score order straight from the index."""
+    cursor = conn.cursor()
+    keys = ['ID', 'Name', 'Category', 'Type', 'Grade', 'Score', 'Missing_Fields']
+    total = 0
+    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(keys)
+        cursor.execute('''
+            SELECT CASE category WHEN 'Document' THEN 'DOC-' ELSE 'ENT-' END || item_id,
+                   name, category, type, grade, score, missing_fields
+            FROM metadata_scores
+            ORDER BY score
+        ''')
+        for row in cursor:
+            writer.writerow(row)
+            total += 1
+
+    cursor.execute("SELECT category, grade, COUNT(*) FROM metadata_scores GROUP BY category, grade ORDER BY category, grade")
+    summary = {}
+    for category, grade, count in cursor.fetchall():
+        summary.setdefault(category, {})[grade] = count
+    with open(SUMMARY_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"generated_at": datetime.now().isoformat(), "total": total, "grades": summary}, f, indent=2)
+    return total
+
+def audit(full=False):
     if not os.path.exists(DB_NAME):
         print(f"Error: Database {DB_NAME} not found.")
         return
@@ -83,55 +178,17 @@ def audit():
     os.makedirs('reports', exist_ok=True)
 
     conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    init_audit_schema(conn)
 
-    results = []
-
-    # 1. Scan Documents
-    cursor.execute("SELECT * FROM documents")
-    docs = cursor.fetchall()
-    for d in docs:
-        item = dict(d)
-        score, grade, missing = calculate_grade(item, 'Document')
-        results.append({
-            'ID': f"DOC-{item['id']}",
-            'Name': item.get('title') or item.get('filename'),
-            'Category': 'Document',
-            'Type': item.get('topic'),
-            'Score': score,
-            'Grade': grade,
-            'Missing_Fields': missing
-        })
-
-    # 2. Scan Entities
-    cursor.execute("SELECT * FROM entities")
-    ents = cursor.fetchall()
-    for e in ents:
-        item = dict(e)
-        score, grade, missing = calculate_grade(item, 'Entity')
-        results.append({
-            'ID': f"ENT-{item['id']}",
-            'Name': item['name'],
-            'Category': 'Entity',
-            'Type': item.get('type'),
-            'Score': score,
-            'Grade': grade,
-            'Missing_Fields': missing
-        })
-
-    # Sort by Score (Ascending) so we see the worst first
-    results.sort(key=lambda x: x['Score'])
-
-    # Export to CSV
-    keys = ['ID', 'Name', 'Category', 'Type', 'Grade', 'Score', 'Missing_Fields']
-    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(results)
+    refreshed = refresh_scores(conn, full=full)
+    total = write_report(conn)
 
-    print(f"Audit complete. Scanned {len(results)} items. Report saved to {OUTPUT_FILE}")
+    print(f"Audit complete. Regraded {refreshed} changed items, reported {total}. Report saved to {OUTPUT_FILE}")
     conn.close()
 
 if __name__ == "__main__":
-    audit()
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--full", action="store_true", help="Regrade every row, not just changed ones")
+        args = parser.parse_args()
+        audit(full=args.full)
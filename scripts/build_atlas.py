@@ -1,100 +1,272 @@
 import json
 import os
 import re
+import sqlite3
+import unicodedata
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DOCS_DIR = os.path.join(BASE_DIR, "docs")
 SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "snapshots")
+DB_PATH = os.path.join(BASE_DIR, settings.DB_PATH)
+# Optional bulk gazetteer: [{"name", "lat", "lon", "era", "region", "variants": [...]}, ...]
+GAZETTEER_FILE = os.path.join(BASE_DIR, "data", "gazetteer.json")
+DOCS_PER_PLACE = 5
 
 # The Hermetic Atlas (Lat, Lon)
-# Focused on the "Mediterranean to Northern Europe" drift
+# Focused on the "Mediterranean to Northern Europe" drift.
+# Variants cover Latin (incl. common inflections) and vernacular forms.
+# Matching is case-insensitive on whole words, so short forms that are also
+# common words or citation abbreviations are left out: "Rom" (Rom. = Romans,
+# CD-ROM), "Athen"/"Prag" (hyphenated "Athen-ian", "prag-matic" at line
+# breaks) and "Bâle" (folds to "bale").
 ATLAS = {
-    "Alexandria": {"coords": [31.2001, 29.9187], "era": "Antiquity", "region": "Egypt"},
-    "Athens": {"coords": [37.9838, 23.7275], "era": "Antiquity", "region": "Greece"},
-    "Rome": {"coords": [41.9028, 12.4964], "era": "Antiquity", "region": "Italy"},
-    "Florence": {"coords": [43.7696, 11.2558], "era": "Renaissance", "region": "Italy"},
-    "Venice": {"coords": [45.4408, 12.3155], "era": "Renaissance", "region": "Italy"},
-    "Prague": {"coords": [50.0755, 14.4378], "era": "Renaissance", "region": "Bohemia"},
-    "Heidelberg": {"coords": [49.3988, 8.6724], "era": "Renaissance", "region": "Germany"},
-    "Amsterdam": {"coords": [52.3676, 4.9041], "era": "Enlightenment", "region": "Netherlands"},
-    "London": {"coords": [51.5074, -0.1278], "era": "Enlightenment", "region": "UK"},
-    "Paris": {"coords": [48.8566, 2.3522], "era": "Enlightenment", "region": "France"},
-    "Constantinople": {"coords": [41.0082, 28.9784], "era": "Medieval", "region": "Turkey"},
-    "Baghdad": {"coords": [33.3152, 44.3661], "era": "Medieval", "region": "Iraq"},
-    "Toledo": {"coords": [39.8628, -4.0273], "era": "Medieval", "region": "Spain"},
-    "Oxford": {"coords": [51.7520, -1.2577], "era": "Enlightenment", "region": "UK"},
-    "Basel": {"coords": [47.5596, 7.5886], "era": "Renaissance", "region": "Switzerland"}
+    "Alexandria": {"coords": [31.2001, 29.9187], "era": "Antiquity", "region": "Egypt",
+                   "variants": ["Alexandriae", "Alexandrie", "Alessandria", "Iskandariya"]},
+    "Athens": {"coords": [37.9838, 23.7275], "era": "Antiquity", "region": "Greece",
+               "variants": ["Athenae", "Athenis", "Athenes", "Atene"]},
+    "Rome": {"coords": [41.9028, 12.4964], "era": "Antiquity", "region": "Italy",
+             "variants": ["Roma", "Romae"]},
+    "Florence": {"coords": [43.7696, 11.2558], "era": "Renaissance", "region": "Italy",
+                 "variants": ["Florentia", "Florentiae", "Firenze", "Fiorenza", "Florenz"]},
+    "Venice": {"coords": [45.4408, 12.3155], "era": "Renaissance", "region": "Italy",
+               "variants": ["Venetia", "Venetiis", "Venetiae", "Venezia", "Venedig", "Venise"]},
+    "Prague": {"coords": [50.0755, 14.4378], "era": "Renaissance", "region": "Bohemia",
+               "variants": ["Praga", "Pragae", "Praha"]},
+    "Heidelberg": {"coords": [49.3988, 8.6724], "era": "Renaissance", "region": "Germany",
+                   "variants": ["Heidelberga", "Heidelbergae"]},
+    "Amsterdam": {"coords": [52.3676, 4.9041], "era": "Enlightenment", "region": "Netherlands",
+                  "variants": ["Amstelodami", "Amstelodamum", "Amstelredam"]},
+    "London": {"coords": [51.5074, -0.1278], "era": "Enlightenment", "region": "UK",
+               "variants": ["Londinium", "Londini", "Londres", "Londra"]},
+    "Paris": {"coords": [48.8566, 2.3522], "era": "Enlightenment", "region": "France",
+              "variants": ["Lutetia", "Lutetiae", "Parisiis", "Parigi"]},
+    "Constantinople": {"coords": [41.0082, 28.9784], "era": "Medieval", "region": "Turkey",
+                       "variants": ["Constantinopolis", "Constantinopoli", "Byzantium", "Istanbul"]},
+    "Baghdad": {"coords": [33.3152, 44.3661], "era": "Medieval", "region": "Iraq",
+                "variants": ["Bagdad", "Baldach"]},
+    "Toledo": {"coords": [39.8628, -4.0273], "era": "Medieval", "region": "Spain",
+               "variants": ["Toletum", "Toleti", "Tolède"]},
+    "Oxford": {"coords": [51.7520, -1.2577], "era": "Enlightenment", "region": "UK",
+               "variants": ["Oxonia", "Oxoniae", "Oxonii"]},
+    "Basel": {"coords": [47.5596, 7.5886], "era": "Renaissance", "region": "Switzerland",
+              "variants": ["Basilea", "Basileae", "Basle"]}
 }
 
+# ---------------------------------------------------------
+# Gazetteer Matching
+# ---------------------------------------------------------
+# Every name and variant is folded (lowercase, diacritics
+# stripped) into a word trie. Each chunk is tokenized once
+# and walked left to right, taking the longest name at each
+# position, so the pass is linear in the text regardless of
+# gazetteer size. Mentions land in `place_mentions`, and the
+# GeoJSON is aggregated from SQL.
+# ---------------------------------------------------------
+
+WORD = re.compile(r"\w+")
+
+def fold(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def load_gazetteer():
+    """Core ATLAS plus the optional bulk gazetteer file; returns {name: place}."""
+    places = {}
+    for name, data in ATLAS.items():
+        places[name] = {"lat": data["coords"][0], "lon": data["coords"][1], "era": data["era"],
+                        "region": data["region"], "variants": data["variants"], "core": 1}
+    if os.path.exists(GAZETTEER_FILE):
+        with open(GAZETTEER_FILE, "r", encoding="utf-8") as f:
+            for p in json.load(f):
+                entry = places.setdefault(p["name"], {"lat": p["lat"], "lon": p["lon"], "era": p.get("era"),
+                                                      "region": p.get("region"), "variants": [], "core": 0})
+                entry["variants"] = list(dict.fromkeys(entry["variants"] + p.get("variants", [])))
+    return places
+
+def init_atlas_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS places (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        lat REAL,
+        lon REAL,
+        era TEXT,
+        region TEXT,
+        core INTEGER DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS place_variants (
+        variant TEXT PRIMARY KEY,
+        place_id INTEGER,
+        FOREIGN KEY(place_id) REFERENCES places(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS place_mentions (
+        doc_id TEXT,
+        place_id INTEGER,
+        page INTEGER,
+        count INTEGER,
+        FOREIGN KEY(doc_id) REFERENCES documents(id),
+        FOREIGN KEY(place_id) REFERENCES places(id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_place_mentions_place ON place_mentions(place_id, doc_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_place_mentions_doc ON place_mentions(doc_id)")
+    conn.commit()
+
+def sync_places(conn, gazetteer):
+    """Upserts the gazetteer into places/place_variants; returns the folded-name trie."""
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO places (name, lat, lon, era, region, core) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET lat = excluded.lat, lon = excluded.lon, era = excluded.era,
+                                        region = excluded.region, core = excluded.core
+    ''', [(name, p["lat"], p["lon"], p["era"], p["region"], p["core"]) for name, p in gazetteer.items()])
+    cursor.execute("SELECT id, name FROM places")
+    ids = {name: pid for pid, name in cursor.fetchall()}
+
+    variants = {}
+    for name, p in gazetteer.items():
+        for v in [name] + p["variants"]:
+            variants.setdefault(fold(v), ids[name])
+    cursor.execute("DELETE FROM place_variants")
+    cursor.executemany("INSERT INTO place_variants (variant, place_id) VALUES (?, ?)", variants.items())
+    conn.commit()
+
+    trie = {}
+    for variant, pid in variants.items():
+        node = trie
+        for w in WORD.findall(variant):
+            node = node.setdefault(w, {})
+        node[None] = pid
+    return trie
+
+def match_places(text, trie):
+    """{place_id: count} for one text, longest match wins at each position."""
+    tokens = WORD.findall(fold(text))
+    counts = {}
+    i = 0
+    while i < len(tokens):
+        node, j, hit = trie.get(tokens[i]), i + 1, None
+        while node is not None:
+            if None in node:
+                hit = (node[None], j)
+            node = node.get(tokens[j]) if j < len(tokens) else None
+            j += 1
+        if hit:
+            counts[hit[0]] = counts.get(hit[0], 0) + 1
+            i = hit[1]
+        else:
+            i += 1
+    return counts
+
+def extract_mentions(conn, trie):
+    """Rebuilds place_mentions from all chunk text plus document titles/topics/summaries."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM place_mentions")
+    rows = []
+    read = conn.cursor()
+    read.execute('''
+        SELECT doc_id, text_content FROM chunks
+        UNION ALL
+        SELECT id, COALESCE(title, '') || ' ' || COALESCE(topic, '') || ' ' || COALESCE(summary, '') FROM documents
+    ''')
+    scanned = 0
+    for doc_id, text in read:
+        scanned += 1
+        if not text:
+            continue
+        # Chunks carry no page number yet
+        rows.extend((doc_id, pid, None, n) for pid, n in match_places(text, trie).items())
+        if len(rows) >= 5000:
+            cursor.executemany("INSERT INTO place_mentions (doc_id, place_id, page, count) VALUES (?, ?, ?, ?)", rows)
+            rows = []
+    cursor.executemany("INSERT INTO place_mentions (doc_id, place_id, page, count) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    return scanned
+
+PLACES_SQL = '''
+    SELECT p.id, p.name, p.lat, p.lon, p.era, p.region,
+           COUNT(DISTINCT m.doc_id) AS mentions, COALESCE(SUM(m.count), 0) AS occurrences
+    FROM places p LEFT JOIN place_mentions m ON m.place_id = p.id
+    GROUP BY p.id
+    HAVING p.core = 1 OR mentions > 0
+    ORDER BY p.name
+'''
+
+TOP_DOCS_SQL = '''
+    SELECT r.place_id, r.doc_id, COALESCE(NULLIF(d.title, ''), d.filename), COALESCE(d.century, d.period)
+    FROM (
+        SELECT place_id, doc_id,
+               ROW_NUMBER() OVER (PARTITION BY place_id ORDER BY SUM(count) DESC, doc_id) AS rk
+        FROM place_mentions GROUP BY place_id, doc_id
+    ) r JOIN documents d ON d.id = r.doc_id
+    WHERE r.rk <= ?
+    ORDER BY r.place_id, r.rk
+'''
+
 def build_atlas():
     os.makedirs(SNAPSHOT_DIR, exist_ok=True)
-    
-    # Load docs
-    with open(os.path.join(DOCS_DIR, "docs.json"), "r") as f:
-        docs = json.load(f)
 
-    # Initialize Places
-    places = {}
-    for city, data in ATLAS.items():
-        places[city] = {
-            "name": city,
-            "coords": data["coords"],
-            "era": data["era"],
-            "region": data["region"],
-            "mentions": 0,
-            "associated_docs": [],
-            "score": 0
-        }
+    conn = sqlite3.connect(DB_PATH)
+    init_atlas_schema(conn)
+    trie = sync_places(conn, load_gazetteer())
 
     # Scan Corpus
-    print(f"Scanning {len(docs)} documents for geographical mentions...")
-    for doc in docs:
-        text_dump = ((doc.get("title") or "") + " " + (doc.get("topic") or "") + " " + (doc.get("summary") or "")).lower()
-        
-        for city in ATLAS.keys():
-            if city.lower() in text_dump:
-                places[city]["mentions"] += 1
-                places[city]["associated_docs"].append({
-                    "id": doc["id"],
-                    "title": doc.get("title") or doc.get("filename"),
-                    "year": doc.get("year")
-                })
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM places")
+    print(f"Matching {cursor.fetchone()[0]} gazetteer places against the corpus...")
+    scanned = extract_mentions(conn, trie)
+    print(f"Scanned {scanned} texts for geographical mentions.")
+
+    cursor.execute(TOP_DOCS_SQL, (DOCS_PER_PLACE,))
+    top_docs = {}
+    for place_id, doc_id, title, year in cursor.fetchall():
+        top_docs.setdefault(place_id, []).append({"id": doc_id, "title": title, "year": year})
 
     # Calculate "Spirit Level" (Score)
     features = []
-    for city, data in places.items():
+    cursor.execute(PLACES_SQL)
+    for place_id, name, lat, lon, era, region, mentions, occurrences in cursor.fetchall():
         # Base score of 10 for key cities, plus mentions
-        data["score"] = 10 + (data["mentions"] * 5)
-        
-        # GeoJSON Feature
         features.append({
             "type": "Feature",
             "geometry": {
                 "type": "Point",
-                "coordinates": [data["coords"][1], data["coords"][0]] # GeoJSON is Lon, Lat
+                "coordinates": [lon, lat] # GeoJSON is Lon, Lat
             },
             "properties": {
-                "name": city,
-                "era": data["era"],
-                "score": data["score"],
-                "mentions": data["mentions"],
-                "region": data["region"],
-                "docs": data["associated_docs"][:5] # Top 5 docs
+                "name": name,
+                "era": era,
+                "score": 10 + mentions * 5,
+                "mentions": mentions,
+                "occurrences": occurrences,
+                "region": region,
+                "docs": top_docs.get(place_id, [])
             }
         })
+    conn.close()
 
     # Output GeoJSON
     geojson = {
         "type": "FeatureCollection",
         "features": features
     }
-    
+
     output_path = os.path.join(DOCS_DIR, "places.json")
     with open(output_path, "w") as f:
         json.dump(geojson, f, indent=2)
-        
+
     print(f"Atlas built. Mapped {len(features)} esoteric centers to {output_path}.")
 
 if __name__ == "__main__":
-    build_atlas()
+    with profiling():
+        build_atlas()
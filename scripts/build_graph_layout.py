@@ -0,0 +1,425 @@
+import os
+import json
+import hashlib
+import sqlite3
+import argparse
+import random
+from datetime import datetime
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
+
+# The force simulation is vectorised; without NumPy there is no layout
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# ---------------------------------------------------------
+# V11: Graph Layout & Level-of-Detail Tiles
+# ---------------------------------------------------------
+# graph.json is small enough for the browser to simulate on
+# every load; this stage lays out a much larger knowledge
+# graph once, offline:
+#   - nodes: topics, the top MAX_ENTITIES entities, chats
+#   - edges: topic-entity and chat-entity mentions, chat
+#     topics, and the strongest entity co-mentions
+#   - layout: ForceAtlas2-style forces (linear attraction,
+#     degree-weighted 1/d repulsion, gravity). Repulsion is
+#     Barnes-Hut on a quadtree stored as grid levels: each
+#     node feels the centre of mass of every cell that is
+#     well separated at that level but was not at the level
+#     above, and direct forces only from its 3x3
+#     neighbourhood at the finest level. Everything is NumPy
+#     over all nodes at once, O(n log n) per iteration.
+#   - communities: Louvain modularity clustering
+# Output is written as level-of-detail tiles of Cytoscape
+# elements with preset positions:
+#   docs/graph/index.json   bounds, communities, layer list
+#   docs/graph/lod<k>.json  nodes (and their edges) first
+#                           shown at layer k
+# graph.html loads lod0 and pulls in deeper layers as the
+# user zooms, so nothing is simulated in the browser.
+# ---------------------------------------------------------
+
+OUTPUT_DIR = "docs/graph"
+CONFIG_FILE = "docs/config.json"
+MAX_ENTITIES = 5000
+CO_MENTIONS_PER_ENTITY = 8  # Strongest entity-entity edges kept per entity
+MIN_CO_MENTIONS = 2
+ITERATIONS = 300
+EXTENT = 4000               # Width/height of the laid-out graph in px
+# Cumulative node counts per layer and the zoom (x fit-to-screen) that reveals it
+LOD_LAYERS = [(250, 1.0), (1500, 2.0), (None, 4.0)]
+
+def is_static():
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                return json.load(f).get("mode") == "static"
+        except (OSError, ValueError):
+            pass
+    return False
+
+def slugify(name):
+    return name.lower().replace(" ", "-")
+
+def build_graph(conn, max_entities=MAX_ENTITIES, static=False):
+    """(nodes, edges): nodes as dicts, edges as {(i, j): weight} with i < j."""
+    cursor = conn.cursor()
+    nodes, index, edges = [], {}, {}
+
+    def add_node(key, label, kind):
+        index[key] = len(nodes)
+        nodes.append({"id": key, "label": label, "type": kind})
+
+    def add_edge(a, b, weight):
+        i, j = index.get(a), index.get(b)
+        if i is None or j is None or i == j:
+            return
+        pair = (min(i, j), max(i, j))
+        edges[pair] = edges.get(pair, 0) + weight
+
+    cursor.execute("SELECT topic FROM documents WHERE topic IS NOT NULL GROUP BY topic")
+    for (topic,) in cursor.fetchall():
+        add_node(f"topic:{topic}", topic, "topic")
+
+    cursor.execute('''
+        SELECT e.id, e.name
+        FROM entities e
+        JOIN relationships r ON e.id = r.target_id
+        GROUP BY e.id
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    ''', (max_entities,))
+    entity_ids = []
+    for e_id, name in cursor.fetchall():
+        entity_ids.append(e_id)
+        add_node(f"entity:{e_id}", name, "entity")
+
+    cursor.execute("SELECT id, title, topic FROM chats")
+    for c_id, title, topic in cursor.fetchall():
+        label = (title or c_id)[:40] if not static else "Session: " + hashlib.md5(c_id.encode()).hexdigest()[:6]
+        add_node(f"chat:{c_id}", label, "chat")
+        if topic and topic != "General":
+            add_edge(f"chat:{c_id}", f"topic:{topic}", 2)
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS layout_entities (id INTEGER PRIMARY KEY)")
+    cursor.execute("DELETE FROM layout_entities")
+    cursor.executemany("INSERT INTO layout_entities (id) VALUES (?)", [(e,) for e in entity_ids])
+
+    cursor.execute('''
+        SELECT d.topic, r.target_id, COUNT(*)
+        FROM relationships r
+        JOIN documents d ON d.id = r.source_id
+        JOIN layout_entities le ON le.id = r.target_id
+        WHERE d.topic IS NOT NULL
+        GROUP BY d.topic, r.target_id
+    ''')
+    for topic, e_id, weight in cursor.fetchall():
+        add_edge(f"topic:{topic}", f"entity:{e_id}", weight)
+
+    cursor.execute('''
+        SELECT r.source_id, r.target_id, COUNT(*)
+        FROM relationships r
+        JOIN chats c ON c.id = r.source_id
+        JOIN layout_entities le ON le.id = r.target_id
+        GROUP BY r.source_id, r.target_id
+    ''')
+    for c_id, e_id, weight in cursor.fetchall():
+        add_edge(f"chat:{c_id}", f"entity:{e_id}", weight)
+
+    # Entity co-mentions, pruned to each entity's strongest partners
+    cursor.execute('''
+        SELECT a.target_id, b.target_id, COUNT(DISTINCT a.source_id) AS shared
+        FROM relationships a
+        JOIN relationships b ON a.source_id = b.source_id AND a.target_id < b.target_id
+        JOIN layout_entities la ON la.id = a.target_id
+        JOIN layout_entities lb ON lb.id = b.target_id
+        GROUP BY a.target_id, b.target_id
+        HAVING shared >= ?
+    ''', (MIN_CO_MENTIONS,))
+    partners = {}
+    for a, b, shared in cursor.fetchall():
+        partners.setdefault(a, []).append((shared, b))
+        partners.setdefault(b, []).append((shared, a))
+    kept = set()
+    for a, ranked in partners.items():
+        ranked.sort(reverse=True)
+        for shared, b in ranked[:CO_MENTIONS_PER_ENTITY]:
+            kept.add((min(a, b), max(a, b), shared))
+    for a, b, shared in kept:
+        add_edge(f"entity:{a}", f"entity:{b}", shared)
+
+    cursor.execute("DROP TABLE layout_entities")
+    return nodes, edges
+
+# ---------------------------------------------------------
+# Forces
+# ---------------------------------------------------------
+
+def grid_cells(unit, level):
+    g = 1 << level
+    cx = np.minimum((unit[:, 0] * g).astype(np.int64), g - 1)
+    cy = np.minimum((unit[:, 1] * g).astype(np.int64), g - 1)
+    return g, cx, cy
+
+def repulsion(pos, mass, depth, kr):
+    """Barnes-Hut repulsion kr * m_i * m_j / d for every node, shape (n, 2)."""
+    n = len(pos)
+    lo = pos.min(axis=0)
+    span = max(float((pos.max(axis=0) - lo).max()), 1e-9) * (1 + 1e-9)
+    unit = (pos - lo) / span
+    force = np.zeros_like(pos)
+
+    # Far field: level 1 cells are all neighbours of each other, so start at 2
+    for level in range(2, depth + 1):
+        g, cx, cy = grid_cells(unit, level)
+        cell = cx * g + cy
+        m = np.bincount(cell, mass, g * g)
+        occupied = m > 0
+        com = np.zeros((g * g, 2))
+        com[occupied, 0] = np.bincount(cell, mass * pos[:, 0], g * g)[occupied] / m[occupied]
+        com[occupied, 1] = np.bincount(cell, mass * pos[:, 1], g * g)[occupied] / m[occupied]
+        # Children of the parent's 3x3 neighbourhood: a 6x6 block starting here
+        bx, by = cx - (cx & 1) - 2, cy - (cy & 1) - 2
+        for i in range(6):
+            tx = bx + i
+            for j in range(6):
+                ty = by + j
+                ok = (tx >= 0) & (tx < g) & (ty >= 0) & (ty < g) & ((np.abs(tx - cx) > 1) | (np.abs(ty - cy) > 1))
+                target = np.where(ok, tx * g + ty, 0)
+                ok &= occupied[target]
+                if not ok.any():
+                    continue
+                d = pos[ok] - com[target[ok]]
+                d2 = np.maximum((d * d).sum(axis=1), 1e-9)
+                force[ok] += d * (kr * mass[ok] * m[target[ok]] / d2)[:, None]
+
+    # Near field: exact pairs within the 3x3 neighbourhood at the finest level
+    g, cx, cy = grid_cells(unit, depth)
+    cell = cx * g + cy
+    order = np.argsort(cell, kind="stable")
+    counts = np.bincount(cell, minlength=g * g)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            tx, ty = cx + dx, cy + dy
+            ok = (tx >= 0) & (tx < g) & (ty >= 0) & (ty < g)
+            target = np.where(ok, tx * g + ty, 0)
+            per_node = np.where(ok, counts[target], 0)
+            total = int(per_node.sum())
+            if total == 0:
+                continue
+            src = np.repeat(np.arange(n), per_node)
+            first = np.repeat(np.cumsum(per_node) - per_node, per_node)
+            dst = order[np.repeat(starts[target], per_node) + np.arange(total) - first]
+            keep = src != dst
+            src, dst = src[keep], dst[keep]
+            d = pos[src] - pos[dst]
+            d2 = np.maximum((d * d).sum(axis=1), 1e-9)
+            f = d * (kr * mass[src] * mass[dst] / d2)[:, None]
+            force[:, 0] += np.bincount(src, f[:, 0], n)
+            force[:, 1] += np.bincount(src, f[:, 1], n)
+    return force
+
+def force_layout(n, src, dst, weight, mass, iterations=ITERATIONS, seed=42, kr=1.0, ka=1.0, gravity=1.0):
+    """Positions (n, 2) for an undirected weighted graph; deterministic for a seed."""
+    rng = np.random.default_rng(seed)
+    radius = np.sqrt(n) * 2
+    pos = rng.normal(0, radius / 2, (n, 2))
+    depth = int(np.clip(np.ceil(np.log(max(n, 2) / 2) / np.log(4)), 2, 9))
+    temperature, cooled = radius / 4, radius / 400
+    decay = (cooled / temperature) ** (1 / max(iterations - 1, 1))
+
+    for _ in range(iterations):
+        force = repulsion(pos, mass, depth, kr)
+        d = pos[dst] - pos[src]
+        pull = d * (ka * weight)[:, None]
+        for axis in (0, 1):
+            force[:, axis] += np.bincount(src, pull[:, axis], n) - np.bincount(dst, pull[:, axis], n)
+        dist = np.maximum(np.linalg.norm(pos, axis=1), 1e-9)
+        force -= pos * (gravity * mass / dist)[:, None]
+
+        step = force / mass[:, None]
+        length = np.maximum(np.linalg.norm(step, axis=1), 1e-9)
+        pos += step * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= decay
+    return pos
+
+# ---------------------------------------------------------
+# Communities
+# ---------------------------------------------------------
+
+def louvain(n, edges, seed=42):
+    """Louvain modularity communities: a community index per node, largest first."""
+    rng = random.Random(seed)
+    adjacency = [dict() for _ in range(n)]
+    for (i, j), w in edges.items():
+        adjacency[i][j] = adjacency[i].get(j, 0) + w
+        adjacency[j][i] = adjacency[j].get(i, 0) + w
+    membership = list(range(n))
+
+    while True:
+        size = len(adjacency)
+        degree = [sum(nbrs.values()) for nbrs in adjacency]
+        m2 = sum(degree)
+        if m2 == 0:
+            break
+        comm = list(range(size))
+        total = degree[:]
+        moved_any, moved = False, True
+        while moved:
+            moved = False
+            order = list(range(size))
+            rng.shuffle(order)
+            for i in order:
+                old = comm[i]
+                links = {}
+                for j, w in adjacency[i].items():
+                    if j != i:
+                        links[comm[j]] = links.get(comm[j], 0) + w
+                total[old] -= degree[i]
+                best, best_gain = old, links.get(old, 0) - total[old] * degree[i] / m2
+                for c, w in links.items():
+                    gain = w - total[c] * degree[i] / m2
+                    if gain > best_gain + 1e-12:
+                        best, best_gain = c, gain
+                total[best] += degree[i]
+                if best != old:
+                    comm[i] = best
+                    moved = moved_any = True
+        if not moved_any:
+            break
+
+        # Collapse each community into one node and repeat on the smaller graph
+        relabel = {c: k for k, c in enumerate(sorted(set(comm)))}
+        membership = [relabel[comm[c]] for c in membership]
+        collapsed = [dict() for _ in relabel]
+        for i, nbrs in enumerate(adjacency):
+            ci = relabel[comm[i]]
+            for j, w in nbrs.items():
+                cj = relabel[comm[j]]
+                collapsed[ci][cj] = collapsed[ci].get(cj, 0) + w
+        adjacency = collapsed
+
+    sizes = {}
+    for c in membership:
+        sizes[c] = sizes.get(c, 0) + 1
+    rank = {c: k for k, c in enumerate(sorted(sizes, key=lambda c: (-sizes[c], c)))}
+    return [rank[c] for c in membership]
+
+# ---------------------------------------------------------
+# Tiles
+# ---------------------------------------------------------
+
+def save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"), ensure_ascii=False, allow_nan=False)  # graph.html needs strict JSON
+    os.replace(tmp, path)
+
+def write_tiles(nodes, edges, pos, community, strength, out_dir=OUTPUT_DIR):
+    n = len(nodes)
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    scale = EXTENT / max(float((hi - lo).max()), 1e-9)
+    pos = (pos - (lo + hi) / 2) * scale
+
+    # Importance: topics first, then weighted degree; each layer adds the next slice
+    ranked = sorted(range(n), key=lambda i: (nodes[i]["type"] != "topic", -strength[i], nodes[i]["label"]))
+    layer = [0] * n
+    start = 0
+    for k, (cumulative, _) in enumerate(LOD_LAYERS):
+        end = n if cumulative is None else min(cumulative, n)
+        for i in ranked[start:end]:
+            layer[i] = k
+        start = end
+    top = float(max(strength, default=0)) or 1.0
+
+    os.makedirs(out_dir, exist_ok=True)
+    layers = []
+    for k, (_, zoom) in enumerate(LOD_LAYERS):
+        tile_nodes = [{
+            "data": {
+                "id": nodes[i]["id"], "label": nodes[i]["label"], "type": nodes[i]["type"],
+                "slug": slugify(nodes[i]["label"]), "community": community[i],
+                "size": round(8 + 40 * (strength[i] / top) ** 0.5, 1),
+            },
+            "position": {"x": round(float(pos[i, 0]), 1), "y": round(float(pos[i, 1]), 1)},
+        } for i in ranked if layer[i] == k]
+        # An edge appears with its deeper endpoint
+        tile_edges = [{
+            "data": {"id": f"e{i}_{j}", "source": nodes[i]["id"], "target": nodes[j]["id"], "weight": w}
+        } for (i, j), w in edges.items() if max(layer[i], layer[j]) == k]
+        if not tile_nodes and not tile_edges:
+            continue
+        save_json(os.path.join(out_dir, f"lod{k}.json"), {"nodes": tile_nodes, "edges": tile_edges})
+        layers.append({"lod": k, "file": f"lod{k}.json", "zoom": zoom,
+                       "nodes": len(tile_nodes), "edges": len(tile_edges)})
+    for name in os.listdir(out_dir):
+        if name.startswith("lod") and name.endswith(".json") and name not in {l["file"] for l in layers}:
+            os.remove(os.path.join(out_dir, name))
+
+    communities = {}
+    for i in range(n):
+        communities.setdefault(community[i], []).append(i)
+    summary = []
+    for c, members in sorted(communities.items()):
+        hub = max(members, key=lambda i: strength[i])
+        centre = pos[members].mean(axis=0)
+        summary.append({
+            "id": c, "size": len(members), "label": nodes[hub]["label"], "hub": nodes[hub]["id"],
+            "x": round(float(centre[0]), 1), "y": round(float(centre[1]), 1),
+            "radius": round(float(np.linalg.norm(pos[members] - centre, axis=1).max()), 1),
+        })
+
+    index = {
+        "generated_at": datetime.now().isoformat(),
+        "nodes": n, "edges": len(edges),
+        "bounds": [round(float(v), 1) for v in (*pos.min(axis=0), *pos.max(axis=0))],
+        "layers": layers,
+        "communities": summary,
+    }
+    save_json(os.path.join(out_dir, "index.json"), index)
+    return index
+
+def main(db_path=settings.DB_PATH, max_entities=MAX_ENTITIES, iterations=ITERATIONS, static=None):
+    if not HAS_NUMPY:
+        raise SystemExit("❌ numpy is required for the graph layout (pip install numpy).")
+    static = is_static() if static is None else static
+    conn = sqlite3.connect(db_path)
+    nodes, edges = build_graph(conn, max_entities, static)
+    conn.close()
+    if not nodes:
+        print("⚠️ No topics, entities or chats to lay out.")
+        return
+
+    n = len(nodes)
+    pairs = np.array(list(edges.keys()), dtype=np.int64).reshape(-1, 2)
+    raw = np.array(list(edges.values()), dtype=float)
+    weight = np.log1p(raw)
+    strength = np.bincount(pairs[:, 0], raw, n) + np.bincount(pairs[:, 1], raw, n)
+    degree = np.bincount(pairs.ravel(), minlength=n)
+    mass = degree + 1.0
+
+    print(f"🕸 Laying out {n} nodes and {len(edges)} edges ({iterations} iterations)...")
+    pos = force_layout(n, pairs[:, 0], pairs[:, 1], weight, mass, iterations)
+    community = louvain(n, edges)
+    index = write_tiles(nodes, edges, pos, community, strength)
+
+    print(f"🧭 {len(index['communities'])} communities; layers: " +
+          ", ".join(f"lod{l['lod']} {l['nodes']} nodes" for l in index["layers"]))
+    print(f"💾 Saved to {OUTPUT_DIR}/index.json")
+
+if __name__ == "__main__":
+    with profiling():
+        parser = argparse.ArgumentParser(description="Precompute graph positions, communities and LOD tiles")
+        parser.add_argument("--db", default=settings.DB_PATH)
+        parser.add_argument("--max-entities", type=int, default=MAX_ENTITIES)
+        parser.add_argument("--iterations", type=int, default=ITERATIONS)
+        parser.add_argument("--static", action="store_true", default=None,
+                            help="Redact chat titles (default: follow docs/config.json mode)")
+        args = parser.parse_args()
+        main(args.db, args.max_entities, args.iterations, args.static)
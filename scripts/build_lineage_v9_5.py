@@ -1,8 +1,13 @@
 import sqlite3
 import json
 import os
+import sys
 
-DB_NAME = "esoteric.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan import init_entity_attributes
+import settings
+
+DB_NAME = settings.DB_PATH
 OUTPUT_DIR = "esoteric_seed/data/snapshots"
 OUTPUT_FILE = "hermetic_lineage.json"
 
@@ -22,31 +27,27 @@ def build_lineage():
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
+    init_entity_attributes(conn)
 
-    # 1. Fetch Hermetic Figures
-    cursor.execute("SELECT id, name, type, attributes FROM entities")
-    rows = cursor.fetchall()
+    # 1. Fetch Hermetic Figures (indexed lookups on entity_attributes)
+    cursor.execute("""
+        SELECT e.id, e.name, e.type, COALESCE(p.value, 'Unknown Epoch') AS period
+        FROM entities e
+        LEFT JOIN entity_attributes p ON p.entity_id = e.id AND p.key = 'period'
+        WHERE instr(e.type, 'Hermetic') > 0
+           OR e.id IN (SELECT entity_id FROM entity_attributes WHERE key = 'domain' AND value = 'Hermeticism')
+           OR instr(e.name, 'Trismegistus') > 0 OR instr(e.name, 'Ficino') > 0 OR instr(e.name, 'Bruno') > 0
+    """)
     
     nodes = []
     
-    for r in rows:
-        attrs = {}
-        try:
-            attrs = json.loads(r['attributes']) if r['attributes'] else {}
-        except: pass
-            
-        is_hermetic = False
-        if r['type'] and "Hermetic" in r['type']: is_hermetic = True
-        if attrs.get('domain') == 'Hermeticism': is_hermetic = True
-        if "Trismegistus" in r['name'] or "Ficino" in r['name'] or "Bruno" in r['name']: is_hermetic = True
-        
-        if is_hermetic:
-            nodes.append({
-                "id": str(r['id']),
-                "label": r['name'],
-                "period": attrs.get('period', 'Unknown Epoch'),
-                "type": r['type']
-            })
+    for r in cursor.fetchall():
+        nodes.append({
+            "id": str(r['id']),
+            "label": r['name'],
+            "period": r['period'],
+            "type": r['type']
+        })
 
     # Default if empty
     if not nodes:
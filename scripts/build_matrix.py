@@ -1,5 +1,8 @@
 import json
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
 
 # ---------------------------------------------------------
 # V12: The Similarity Matrix
@@ -69,4 +72,5 @@ def main():
     print(f"💾 Saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    with profiling():
+        main()
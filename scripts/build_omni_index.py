@@ -1,12 +1,77 @@
 import json
 import os
+import re
+import unicodedata
 from datetime import datetime
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DOCS_DIR = os.path.join(BASE_DIR, "docs")
 SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "snapshots")
 
+# Search index tuning
+PREFIX_MAX = 6          # Longest indexed prefix; longer queries are verified client-side
+PREFIX_LIMIT = 50       # Items kept per 1-2 char prefix (best score first)
+FULL_PREFIX = 3         # Prefixes this long keep their full posting list, so the client can lead with the rarest token
+TRIGRAM_LIMIT = 200     # Items kept per trigram posting list
+KIND_BOOST = {"command": 3.0, "dictionary": 2.0, "entity": 1.5, "doc": 1.0}
+TOKEN = re.compile(r"[^\W_]+")
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_search_index(items):
+    """
+    Compact palette index. Items are ordered by precomputed boost so a lower
+    index always ranks higher; `prefixes` maps every title/tag token prefix
+    (up to PREFIX_MAX chars) to its items, best first (only the top
+    PREFIX_LIMIT for prefixes shorter than FULL_PREFIX), and `trigrams` maps
+    title trigrams to posting lists for typo-tolerant fallback matching.
+    """
+    def boost(item):
+        return round(KIND_BOOST.get(item["kind"], 1.0) * item.get("score_boost", 1.0), 3)
+
+    ordered = sorted(items, key=lambda item: (-boost(item), normalize(item["title"])))
+    prefixes, grams, rows = {}, {}, []
+    for idx, item in enumerate(ordered):
+        # Token-joined so "Corpus_Hermeticum.pdf" searches like "corpus hermeticum pdf"
+        title = " ".join(TOKEN.findall(normalize(item["title"])))
+        rest = " ".join(TOKEN.findall(normalize(" ".join([item.get("subtitle") or ""] + [t for t in item.get("tags") or [] if t]))))
+        rows.append([item["id"], item["kind"], item["title"], item.get("subtitle") or "", item["route"],
+                     boost(item), f"{title} {rest}"])
+
+        # Title tokens outrank subtitle/tag tokens for the same prefix
+        for weight, text in ((2, rest), (4, title)):
+            for token in set(TOKEN.findall(text)):
+                for n in range(1, min(len(token), PREFIX_MAX) + 1):
+                    bucket = prefixes.setdefault(token[:n], {})
+                    bucket[idx] = max(bucket.get(idx, 0), weight)
+        for gram in trigrams(title):
+            postings = grams.setdefault(gram, [])
+            if len(postings) < TRIGRAM_LIMIT:
+                postings.append(idx)
+
+    return {
+        "version": "v9.2",
+        "generated_at": datetime.now().isoformat(),
+        "prefix_max": PREFIX_MAX,
+        "prefix_full": FULL_PREFIX,
+        # [id, kind, title, subtitle, route, boost, normalized search text]
+        "items": rows,
+        "prefixes": {p: [i for i, _ in sorted(bucket.items(), key=lambda kv: (-kv[1], kv[0]))]
+                        [:None if len(p) >= FULL_PREFIX else PREFIX_LIMIT]
+                     for p, bucket in prefixes.items()},
+        "trigrams": grams,
+    }
+
 def build_index():
     os.makedirs(SNAPSHOT_DIR, exist_ok=True)
     
@@ -88,7 +153,14 @@ def build_index():
     with open(output_path, "w") as f:
         json.dump(omni_index, f, indent=2)
         
+    search_path = os.path.join(SNAPSHOT_DIR, "omni_search_index.json")
+    search_index = build_search_index([i for i in items if i.get("title")])
+    with open(search_path, "w") as f:
+        json.dump(search_index, f, separators=(",", ":"))
+
     print(f"Omni Index built: {len(items)} items indexed at {output_path}")
+    print(f"Search index: {len(search_index['prefixes'])} prefixes, {len(search_index['trigrams'])} trigrams at {search_path}")
 
 if __name__ == "__main__":
-    build_index()
+    with profiling():
+        build_index()
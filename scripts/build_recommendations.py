@@ -1,5 +1,8 @@
 import json
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -60,4 +63,5 @@ def build_recommendations():
     print(f"Recommendations built for {len(recs)} dictionary entries.")
 
 if __name__ == "__main__":
-    build_recommendations()
+    with profiling():
+        build_recommendations()
@@ -0,0 +1,215 @@
+import os
+import sys
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fitz  # PyMuPDF
+from mine_images import HAS_NUMPY, init_image_schema, perceptual_hashes, hamming
+from instrumentation import profiling
+import settings
+
+# ---------------------------------------------------------
+# Near-Duplicate Image Clusters
+# ---------------------------------------------------------
+# sha256 only catches byte-identical files; the same emblem
+# scanned at another resolution or JPEG quality slips past.
+# Each image carries a 64-bit pHash/dHash (see mine_images).
+# A BK-tree over pHash answers Hamming-radius queries, pairs
+# that also agree on dHash are unioned into clusters, and the
+# largest image in a cluster becomes its canonical file.
+# similar_images keeps its tree for the life of the process
+# and rebuilds it only when the images table may have moved:
+# PRAGMA data_version (other connections' commits) or the
+# connection's own total_changes.
+# ---------------------------------------------------------
+
+DB_NAME = settings.DB_PATH
+VAULT_ROOT = "docs"     # images.path is relative to this
+PHASH_RADIUS = 8        # Max pHash bit distance for a variant
+DHASH_RADIUS = 12       # Confirming dHash bit distance
+
+class BKTree:
+    """Burkhard-Keller tree keyed on Hamming distance between 64-bit ints."""
+    def __init__(self):
+        self.root = None    # [key, item, {distance: child}]
+        self.size = 0
+
+    def add(self, key, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, item, {}]
+            return
+        node = self.root
+        while True:
+            d = bin(key ^ node[0]).count("1")
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, item, {}]
+                return
+            node = child
+
+    def query(self, key, radius):
+        """All (distance, item) within radius of key."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_key, item, children = stack.pop()
+            d = bin(key ^ node_key).count("1")
+            if d <= radius:
+                found.append((d, item))
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for dist, child in children.items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+def backfill_hashes(conn):
+    """Hashes vault files for rows mined before perceptual hashes existed."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, path FROM images WHERE phash IS NULL AND path IS NOT NULL")
+    rows = cursor.fetchall()
+    updates = []
+    for img_id, path in rows:
+        try:
+            pix = fitz.Pixmap(os.path.join(VAULT_ROOT, path))
+            dhash, phash = perceptual_hashes(pix)
+            if phash:
+                updates.append((pix.width, pix.height, dhash, phash, img_id))
+        except Exception:
+            continue
+    cursor.executemany('''
+        UPDATE images SET width = COALESCE(width, ?), height = COALESCE(height, ?), dhash = ?, phash = ?
+        WHERE id = ?
+    ''', updates)
+    conn.commit()
+    return len(updates), len(rows)
+
+def load_hashed(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, dhash, phash, COALESCE(width, 0) * COALESCE(height, 0), path
+        FROM images WHERE phash IS NOT NULL ORDER BY id
+    ''')
+    return cursor.fetchall()
+
+def build_index(rows):
+    tree = BKTree()
+    for row in rows:
+        tree.add(int(row[2], 16), row)
+    return tree
+
+SIMILAR_CACHE = {"conn": None, "version": None, "tree": None, "by_id": None}
+
+def cached_index(conn):
+    """(BK-tree, {id: row}) for conn, rebuilt only after the database has changed."""
+    version = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+    if SIMILAR_CACHE["conn"] is not conn or SIMILAR_CACHE["version"] != version:
+        rows = load_hashed(conn)
+        SIMILAR_CACHE.update(conn=conn, version=version, tree=build_index(rows),
+                             by_id={r[0]: r for r in rows})
+    return SIMILAR_CACHE["tree"], SIMILAR_CACHE["by_id"]
+
+def similar_images(conn, image_id, radius=PHASH_RADIUS):
+    """Other printings of one image: [(distance, id, path)] nearest first."""
+    tree, by_id = cached_index(conn)
+    target = by_id.get(image_id)
+    if target is None:
+        return []
+    hits = tree.query(int(target[2], 16), radius)
+    return sorted((d, r[0], r[4]) for d, r in hits if r[0] != image_id)
+
+def cluster_images(conn, radius=PHASH_RADIUS, dhash_radius=DHASH_RADIUS):
+    """Union-find over near pairs; writes cluster_id = canonical image id. Returns cluster sizes."""
+    rows = load_hashed(conn)
+    tree = build_index(rows)
+    parent = {r[0]: r[0] for r in rows}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for img_id, dhash, phash, _, _ in rows:
+        for _, other in tree.query(int(phash, 16), radius):
+            if other[0] == img_id:
+                continue
+            if dhash and other[1] and hamming(dhash, other[1]) > dhash_radius:
+                continue
+            a, b = find(img_id), find(other[0])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    # Canonical = largest pixel area, then lowest id
+    members = {}
+    for row in rows:
+        members.setdefault(find(row[0]), []).append(row)
+    updates = []
+    for group in members.values():
+        canonical = min(group, key=lambda r: (-r[3], r[0]))[0]
+        updates.extend((canonical, r[0]) for r in group)
+
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE images SET cluster_id = ? WHERE id = ?", updates)
+    conn.commit()
+    return sorted((len(g) for g in members.values()), reverse=True)
+
+def prune_variants(conn):
+    """Points every clustered variant at its canonical file and deletes orphaned vault files."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT v.id, v.path, c.path FROM images v
+        JOIN images c ON c.id = v.cluster_id
+        WHERE v.cluster_id != v.id AND v.path != c.path
+    ''')
+    variants = cursor.fetchall()
+    cursor.executemany("UPDATE images SET path = ? WHERE id = ?", [(c, v) for v, _, c in variants])
+    conn.commit()
+
+    removed = 0
+    for _, old_path, _ in variants:
+        cursor.execute("SELECT 1 FROM images WHERE path = ? LIMIT 1", (old_path,))
+        full = os.path.join(VAULT_ROOT, old_path)
+        if cursor.fetchone() is None and os.path.exists(full):
+            os.remove(full)
+            removed += 1
+    return len(variants), removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate vault images by perceptual hash")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--radius", type=int, default=PHASH_RADIUS, help="pHash Hamming radius")
+    parser.add_argument("--similar", metavar="IMAGE_ID", help="List other printings of one image and exit")
+    parser.add_argument("--prune", action="store_true", help="Keep one canonical file per cluster in the vault")
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        print("NumPy is required for perceptual hashing.")
+        return
+
+    conn = sqlite3.connect(args.db)
+    init_image_schema(conn)
+
+    if args.similar:
+        for d, img_id, path in similar_images(conn, args.similar, args.radius):
+            print(f"  {d:2d}  {img_id}  {path}")
+        conn.close()
+        return
+
+    hashed, pending = backfill_hashes(conn)
+    if pending:
+        print(f"Hashed {hashed}/{pending} images mined before perceptual hashing.")
+
+    sizes = cluster_images(conn, args.radius)
+    multi = [s for s in sizes if s > 1]
+    print(f"Clustered {sum(sizes)} images into {len(sizes)} groups; {len(multi)} groups hold {sum(multi)} variants.")
+
+    if args.prune:
+        repointed, removed = prune_variants(conn)
+        print(f"Re-pointed {repointed} variants to canonical files; removed {removed} vault files.")
+    conn.close()
+
+if __name__ == "__main__":
+    with profiling():
+        main()
@@ -1,8 +1,12 @@
 import sqlite3
 import json
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
 
 def run_report():
     conn = sqlite3.connect(DB_NAME)
@@ -62,4 +66,5 @@ def run_report():
     conn.close()
 
 if __name__ == "__main__":
-    run_report()
+    with profiling():
+        run_report()
@@ -1,5 +1,13 @@
 import json
 import os
+import sqlite3
+import hashlib
+import argparse
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+from columnar import write_columnar
+import settings
 
 # ---------------------------------------------------------
 # V11: The Link Fixer
@@ -7,13 +15,100 @@ import os
 # Scans docs.json and verifies that every "path" actually
 # exists on disk. If not, it tries to find the file or
 # marks it as broken (so the UI can disable the button).
+#
+# Files are tracked in a persistent `file_catalog` table
+# (path, basename, size, mtime, sha256). Only new or changed
+# files are re-hashed on refresh, and vanished files keep
+# their row (present = 0) so a moved/renamed PDF can be
+# re-linked by content hash.
 # ---------------------------------------------------------
 
 DOCS_FILE = 'docs/docs.json'
+DB_NAME = settings.DB_PATH
+HASH_CHUNK = 1024 * 1024
 
-def main():
+def init_catalog(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS file_catalog (
+        path TEXT PRIMARY KEY,
+        basename TEXT,
+        size INTEGER,
+        mtime REAL,
+        sha256 TEXT,
+        present INTEGER DEFAULT 1
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_catalog_basename ON file_catalog(basename)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_catalog_sha256 ON file_catalog(sha256)")
+    conn.commit()
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def walk_pdfs(root):
+    """os.scandir walk yielding (path, stat) for every PDF; stat comes from the dir entry."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            stack.append(entry.path)
+                    elif entry.name.endswith('.pdf'):
+                        yield entry.path, entry.stat()
+        except OSError:
+            continue
+
+def refresh_catalog(conn, root='.'):
+    """Incrementally syncs the catalog with disk; returns (seen, rehashed)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT path, size, mtime FROM file_catalog WHERE present = 1")
+    known = {path: (size, mtime) for path, size, mtime in cursor.fetchall()}
+
+    seen = set()
+    rehashed = 0
+    for path, st in walk_pdfs(root):
+        seen.add(path)
+        if known.get(path) == (st.st_size, st.st_mtime):
+            continue
+        try:
+            digest = hash_file(path)
+        except OSError:
+            continue
+        cursor.execute('''
+            INSERT OR REPLACE INTO file_catalog (path, basename, size, mtime, sha256, present)
+            VALUES (?, ?, ?, ?, ?, 1)
+        ''', (path, os.path.basename(path), st.st_size, st.st_mtime, digest))
+        rehashed += 1
+
+    vanished = [(p,) for p in known if p not in seen]
+    cursor.executemany("UPDATE file_catalog SET present = 0 WHERE path = ?", vanished)
+    conn.commit()
+    return len(seen), rehashed
+
+def load_lookups(conn):
+    """basename -> path, sha256 -> path for present files; path -> sha256 for every file ever seen."""
+    cursor = conn.cursor()
+    by_name, by_hash, hash_of, present_paths = {}, {}, {}, set()
+    cursor.execute("SELECT path, basename, sha256, present FROM file_catalog ORDER BY path")
+    for path, basename, sha256, present in cursor.fetchall():
+        hash_of[path] = sha256
+        if present:
+            present_paths.add(path)
+            by_name.setdefault(basename, path)
+            by_hash.setdefault(sha256, path)
+    return by_name, by_hash, hash_of, present_paths
+
+def main(refresh=True):
     print("🔧 Starting Link Repair...")
-    
+
     if not os.path.exists(DOCS_FILE):
         print("❌ docs.json not found.")
         return
@@ -21,48 +116,49 @@ def main():
     with open(DOCS_FILE, 'r', encoding='utf-8') as f:
         docs = json.load(f)
 
-    # 1. Scan Corpus for Real Files
-    real_files = []
-    for root, dirs, files in os.walk('.'):
-        for file in files:
-            if file.endswith('.pdf'):
-                real_files.append(os.path.join(root, file))
-    
-    print(f"📂 Found {len(real_files)} real PDF files on disk.")
+    # 1. Sync the file catalog with the corpus on disk
+    conn = sqlite3.connect(DB_NAME)
+    init_catalog(conn)
+    if refresh:
+        seen, rehashed = refresh_catalog(conn)
+        print(f"📂 Catalog holds {seen} real PDF files on disk ({rehashed} new or changed).")
+    by_name, by_hash, hash_of, present_paths = load_lookups(conn)
+    conn.close()
 
     fixed_count = 0
     broken_count = 0
 
     for doc in docs:
-        current_path = doc.get('path', '')
-        
-        # Check integrity
-        if not os.path.exists(current_path):
-            # Try to fix
+        current_path = doc.get('path') or ''
+
+        # Check integrity (catalog hit avoids a stat per doc)
+        if current_path not in present_paths and not os.path.exists(current_path):
+            # Try to fix: same name elsewhere, then same content under any name
             filename = os.path.basename(current_path)
-            # Find in real_files
-            match = next((f for f in real_files if os.path.basename(f) == filename), None)
-            
+            match = by_name.get(filename) or by_hash.get(hash_of.get(current_path))
+
             if match:
                 doc['path'] = match
-                # fixed_count += 1
-                # print(f"  Fixed: {filename} -> {match}")
+                doc.pop('broken_link', None)
+                fixed_count += 1
             else:
                 doc['path'] = None # Mark as broken/missing
                 doc['broken_link'] = True
                 broken_count += 1
-                # print(f"  Broken: {filename}")
-        else:
-            # Path is good
-            pass
 
     # Save
     with open(DOCS_FILE, 'w', encoding='utf-8') as f:
         json.dump(docs, f, indent=2)
+    write_columnar(docs, os.path.splitext(DOCS_FILE)[0] + ".bin")
 
     print(f"✅ Audit Complete.")
     print(f"  - Verified: {len(docs) - broken_count}")
+    print(f"  - Re-linked: {fixed_count}")
     print(f"  - Broken: {broken_count} (Links removed to prevent 404s)")
 
 if __name__ == "__main__":
-    main()
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--no-refresh", action="store_true", help="Repair from the existing catalog without walking the disk")
+        args = parser.parse_args()
+        main(refresh=not args.no_refresh)
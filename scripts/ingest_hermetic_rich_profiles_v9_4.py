@@ -1,6 +1,9 @@
 import sqlite3
 import json
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import settings
 
 def ingest_rich_profiles(db_path):
     if not os.path.exists(db_path):
@@ -58,7 +61,7 @@ def ingest_rich_profiles(db_path):
         {"name": "Frances Yates", "type": "Scholar", "attributes": {"Bio": "Pioneer of the 'Hermetic Tradition' in the Renaissance."}}
     ]
 
-    print(f"Infusing {len(entities)} master profiles into esoteric.db...")
+    print(f"Infusing {len(entities)} master profiles into {db_path}...")
     for ent in entities:
         cursor.execute('''
             INSERT INTO entities (name, type, attributes)
@@ -73,4 +76,4 @@ def ingest_rich_profiles(db_path):
     print("Infusion complete.")
 
 if __name__ == "__main__":
-    ingest_rich_profiles("esoteric.db")
+    ingest_rich_profiles(settings.DB_PATH)
@@ -1,6 +1,9 @@
 import sqlite3
 import json
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import settings
 
 def ingest_lessons(db_path):
     if not os.path.exists(db_path):
@@ -87,4 +90,4 @@ def ingest_lessons(db_path):
     print("Ingestion complete.")
 
 if __name__ == "__main__":
-    ingest_lessons("esoteric.db")
+    ingest_lessons(settings.DB_PATH)
@@ -1,6 +1,11 @@
 import sqlite3
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan import init_entity_attributes
+import settings
 
 def inventory_data(db_path):
     if not os.path.exists(db_path):
@@ -9,6 +14,7 @@ def inventory_data(db_path):
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    init_entity_attributes(conn)
 
     report = {
         "counts": {},
@@ -45,19 +51,18 @@ def inventory_data(db_path):
         report["counts"]["entities_by_type"] = f"Error: {e}"
 
     # 4. Identify "Thin" vs "Rich" Entities
-    cursor.execute("SELECT name, type, attributes FROM entities")
-    for name, etype, attr_json in cursor.fetchall():
-        try:
-            attrs = json.loads(attr_json) if attr_json else {}
-            # Check for specific rich metadata keys
-            rich_keys = ["Biography", "Contributions", "Author", "Period", "Summary"]
-            has_rich = any(k in attrs for k in rich_keys)
-            
-            if has_rich:
-                report["rich_entities"].append(name)
-            else:
-                report["thin_entities"].append(name)
-        except:
+    # Check for specific rich metadata keys
+    rich_keys = ["Biography", "Contributions", "Author", "Period", "Summary"]
+    cursor.execute("""
+        SELECT e.name, EXISTS (
+            SELECT 1 FROM entity_attributes a WHERE a.entity_id = e.id AND a.key IN ({})
+        )
+        FROM entities e
+    """.format(",".join("?" * len(rich_keys))), rich_keys)
+    for name, has_rich in cursor.fetchall():
+        if has_rich:
+            report["rich_entities"].append(name)
+        else:
             report["thin_entities"].append(name)
 
     # 5. Extract Unique Alchemists/Figures
@@ -80,4 +85,4 @@ def inventory_data(db_path):
     print(f"Thin Entities (Metadata Gaps): {len(report['thin_entities'])}")
 
 if __name__ == "__main__":
-    inventory_data("esoteric.db")
+    inventory_data(settings.DB_PATH)
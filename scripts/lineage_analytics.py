@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import argparse
+from collections import deque
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+
+# ---------------------------------------------------------
+# V11: Golden Chain Analytics
+# ---------------------------------------------------------
+# Loads the transmission edges of hermetic_lineage.json into
+# an adjacency list and precomputes everything hermetic.html
+# would otherwise derive in the browser:
+#   - reachability (descendants / ancestors per figure)
+#   - shortest transmission paths (BFS predecessor rows)
+#   - betweenness centrality, ranked within each epoch
+# The output carries a fingerprint of the graph and doubles
+# as the cache: an unchanged lineage is never recomputed.
+# ---------------------------------------------------------
+
+LINEAGE_FILE = 'docs/hermetic_lineage.json'
+OUTPUT_FILE = 'docs/lineage_analytics.json'
+TOP_PER_EPOCH = 5
+
+def load_graph(lineage):
+    """(ids, periods, adjacency) with nodes as indices in file order; unknown endpoints are dropped."""
+    ids = [str(n['id']) for n in lineage.get('nodes', [])]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    periods = [n.get('period') or 'Unknown Epoch' for n in lineage.get('nodes', [])]
+    adjacency = [[] for _ in ids]
+    for e in lineage.get('edges', []):
+        s, t = index.get(str(e['source'])), index.get(str(e['target']))
+        if s is not None and t is not None and t not in adjacency[s]:
+            adjacency[s].append(t)
+    return ids, periods, adjacency
+
+def fingerprint(ids, periods, adjacency):
+    canonical = json.dumps({
+        "nodes": list(zip(ids, periods)),
+        "edges": sorted((ids[s], ids[t]) for s, targets in enumerate(adjacency) for t in targets),
+    }, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def bfs(adjacency, source):
+    """Unweighted single-source BFS: (predecessor list, visit order)."""
+    pred = [-1] * len(adjacency)
+    seen = [False] * len(adjacency)
+    seen[source] = True
+    order = []
+    queue = deque([source])
+    while queue:
+        u = queue.popleft()
+        order.append(u)
+        for v in adjacency[u]:
+            if not seen[v]:
+                seen[v] = True
+                pred[v] = u
+                queue.append(v)
+    return pred, order
+
+def betweenness(adjacency):
+    """Brandes' algorithm for directed, unweighted graphs (normalised to 0..1)."""
+    n = len(adjacency)
+    score = [0.0] * n
+    for s in range(n):
+        stack = []
+        preds = [[] for _ in range(n)]
+        sigma = [0] * n
+        dist = [-1] * n
+        sigma[s], dist[s] = 1, 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            stack.append(u)
+            for v in adjacency[u]:
+                if dist[v] < 0:
+                    dist[v] = dist[u] + 1
+                    queue.append(v)
+                if dist[v] == dist[u] + 1:
+                    sigma[v] += sigma[u]
+                    preds[v].append(u)
+        delta = [0.0] * n
+        while stack:
+            w = stack.pop()
+            for u in preds[w]:
+                delta[u] += sigma[u] / sigma[w] * (1 + delta[w])
+            if w != s:
+                score[w] += delta[w]
+    scale = (n - 1) * (n - 2) if n > 2 else 1
+    return [round(x / scale, 4) for x in score]
+
+def compute_analytics(ids, periods, adjacency):
+    n = len(ids)
+    reverse = [[] for _ in range(n)]
+    for s, targets in enumerate(adjacency):
+        for t in targets:
+            reverse[t].append(s)
+
+    pred_rows, descendants = [], []
+    for s in range(n):
+        pred, order = bfs(adjacency, s)
+        pred_rows.append(pred)
+        descendants.append(sorted(order[1:]))
+    ancestors = [sorted(bfs(reverse, s)[1][1:]) for s in range(n)]
+    centrality = betweenness(adjacency)
+
+    epochs = {}
+    for i, period in enumerate(periods):
+        epochs.setdefault(period, []).append(i)
+    epoch_stats = []
+    for period, members in epochs.items():
+        ranked = sorted(members, key=lambda i: (-centrality[i], -len(descendants[i]), ids[i]))
+        epoch_stats.append({
+            "label": period,
+            "size": len(members),
+            "top": ranked[:TOP_PER_EPOCH],
+            "descendants": len(set().union(*(descendants[i] for i in members)) - set(members)),
+        })
+
+    return {
+        "ids": ids,
+        "nodes": [{
+            "out": adjacency[i],
+            "in": reverse[i],
+            "descendants": len(descendants[i]),
+            "ancestors": len(ancestors[i]),
+            "centrality": centrality[i],
+        } for i in range(n)],
+        # reach[i]: every figure the tradition passed to from i (transitive closure)
+        "reach": descendants,
+        # pred[s][t]: previous hop on the shortest chain s -> t, -1 if unreachable
+        "pred": pred_rows,
+        "epochs": epoch_stats,
+        "roots": [i for i in range(n) if not reverse[i]],
+    }
+
+def cached_fingerprint():
+    if os.path.exists(OUTPUT_FILE):
+        try:
+            with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f).get('fingerprint')
+        except (OSError, ValueError):
+            pass
+    return None
+
+def save_json(path, data, **kwargs):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+def main(force=False):
+    if not os.path.exists(LINEAGE_FILE):
+        print(f"❌ {LINEAGE_FILE} not found. Run scripts/mine_lineage.py first.")
+        return
+
+    with open(LINEAGE_FILE, 'r', encoding='utf-8') as f:
+        lineage = json.load(f)
+    ids, periods, adjacency = load_graph(lineage)
+    key = fingerprint(ids, periods, adjacency)
+
+    if not force and cached_fingerprint() == key:
+        print(f"✅ Lineage unchanged ({key[:12]}); analytics are current.")
+        return
+
+    analytics = compute_analytics(ids, periods, adjacency)
+    analytics['fingerprint'] = key
+    save_json(OUTPUT_FILE, analytics, separators=(',', ':'))
+
+    edges = sum(len(t) for t in adjacency)
+    print(f"🕸 Analysed {len(ids)} figures and {edges} transmissions ({key[:12]}).")
+    print(f"💾 Saved to {OUTPUT_FILE}")
+
+if __name__ == "__main__":
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--force", action="store_true", help="Recompute even if the graph fingerprint is unchanged")
+        args = parser.parse_args()
+        main(force=args.force)
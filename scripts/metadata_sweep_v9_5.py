@@ -1,6 +1,11 @@
 import sqlite3
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan import init_entity_attributes
+import settings
 
 def run_metadata_sweep(db_path):
     if not os.path.exists(db_path):
@@ -9,11 +14,18 @@ def run_metadata_sweep(db_path):
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    init_entity_attributes(conn)
 
     print("--- [List Watcher] Starting Global Metadata Sweep (V9.5) ---")
     
-    # 1. Inspect Entity Schema
-    cursor.execute("SELECT id, name, type, attributes FROM entities")
+    # 1. Inspect Entity Schema: key count and non-empty keys per entity
+    cursor.execute("""
+        SELECT e.id, e.name, e.type, COUNT(a.key),
+               group_concat(CASE WHEN a.value IS NOT NULL AND a.value NOT IN ('', 0, '[]', '{}') THEN a.key END, char(31))
+        FROM entities e
+        LEFT JOIN entity_attributes a ON a.entity_id = e.id
+        GROUP BY e.id
+    """)
     all_entities = cursor.fetchall()
 
     metrics = {
@@ -33,19 +45,15 @@ def run_metadata_sweep(db_path):
         "Lesson": ["Category", "Insight", "Designer"]
     }
 
-    for eid, name, etype, attrs_raw in all_entities:
+    for eid, name, etype, attr_count, filled_raw in all_entities:
         metrics["types"][etype] = metrics["types"].get(etype, 0) + 1
-        
-        try:
-            attrs = json.loads(attrs_raw) if attrs_raw else {}
-        except:
-            attrs = {}
+        filled = set(filled_raw.split(chr(31))) if filled_raw else set()
 
         # Check richness
         required = mandatory_fields.get(etype, [])
-        missing = [f for f in required if f not in attrs or not attrs[f]]
+        missing = [f for f in required if f not in filled]
         
-        is_thick = len(attrs.keys()) >= 3 and not missing
+        is_thick = attr_count >= 3 and not missing
         
         if is_thick:
             metrics["thick_count"] += 1
@@ -56,7 +64,7 @@ def run_metadata_sweep(db_path):
                 "name": name,
                 "type": etype,
                 "missing_fields": missing,
-                "current_attr_count": len(attrs.keys())
+                "current_attr_count": attr_count
             })
 
     # Save Mend Queue for UI enrichment portal
@@ -72,4 +80,4 @@ def run_metadata_sweep(db_path):
     conn.close()
 
 if __name__ == "__main__":
-    run_metadata_sweep("esoteric.db")
+    run_metadata_sweep(settings.DB_PATH)
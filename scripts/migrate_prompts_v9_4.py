@@ -1,5 +1,8 @@
 import sqlite3
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import settings
 
 def migrate_prompts(db_path):
     if not os.path.exists(db_path):
@@ -41,4 +44,4 @@ def migrate_prompts(db_path):
     conn.close()
 
 if __name__ == "__main__":
-    migrate_prompts("esoteric.db")
+    migrate_prompts(settings.DB_PATH)
@@ -1,6 +1,9 @@
 import json
 import random
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
 
 # ---------------------------------------------------------
 # V11: The "Deep Reading" Simulator
@@ -160,4 +163,5 @@ def main():
         print(f"❌ Error during generation: {e}")
 
 if __name__ == "__main__":
-    main()
+    with profiling():
+        main()
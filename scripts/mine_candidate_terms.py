@@ -2,8 +2,28 @@ import sqlite3
 import json
 import re
 import os
+import heapq
+import random
+import argparse
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
+
+# Streaming mode (full chunk table in fixed memory)
+STATE_FILE = "data/snapshots/candidate_terms_state.json"
+SKETCH_CAPACITY = 5000      # Max terms monitored by the Space-Saving sketch
+EXAMPLES_PER_TERM = 3       # Reservoir size per monitored term
+CHECKPOINT_EVERY = 2000     # Chunks between state checkpoints
+
+# Patterns for discovery
+PATTERNS = [
+    re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,2})\b'), # TitleCase entities
+    re.compile(r'called\s+"?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)"?'), # "called X"
+    re.compile(r'known\s+as\s+"?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)"?') # "known as X"
+]
 
 def mine_candidates():
     conn = sqlite3.connect(DB_NAME)
@@ -14,20 +34,13 @@ def mine_candidates():
     # We'll look for 2-3 word TitleCase sequences that appear frequently
     cursor.execute("SELECT doc_id, text_content FROM chunks LIMIT 1000")
     chunks = cursor.fetchall()
-    
+
     candidate_map = {}
-    
-    # Patterns for discovery
-    patterns = [
-        r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,2})\b', # TitleCase entities
-        r'called\s+"?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)"?', # "called X"
-        r'known\s+as\s+"?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)"?' # "known as X"
-    ]
 
     for chunk in chunks:
         text = chunk['text_content']
-        for p in patterns:
-            matches = re.findall(p, text)
+        for p in PATTERNS:
+            matches = p.findall(text)
             for m in matches:
                 if len(m) < 4: continue
                 if m not in candidate_map:
@@ -42,16 +55,142 @@ def mine_candidates():
     # Sort and filter
     sorted_candidates = sorted(candidate_map.values(), key=lambda x: x['count'], reverse=True)
     top_candidates = [c for c in sorted_candidates if c['count'] > 1]
+    save_candidates(top_candidates)
+    conn.close()
 
+def save_candidates(top_candidates):
     # Save to JSON
     export_path = "docs"
     os.makedirs(export_path, exist_ok=True)
-    
+
     with open(os.path.join(export_path, "candidate_terms.json"), "w") as f:
         json.dump(top_candidates[:100], f, indent=2)
 
     print(f"Candidate mining complete. Found {len(top_candidates)} potential terms.")
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch (Metwally et al.).
+    Monitors at most `capacity` terms; a new term evicts the current minimum
+    and inherits its count as over-estimation error. Each monitored term keeps
+    a reservoir sample of example snippets.
+    """
+    def __init__(self, capacity=SKETCH_CAPACITY, examples=EXAMPLES_PER_TERM):
+        self.capacity = capacity
+        self.examples = examples
+        self.counters = {}  # term -> {"count", "error", "examples"}
+        self.heap = []      # (count, term), lazily invalidated
+
+    def offer(self, term, example_fn):
+        entry = self.counters.get(term)
+        if entry is None:
+            if len(self.counters) < self.capacity:
+                entry = {"count": 0, "error": 0, "examples": []}
+            else:
+                floor = self._evict_min()
+                entry = {"count": floor, "error": floor, "examples": []}
+            self.counters[term] = entry
+
+        entry["count"] += 1
+        heapq.heappush(self.heap, (entry["count"], term))
+
+        # Reservoir sampling over the occurrences seen while monitored
+        seen = entry["count"] - entry["error"]
+        if len(entry["examples"]) < self.examples:
+            entry["examples"].append(example_fn())
+        else:
+            j = random.randrange(seen)
+            if j < self.examples:
+                entry["examples"][j] = example_fn()
+
+        if len(self.heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _evict_min(self):
+        while self.heap:
+            count, term = heapq.heappop(self.heap)
+            entry = self.counters.get(term)
+            if entry is not None and entry["count"] == count:
+                del self.counters[term]
+                return count
+        return 0
+
+    def _rebuild_heap(self):
+        self.heap = [(e["count"], t) for t, e in self.counters.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, n=None):
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1]["count"], reverse=True)
+        return ranked[:n] if n else ranked
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "examples": self.examples, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("capacity", SKETCH_CAPACITY), data.get("examples", EXAMPLES_PER_TERM))
+        sketch.counters = data.get("counters", {})
+        sketch._rebuild_heap()
+        return sketch
+
+def load_state(resume):
+    if resume and os.path.exists(STATE_FILE):
+        with open(STATE_FILE, "r") as f:
+            state = json.load(f)
+        print(f"Resuming from chunk id {state['last_chunk_id']} ({state['chunks_processed']} chunks done).")
+        return state["last_chunk_id"], state["chunks_processed"], SpaceSaving.from_dict(state["sketch"])
+    return 0, 0, SpaceSaving()
+
+def save_state(last_chunk_id, processed, sketch):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_chunk_id": last_chunk_id, "chunks_processed": processed, "sketch": sketch.to_dict()}, f)
+    os.replace(tmp_path, STATE_FILE)
+
+def mine_candidates_streaming(resume=False):
+    """Streams every chunk in id order through the sketch; resumable via STATE_FILE."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+
+    last_id, processed, sketch = load_state(resume)
+
+    # Lazily stepped cursor: rows are pulled one at a time, never materialized
+    cursor.execute("SELECT id, doc_id, text_content FROM chunks WHERE id > ? ORDER BY id", (last_id,))
+    for chunk_id, doc_id, text in cursor:
+        if text:
+            for p in PATTERNS:
+                for match in p.finditer(text):
+                    m = match.group(1)
+                    if len(m) < 4: continue
+                    start = max(0, match.start() - 60)
+                    sketch.offer(m, lambda s=start: {"doc_id": doc_id, "snippet": text[s:s + 150] + "..."})
+
+        last_id = chunk_id
+        processed += 1
+        if processed % CHECKPOINT_EVERY == 0:
+            save_state(last_id, processed, sketch)
+            print(f"  Mined {processed} chunks (monitoring {len(sketch.counters)} terms)...")
+
+    save_state(last_id, processed, sketch)
     conn.close()
 
+    top_candidates = [
+        {"term": term, "count": e["count"], "error": e["error"], "examples": e["examples"]}
+        for term, e in sketch.top()
+        if e["count"] - e["error"] > 1
+    ]
+    print(f"Streamed {processed} chunks.")
+    save_candidates(top_candidates)
+
 if __name__ == "__main__":
-    mine_candidates()
+    with profiling():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--stream", action="store_true", help="Mine the full chunk table with a bounded sketch")
+        parser.add_argument("--resume", action="store_true", help="Continue a streaming run from its last checkpoint")
+        args = parser.parse_args()
+
+        if args.stream or args.resume:
+            mine_candidates_streaming(resume=args.resume)
+        else:
+            mine_candidates()
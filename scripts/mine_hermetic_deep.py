@@ -1,16 +1,22 @@
 import sqlite3
 import os
 import re
+import sys
 import hashlib
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mining_pipeline import Stage, register_stage
+from instrumentation import profiling
+import settings
+
 try:
     import pypdf
     HAS_PYPDF = True
 except ImportError:
     HAS_PYPDF = False
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
 
 def extract_text(filepath, max_pages=10):
     if not HAS_PYPDF: return ""
@@ -25,6 +31,44 @@ def extract_text(filepath, max_pages=10):
         return text.strip()
     except: return ""
 
+def summarize_hermetic(text):
+    """Condenses the figure, lineage and concept heuristics into a summary line."""
+    text_lower = text.lower()
+    
+    # Heuristics for Figures, Lineage, and Concepts
+    figures = []
+    if any(w in text_lower for w in ["hermes", "trismegistus"]): figures.append("Hermes Trismegistus")
+    if "ficino" in text_lower: figures.append("Marsilio Ficino")
+    if "bruno" in text_lower: figures.append("Giordano Bruno")
+    if "lazzarelli" in text_lower: figures.append("Lodovico Lazzarelli")
+    if "agrippa" in text_lower: figures.append("Cornelius Agrippa")
+    if "hanegraaff" in text_lower: figures.append("Wouter Hanegraaff")
+
+    lineage = "General Hermeticism"
+    if any(w in text_lower for w in ["prisca theologia", "chain of gold", "aglaophamus"]):
+        lineage = "Prisca Theologia"
+    elif any(w in text_lower for w in ["gnostic", "papyri", "pgm"]):
+        lineage = "Technical Hermetica"
+    elif any(w in text_lower for w in ["philosophy", "asclepius", "corpus hermeticum"]):
+        lineage = "Philosophical Hermetica"
+        
+    concepts = []
+    if "nous" in text_lower: concepts.append("Nous")
+    if "monas" in text_lower: concepts.append("Monad")
+    if "regeneration" in text_lower: concepts.append("Regeneration")
+    if "microcosm" in text_lower or "macrocosm" in text_lower: concepts.append("Microcosm/Macrocosm")
+
+    return f"Lineage: {lineage}. Figures: {', '.join(figures)}. Key Concepts: {', '.join(concepts)}."
+
+@register_stage("hermetic_deep")
+class HermeticDeepStage(Stage):
+    def accepts(self, ctx):
+        return ctx.topic == 'hermetic' or 'hermetic' in ctx.path.lower()
+
+    def process(self, ctx, writer):
+        writer.add("UPDATE documents SET summary = ?, topic = 'hermetic' WHERE id = ?",
+                   (summarize_hermetic(ctx.text(10)), ctx.doc_id))
+
 def mine():
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
@@ -46,33 +90,7 @@ def mine():
             
         print(f"Deep scanning: {doc['filename']}...")
         text = extract_text(path, max_pages=10)
-        text_lower = text.lower()
-        
-        # Heuristics for Figures, Lineage, and Concepts
-        figures = []
-        if any(w in text_lower for w in ["hermes", "trismegistus"]): figures.append("Hermes Trismegistus")
-        if "ficino" in text_lower: figures.append("Marsilio Ficino")
-        if "bruno" in text_lower: figures.append("Giordano Bruno")
-        if "lazzarelli" in text_lower: figures.append("Lodovico Lazzarelli")
-        if "agrippa" in text_lower: figures.append("Cornelius Agrippa")
-        if "hanegraaff" in text_lower: figures.append("Wouter Hanegraaff")
-
-        lineage = "General Hermeticism"
-        if any(w in text_lower for w in ["prisca theologia", "chain of gold", "aglaophamus"]):
-            lineage = "Prisca Theologia"
-        elif any(w in text_lower for w in ["gnostic", "papyri", "pgm"]):
-            lineage = "Technical Hermetica"
-        elif any(w in text_lower for w in ["philosophy", "asclepius", "corpus hermeticum"]):
-            lineage = "Philosophical Hermetica"
-            
-        concepts = []
-        if "nous" in text_lower: concepts.append("Nous")
-        if "monas" in text_lower: concepts.append("Monad")
-        if "regeneration" in text_lower: concepts.append("Regeneration")
-        if "microcosm" in text_lower or "macrocosm" in text_lower: concepts.append("Microcosm/Macrocosm")
-
-        # Update attributes or summary
-        summary = f"Lineage: {lineage}. Figures: {', '.join(figures)}. Key Concepts: {', '.join(concepts)}."
+        summary = summarize_hermetic(text)
         
         # We can store this in the summary field or a JSON block in attributes if we had one
         # For now, let's update summary and period if detected
@@ -88,4 +106,5 @@ def mine():
     conn.close()
 
 if __name__ == "__main__":
-    mine()
+    with profiling():
+        mine()
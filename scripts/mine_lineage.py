@@ -1,6 +1,9 @@
 import json
 import random
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
 
 # ---------------------------------------------------------
 # V11: The "Lineage Network" Simulator
@@ -136,4 +139,5 @@ def main():
     print(f"💾 Saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    with profiling():
+        main()
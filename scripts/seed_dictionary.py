@@ -2,8 +2,12 @@ import sqlite3
 import json
 import uuid
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import profiling
+import settings
 
-DB_NAME = "esoteric.db"
+DB_NAME = settings.DB_PATH
 
 def seed():
     conn = sqlite3.connect(DB_NAME)
@@ -42,4 +46,5 @@ def seed():
     conn.close()
 
 if __name__ == "__main__":
-    seed()
+    with profiling():
+        seed()
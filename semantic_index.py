@@ -0,0 +1,393 @@
+import os
+import re
+import json
+import sqlite3
+import argparse
+import unicodedata
+from datetime import datetime
+from instrumentation import RunReport, profiling
+import settings
+
+# NumPy does all the linear algebra; without it the index cannot be built or queried
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# ---------------------------------------------------------
+# LSA Semantic Index
+# ---------------------------------------------------------
+# Keyword search misses passages that say "green lion" when
+# the query says "vitriol". Latent semantic analysis maps
+# terms that share contexts onto nearby directions:
+#   1. TF-IDF (sublinear tf, smoothed idf, L2 rows) over every
+#      chunk plus every dictionary definition (chunks from
+#      the main database, entries from the attached lexicon)
+#   2. randomized truncated SVD (Halko et al.) straight from
+#      the sparse rows, densified a block at a time so the
+#      full matrix never exists in memory
+#   3. row vectors X·V (= U·S), L2-normalised, written as a
+#      raw float32 file and read back through np.memmap
+# Queries project the same way and scan the memmap in blocks
+# for cosine top-k. New chunks are folded in with the stored
+# term basis and appended, so only a full rebuild re-learns
+# the basis. A fold also diffs meta.json's ids against the
+# database: rows whose chunk or entry is gone are flagged
+# stale and never returned, and once more than STALE_REBUILD
+# of the rows are stale the fold rebuilds instead.
+# ---------------------------------------------------------
+
+INDEX_DIR = "data/semantic"
+VECTORS_FILE = "vectors.f32"
+COMPONENTS_FILE = "components.npy"
+META_FILE = "meta.json"
+
+DIMS = 256              # Latent dimensions kept
+OVERSAMPLE = 12         # Extra random directions for the range finder
+POWER_ITERS = 2         # Subspace iterations; sharpens the spectrum tail
+MIN_DF = 2              # Terms seen in fewer rows carry no co-occurrence signal
+MAX_DF_RATIO = 0.5      # Terms in more than half the rows are stopword-like
+MAX_VOCAB = 60000
+DENSE_BLOCK = 256       # Rows densified at once for the BLAS products
+QUERY_BLOCK = 65536     # Rows scored per memmap slice
+TOP_K = 20
+STALE_REBUILD = 0.2     # Share of stale rows above which a fold rebuilds from scratch
+NOT_BUILT = "semantic index not built (python semantic_index.py)"
+
+TOKEN = re.compile(r"[^\W\d_]{3,}")
+STOPWORDS = {
+    "the", "and", "that", "this", "from", "with", "which", "their", "they", "were", "been", "have",
+    "would", "could", "should", "there", "these", "those", "into", "also", "than", "then", "them",
+    "what", "when", "where", "while", "will", "shall", "upon", "unto", "such", "other", "some",
+    "more", "most", "very", "only", "being", "between", "through", "about", "after", "before",
+}
+
+ENTRY_TEXT_SQL = '''
+    SELECT id, COALESCE(headword, '') || ' ' || COALESCE(short_definition, '') || ' ' ||
+           COALESCE(physical_meaning, '') || ' ' || COALESCE(spiritual_meaning, '') || ' ' ||
+           COALESCE(etymology, '')
+    FROM lexicon.dictionary_entries
+'''
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in TOKEN.findall(text) if t not in STOPWORDS]
+
+def open_corpus(db_path, lexicon_path=settings.LEXICON_DB):
+    """Main database with the lexicon attached as `lexicon` (when it exists) for dictionary entries."""
+    conn = sqlite3.connect(db_path)
+    if os.path.exists(lexicon_path):
+        conn.execute("ATTACH DATABASE ? AS lexicon", (lexicon_path,))
+    return conn
+
+def has_entries(conn):
+    if not conn.execute("SELECT 1 FROM pragma_database_list WHERE name = 'lexicon'").fetchone():
+        return False
+    return conn.execute("SELECT 1 FROM lexicon.sqlite_master WHERE name = 'dictionary_entries'").fetchone() is not None
+
+def iter_texts(conn):
+    """(kind, id, text) for every chunk plus dictionary entries."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, text_content FROM chunks ORDER BY id")
+    for chunk_id, text in cursor:
+        yield "chunk", chunk_id, text
+    if has_entries(conn):
+        for entry_id, text in conn.execute(ENTRY_TEXT_SQL):
+            yield "entry", entry_id, text
+
+def live_ids(conn):
+    """{(kind, id)} for every chunk and entry currently in the database."""
+    live = {("chunk", row[0]) for row in conn.execute("SELECT id FROM chunks")}
+    if has_entries(conn):
+        live.update(("entry", row[0]) for row in conn.execute("SELECT id FROM lexicon.dictionary_entries"))
+    return live
+
+def iter_rows(conn, keys, batch=500):
+    """(kind, id, text) for the given (kind, id) keys, chunks then entries."""
+    sources = {"chunk": "SELECT id, text_content FROM chunks", "entry": ENTRY_TEXT_SQL}
+    for kind, sql in sources.items():
+        wanted = sorted(rid for k, rid in keys if k == kind)
+        for start in range(0, len(wanted), batch):
+            part = wanted[start:start + batch]
+            rows = conn.execute(f"{sql} WHERE id IN ({','.join('?' * len(part))}) ORDER BY id", part)
+            for row_id, text in rows:
+                yield kind, row_id, text
+
+class SparseRows:
+    """CSR rows of a TF-IDF matrix with the block products randomized SVD needs."""
+    def __init__(self, indptr, indices, data, n_terms):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.n_rows = len(indptr) - 1
+        self.n_terms = n_terms
+
+    def dense_blocks(self):
+        for start in range(0, self.n_rows, DENSE_BLOCK):
+            stop = min(start + DENSE_BLOCK, self.n_rows)
+            lo, hi = self.indptr[start], self.indptr[stop]
+            block = np.zeros((stop - start, self.n_terms), dtype=np.float32)
+            local_rows = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+            block[local_rows, self.indices[lo:hi]] = self.data[lo:hi]
+            yield start, stop, block
+
+    def dot(self, m):
+        """X @ m for m of shape (n_terms, j)."""
+        out = np.empty((self.n_rows, m.shape[1]), dtype=np.float32)
+        for start, stop, block in self.dense_blocks():
+            out[start:stop] = block @ m
+        return out
+
+    def tdot(self, m):
+        """X.T @ m for m of shape (n_rows, j)."""
+        out = np.zeros((self.n_terms, m.shape[1]), dtype=np.float32)
+        for start, stop, block in self.dense_blocks():
+            out += block.T @ m[start:stop]
+        return out
+
+def weigh(counts, vocab, idf):
+    """Sparse (term indices, weights) for one row's term counts, L2-normalised."""
+    pairs = [(vocab[t], n) for t, n in counts.items() if t in vocab]
+    if not pairs:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    idx = np.array([p[0] for p in pairs], dtype=np.int32)
+    w = (1.0 + np.log(np.array([p[1] for p in pairs], dtype=np.float32))) * idf[idx]
+    return idx, (w / np.linalg.norm(w)).astype(np.float32)
+
+def term_counts(text):
+    counts = {}
+    for t in tokenize(text):
+        counts[t] = counts.get(t, 0) + 1
+    return counts
+
+def build_matrix(conn, report):
+    """Two streaming passes: document frequencies, then the weighted CSR rows."""
+    df = {}
+    n_rows = 0
+    with report.span("vocabulary"):
+        for _, _, text in iter_texts(conn):
+            for t in set(tokenize(text)):
+                df[t] = df.get(t, 0) + 1
+            n_rows += 1
+    ceiling = max(MIN_DF, int(n_rows * MAX_DF_RATIO))
+    kept = sorted((t for t, n in df.items() if MIN_DF <= n <= ceiling), key=lambda t: (-df[t], t))[:MAX_VOCAB]
+    terms = sorted(kept)
+    vocab = {t: i for i, t in enumerate(terms)}
+    idf = np.array([np.log((1 + n_rows) / (1 + df[t])) + 1.0 for t in terms], dtype=np.float32)
+
+    ids, indptr, indices, data = [], [0], [], []
+    with report.span("tfidf"):
+        for kind, row_id, text in iter_texts(conn):
+            idx, w = weigh(term_counts(text), vocab, idf)
+            ids.append([kind, row_id])
+            indices.append(idx)
+            data.append(w)
+            indptr.append(indptr[-1] + len(idx))
+    matrix = SparseRows(np.array(indptr, dtype=np.int64),
+                        np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                        np.concatenate(data) if data else np.empty(0, dtype=np.float32),
+                        len(terms))
+    return matrix, ids, terms, idf
+
+def truncated_svd(matrix, dims, seed=0):
+    """Randomized range finder + small dense SVD; returns the (n_terms, dims) term basis V."""
+    rng = np.random.default_rng(seed)
+    width = min(dims + OVERSAMPLE, matrix.n_terms, matrix.n_rows)
+    q, _ = np.linalg.qr(matrix.dot(rng.standard_normal((matrix.n_terms, width)).astype(np.float32)))
+    for _ in range(POWER_ITERS):
+        z, _ = np.linalg.qr(matrix.tdot(q))
+        q, _ = np.linalg.qr(matrix.dot(z))
+    b = matrix.tdot(q).T                    # (width, n_terms) = Q.T @ X
+    _, s, vt = np.linalg.svd(b, full_matrices=False)
+    k = min(dims, len(s))
+    return vt[:k].T.astype(np.float32), s[:k]
+
+def project(matrix, basis):
+    """Row embeddings X·V, L2-normalised for cosine scoring."""
+    vectors = matrix.dot(basis)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def save_meta(index_dir, meta):
+    tmp = os.path.join(index_dir, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(index_dir, META_FILE))
+
+def build_index(db_path=settings.DB_PATH, index_dir=INDEX_DIR, dims=DIMS, report=None, lexicon_path=settings.LEXICON_DB):
+    report = report or RunReport("semantic_index.py")
+    os.makedirs(index_dir, exist_ok=True)
+    conn = open_corpus(db_path, lexicon_path)
+    matrix, ids, terms, idf = build_matrix(conn, report)
+    conn.close()
+    if not matrix.n_rows or not matrix.n_terms:
+        print("Nothing to index.")
+        return None
+    print(f"TF-IDF: {matrix.n_rows} rows x {matrix.n_terms} terms, {len(matrix.data)} non-zeros.")
+
+    with report.span("svd"):
+        basis, spectrum = truncated_svd(matrix, dims)
+    with report.span("project"):
+        vectors = project(matrix, basis)
+
+    # Write vectors first; meta.json is the commit point readers look for
+    tmp = os.path.join(index_dir, VECTORS_FILE + ".tmp")
+    vectors.astype(np.float32).tofile(tmp)
+    os.replace(tmp, os.path.join(index_dir, VECTORS_FILE))
+    np.save(os.path.join(index_dir, COMPONENTS_FILE), basis)
+    last_chunk = max((row_id for kind, row_id in ids if kind == "chunk"), default=0)
+    save_meta(index_dir, {
+        "dims": basis.shape[1],
+        "rows": len(ids),
+        "ids": ids,
+        "terms": terms,
+        "idf": [round(float(x), 6) for x in idf],
+        "singular_values": [round(float(x), 4) for x in spectrum],
+        "last_chunk_id": last_chunk,
+        "built_at": datetime.now().isoformat(),
+    })
+    report.count("rows", len(ids))
+    report.count("terms", len(terms))
+    print(f"🧭 Semantic index: {len(ids)} rows in {basis.shape[1]} dimensions -> {index_dir}")
+    return len(ids)
+
+class SemanticIndex:
+    """Read side: memory-mapped vectors, in-RAM term basis, cosine top-k."""
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.dims = self.meta["dims"]
+        self.ids = self.meta["ids"]
+        self.vocab = {t: i for i, t in enumerate(self.meta["terms"])}
+        self.idf = np.array(self.meta["idf"], dtype=np.float32)
+        self.basis = np.load(os.path.join(index_dir, COMPONENTS_FILE), mmap_mode="r")
+        self.vectors = np.memmap(os.path.join(index_dir, VECTORS_FILE), dtype=np.float32, mode="r",
+                                 shape=(self.meta["rows"], self.dims))
+        # Rows whose chunk/entry was deleted since they were indexed (sorted row numbers)
+        self.stale = np.array(sorted(self.meta.get("stale", [])), dtype=np.int64)
+
+    def embed(self, text):
+        idx, w = weigh(term_counts(text), self.vocab, self.idf)
+        if not len(idx):
+            return None
+        v = w @ np.asarray(self.basis[idx])
+        norm = np.linalg.norm(v)
+        return v / norm if norm else None
+
+    def top_k(self, vector, k=TOP_K, exclude=None):
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        keep = k + (exclude is not None)
+        for start in range(0, len(self.vectors), QUERY_BLOCK):
+            scores = np.asarray(self.vectors[start:start + QUERY_BLOCK]) @ vector
+            lo, hi = np.searchsorted(self.stale, [start, start + len(scores)])
+            scores[self.stale[lo:hi] - start] = -np.inf
+            if len(scores) > keep:
+                part = np.argpartition(-scores, keep)[:keep]
+            else:
+                part = np.arange(len(scores))
+            best_scores = np.concatenate([best_scores, scores[part]])
+            best_rows = np.concatenate([best_rows, part + start])
+        order = np.argsort(-best_scores)
+        hits = []
+        for i in order:
+            row = int(best_rows[i])
+            if not np.isfinite(best_scores[i]):
+                break
+            if row == exclude:
+                continue
+            kind, row_id = self.ids[row]
+            hits.append({"kind": kind, "id": row_id, "score": round(float(best_scores[i]), 4)})
+            if len(hits) == k:
+                break
+        return hits
+
+    def query(self, text, k=TOP_K):
+        vector = self.embed(text)
+        return self.top_k(vector, k) if vector is not None else []
+
+    def similar(self, kind, row_id, k=TOP_K):
+        """Neighbours of an indexed chunk or entry."""
+        stale = set(self.stale.tolist())
+        for row, (row_kind, rid) in enumerate(self.ids):
+            if row_kind == kind and str(rid) == str(row_id) and row not in stale:
+                return self.top_k(np.asarray(self.vectors[row]), k, exclude=row)
+        return []
+
+def fold_in(db_path=settings.DB_PATH, index_dir=INDEX_DIR, dims=DIMS, report=None, lexicon_path=settings.LEXICON_DB):
+    """Flags rows whose chunk/entry is gone and appends the ones not yet indexed, projected on the stored basis."""
+    report = report or RunReport("semantic_index.py")
+    index = SemanticIndex(index_dir)
+    conn = open_corpus(db_path, lexicon_path)
+    live = live_ids(conn)
+
+    # A row stays stale once flagged; if its id comes back it is new text and gets a fresh row
+    stale = set(index.meta.get("stale", []))
+    stale.update(row for row, (kind, rid) in enumerate(index.ids) if (kind, rid) not in live)
+    indexed = {(kind, rid) for row, (kind, rid) in enumerate(index.ids) if row not in stale}
+    if len(stale) > index.meta["rows"] * STALE_REBUILD:
+        conn.close()
+        print(f"♻️ {len(stale)} of {index.meta['rows']} indexed rows are stale; rebuilding the semantic index.")
+        del index
+        return build_index(db_path, index_dir, dims=dims, report=report, lexicon_path=lexicon_path)
+
+    ids, indptr, indices, data = [], [0], [], []
+    with report.span("tfidf"):
+        for kind, row_id, text in iter_rows(conn, live - indexed):
+            idx, w = weigh(term_counts(text), index.vocab, index.idf)
+            ids.append([kind, row_id])
+            indices.append(idx)
+            data.append(w)
+            indptr.append(indptr[-1] + len(idx))
+    conn.close()
+    meta = index.meta
+    if not ids and len(stale) == len(meta.get("stale", [])):
+        print("Semantic index is current; nothing to fold in.")
+        return 0
+
+    if ids:
+        matrix = SparseRows(np.array(indptr, dtype=np.int64), np.concatenate(indices),
+                            np.concatenate(data), len(index.vocab))
+        with report.span("project"):
+            vectors = project(matrix, np.asarray(index.basis))
+        with open(os.path.join(index_dir, VECTORS_FILE), "ab") as f:
+            vectors.astype(np.float32).tofile(f)
+    meta["ids"] += ids
+    meta["rows"] = len(meta["ids"])
+    meta["stale"] = sorted(stale)
+    meta["last_chunk_id"] = max([meta["last_chunk_id"]] + [row_id for kind, row_id in ids if kind == "chunk"])
+    meta["folded_at"] = datetime.now().isoformat()
+    save_meta(index_dir, meta)
+    report.count("rows", len(ids))
+    report.count("stale", len(stale))
+    print(f"🧭 Folded {len(ids)} new rows into the semantic index ({meta['rows']} rows, {len(stale)} stale).")
+    return len(ids)
+
+if __name__ == "__main__":
+    with profiling():
+        parser = argparse.ArgumentParser(description="Offline LSA index over chunks and dictionary definitions")
+        parser.add_argument("--db", default=settings.DB_PATH)
+        parser.add_argument("--lexicon", default=settings.LEXICON_DB, help="Database holding dictionary_entries")
+        parser.add_argument("--dims", type=int, default=DIMS)
+        parser.add_argument("--fold", action="store_true", help="Append new chunks and flag deleted ones instead of rebuilding")
+        parser.add_argument("--query", help="Print the nearest chunks/entries for a text")
+        parser.add_argument("-k", type=int, default=10)
+        args = parser.parse_args()
+
+        if not HAS_NUMPY:
+            raise SystemExit("❌ numpy is required for the semantic index (pip install numpy).")
+        if args.query:
+            if not os.path.exists(os.path.join(INDEX_DIR, META_FILE)):
+                raise SystemExit(f"❌ {NOT_BUILT}")
+            for hit in SemanticIndex().query(args.query, args.k):
+                print(f"{hit['score']:.3f}  {hit['kind']:5} {hit['id']}")
+        else:
+            report = RunReport("semantic_index.py")
+            if args.fold and os.path.exists(os.path.join(INDEX_DIR, META_FILE)):
+                fold_in(args.db, dims=args.dims, report=report, lexicon_path=args.lexicon)
+            else:
+                build_index(args.db, dims=args.dims, report=report, lexicon_path=args.lexicon)
+            report.write()
+            report.print_summary()
@@ -0,0 +1,407 @@
+import os
+import json
+import sqlite3
+import asyncio
+import argparse
+import threading
+import mimetypes
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+import settings
+
+# ---------------------------------------------------------
+# Local Query Server
+# ---------------------------------------------------------
+# Serves the portal from docs/ plus a small JSON API read
+# straight from esoteric.db, so local mode fetches pages of
+# rows instead of whole export dumps. Queries run on a pool
+# of read-only connections in worker threads; responses sit
+# in an LRU cache that is flushed whenever PRAGMA
+# data_version reports a commit from another connection.
+# ---------------------------------------------------------
+
+DB_NAME = settings.DB_PATH
+HOST = "127.0.0.1"
+PORT = 8765
+POOL_SIZE = 4
+CACHE_SIZE = 512        # Cached API responses
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# URL prefix -> directory (first match wins)
+STATIC_ROOTS = [("/data/", "data"), ("/assets/", "assets"), ("/", "docs")]
+DOC_FACETS = ["topic", "period", "century", "language", "author"]
+
+ROUTES = {}
+
+def route(path):
+    """Registers a handler(conn, params) -> JSON-able object for an API path."""
+    def wrap(fn):
+        ROUTES[path] = fn
+        return fn
+    return wrap
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def connect_readonly(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # Dictionary entries live in the lexicon database
+    if os.path.exists(settings.LEXICON_DB):
+        conn.execute("ATTACH DATABASE ? AS lexicon", (f"file:{settings.LEXICON_DB}?mode=ro",))
+    return conn
+
+class ConnectionPool:
+    """Fixed set of read-only connections handed to worker threads one at a time."""
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.idle = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(connect_readonly(db_path))
+
+    async def run(self, fn, *args):
+        conn = await self.idle.get()
+        try:
+            return await asyncio.to_thread(fn, conn, *args)
+        finally:
+            self.idle.put_nowait(conn)
+
+class ResponseCache:
+    """LRU of encoded response bodies, valid for one database data_version."""
+    def __init__(self, db_path, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.watcher = connect_readonly(db_path)
+        self.version = self.data_version()
+        self.hits = self.misses = 0
+
+    def data_version(self):
+        return self.watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def validate(self):
+        version = self.data_version()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        body = self.entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, body):
+        self.entries[key] = body
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+# ---------------------------------------------------------
+# Query helpers
+# ---------------------------------------------------------
+
+def param(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+def int_param(params, name, default, maximum=None):
+    try:
+        value = int(param(params, name, default))
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be an integer")
+    return min(value, maximum) if maximum else value
+
+def rows(cursor):
+    return [dict(r) for r in cursor.fetchall()]
+
+def page(items, key, limit):
+    """Keyset page envelope: `next` is the cursor to pass back as ?after=."""
+    return {"items": items, "next": items[-1][key] if len(items) == limit else None}
+
+def fts_query(q):
+    """Quotes each word so user input cannot inject FTS5 syntax."""
+    words = [w for w in q.split() if any(c.isalnum() for c in w)]
+    if not words:
+        raise ApiError(400, "empty query")
+    return " ".join('"' + w.replace('"', '""') + '"' for w in words)
+
+# ---------------------------------------------------------
+# API
+# ---------------------------------------------------------
+
+@route("/api/health")
+def api_health(conn, params):
+    return {"ok": True, "data_version": conn.execute("PRAGMA data_version").fetchone()[0]}
+
+@route("/api/facets")
+def api_facets(conn, params):
+    """Distinct values and counts for each document facet."""
+    out = {}
+    for facet in DOC_FACETS:
+        cur = conn.execute(f'''
+            SELECT {facet} AS value, COUNT(*) AS count FROM documents
+            WHERE {facet} IS NOT NULL AND {facet} != ''
+            GROUP BY {facet} ORDER BY count DESC LIMIT 200
+        ''')
+        out[facet] = rows(cur)
+    return out
+
+@route("/api/docs")
+def api_docs(conn, params):
+    """Documents filtered by facet equality and optional full-text match, keyset-paged on id."""
+    limit = int_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+    where, args = [], []
+    for facet in DOC_FACETS:
+        value = param(params, facet)
+        if value is not None:
+            where.append(f"{facet} = ?")
+            args.append(value)
+    q = param(params, "q")
+    if q:
+        where.append('''(id IN (SELECT c.doc_id FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+                                WHERE chunks_fts MATCH ?)
+                         OR instr(lower(COALESCE(title, filename)), lower(?)) > 0)''')
+        args += [fts_query(q), q]
+    filters = " AND ".join(where) or "1"
+
+    total = conn.execute(f"SELECT COUNT(*) FROM documents WHERE {filters}", args).fetchone()[0]
+    after = param(params, "after", "")
+    cur = conn.execute(f'''
+        SELECT id, filename, title, topic, author, period, century, language, size, summary
+        FROM documents WHERE {filters} AND id > ?
+        ORDER BY id LIMIT ?
+    ''', args + [after, limit])
+    result = page(rows(cur), "id", limit)
+    result["total"] = total
+    return result
+
+@route("/api/search")
+def api_search(conn, params):
+    """Ranked chunk hits with highlighted snippets."""
+    q = param(params, "q") or ""
+    limit = int_param(params, "limit", 20, MAX_LIMIT)
+    cur = conn.execute('''
+        SELECT c.doc_id, COALESCE(NULLIF(d.title, ''), d.filename) AS title, d.path,
+               snippet(chunks_fts, 0, '<mark>', '</mark>', '…', 24) AS snippet
+        FROM chunks_fts
+        JOIN chunks c ON c.id = chunks_fts.rowid
+        LEFT JOIN documents d ON d.id = c.doc_id
+        WHERE chunks_fts MATCH ?
+        ORDER BY rank LIMIT ?
+    ''', (fts_query(q), limit))
+    return {"items": rows(cur)}
+
+@route("/api/chats")
+def api_chats(conn, params):
+    limit = int_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+    cur = conn.execute('''
+        SELECT id, title, topic, created_at FROM chats WHERE id > ? ORDER BY id LIMIT ?
+    ''', (param(params, "after", ""), limit))
+    return page(rows(cur), "id", limit)
+
+@route("/api/messages")
+def api_messages(conn, params):
+    """One chat's messages in order, keyset-paged on order_index."""
+    chat_id = param(params, "chat_id")
+    if not chat_id:
+        raise ApiError(400, "'chat_id' is required")
+    limit = int_param(params, "limit", 200, MAX_LIMIT)
+    cur = conn.execute('''
+        SELECT chat_id, role, content, order_index AS "index" FROM chat_messages
+        WHERE chat_id = ? AND order_index > ?
+        ORDER BY order_index LIMIT ?
+    ''', (chat_id, int_param(params, "after", -1), limit))
+    return page(rows(cur), "index", limit)
+
+@route("/api/entity")
+def api_entity(conn, params):
+    """An entity, its attributes, the documents mentioning it and its most co-mentioned neighbours."""
+    limit = int_param(params, "limit", 25, MAX_LIMIT)
+    if param(params, "id"):
+        entity = conn.execute("SELECT id, name, type FROM entities WHERE id = ?", (int_param(params, "id", 0),)).fetchone()
+    else:
+        entity = conn.execute("SELECT id, name, type FROM entities WHERE name = ?", (param(params, "name"),)).fetchone()
+    if entity is None:
+        raise ApiError(404, "entity not found")
+    eid = entity["id"]
+
+    attributes = {r["key"]: r["value"] for r in conn.execute(
+        "SELECT key, value FROM entity_attributes WHERE entity_id = ?", (eid,))}
+    docs = rows(conn.execute('''
+        SELECT d.id, COALESCE(NULLIF(d.title, ''), d.filename) AS title, d.topic, d.period
+        FROM relationships r JOIN documents d ON d.id = r.source_id
+        WHERE r.target_id = ? GROUP BY d.id ORDER BY d.id LIMIT ?
+    ''', (eid, limit)))
+    neighbours = rows(conn.execute('''
+        SELECT e.id, e.name, e.type, COUNT(DISTINCT r2.source_id) AS shared
+        FROM relationships r1
+        JOIN relationships r2 ON r2.source_id = r1.source_id AND r2.target_id != r1.target_id
+        JOIN entities e ON e.id = r2.target_id
+        WHERE r1.target_id = ?
+        GROUP BY e.id ORDER BY shared DESC, e.name LIMIT ?
+    ''', (eid, limit)))
+    return {"entity": dict(entity), "attributes": attributes, "docs": docs, "neighbours": neighbours}
+
+SEMANTIC = {"index": None, "mtime": None}
+SEMANTIC_LOCK = threading.Lock()
+
+def semantic_index():
+    """The LSA index, loaded on first use and reloaded when its meta.json changes."""
+    import semantic_index as lsa
+    meta_path = os.path.join(lsa.INDEX_DIR, lsa.META_FILE)
+    if not lsa.HAS_NUMPY or not os.path.exists(meta_path):
+        raise ApiError(404, lsa.NOT_BUILT)
+    with SEMANTIC_LOCK:
+        mtime = os.stat(meta_path).st_mtime_ns
+        if SEMANTIC["mtime"] != mtime:
+            SEMANTIC["index"], SEMANTIC["mtime"] = lsa.SemanticIndex(), mtime
+        return SEMANTIC["index"]
+
+@route("/api/semantic")
+def api_semantic(conn, params):
+    """Nearest chunks and dictionary entries by LSA cosine, for ?q= text or a ?chunk= id."""
+    import semantic_index as lsa
+    index = semantic_index()
+    k = int_param(params, "limit", 20, MAX_LIMIT)
+    if param(params, "chunk"):
+        hits = index.similar("chunk", int_param(params, "chunk", 0), k)
+    elif param(params, "q"):
+        hits = index.query(param(params, "q"), k)
+    else:
+        raise ApiError(400, "'q' or 'chunk' is required")
+
+    chunk_ids = [h["id"] for h in hits if h["kind"] == "chunk"]
+    entry_ids = [h["id"] for h in hits if h["kind"] == "entry"]
+    chunks = {r["id"]: r for r in conn.execute(f'''
+        SELECT c.id, c.doc_id, COALESCE(NULLIF(d.title, ''), d.filename) AS title, substr(c.text_content, 1, 240) AS text
+        FROM chunks c LEFT JOIN documents d ON d.id = c.doc_id
+        WHERE c.id IN ({",".join("?" * len(chunk_ids))})
+    ''', chunk_ids)} if chunk_ids else {}
+    entries = {r["id"]: r for r in conn.execute(f'''
+        SELECT id, headword AS title, short_definition AS text FROM lexicon.dictionary_entries
+        WHERE id IN ({",".join("?" * len(entry_ids))})
+    ''', entry_ids)} if entry_ids and lsa.has_entries(conn) else {}
+    items = []
+    for h in hits:
+        row = (chunks if h["kind"] == "chunk" else entries).get(h["id"])
+        if row is not None:
+            items.append({**h, **dict(row)})
+    return {"items": items}
+
+# ---------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+def sqlite_status(error):
+    """HTTP status for an OperationalError: busy/locked is transient, FTS syntax is the client's, the rest is ours."""
+    message = str(error).lower()
+    if "locked" in message or "busy" in message:
+        return 503
+    if "fts5: syntax error" in message or "unterminated string" in message:
+        return 400
+    return 500
+
+def static_file(path):
+    """Resolves a URL path under STATIC_ROOTS, refusing anything outside them."""
+    for prefix, directory in STATIC_ROOTS:
+        if path.startswith(prefix):
+            root = os.path.abspath(directory)
+            rel = unquote(path[len(prefix):]) or "index.html"
+            full = os.path.abspath(os.path.join(root, rel))
+            if full.startswith(root + os.sep) and os.path.isfile(full):
+                return full
+    return None
+
+class QueryServer:
+    def __init__(self, db_path, pool_size=POOL_SIZE, cache_size=CACHE_SIZE):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.cache = ResponseCache(db_path, cache_size)
+
+    async def api(self, path, query):
+        handler = ROUTES.get(path)
+        if handler is None:
+            raise ApiError(404, "unknown endpoint")
+        key = f"{path}?{query}"
+        self.cache.validate()
+        body = self.cache.get(key)
+        if body is None:
+            try:
+                data = await self.pool.run(handler, parse_qs(query))
+            except sqlite3.OperationalError as e:
+                raise ApiError(sqlite_status(e), str(e))
+            body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            self.cache.put(key, body)
+        return body
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Drain headers; no request bodies are accepted
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1]
+            url = urlsplit(target)
+
+            if method not in ("GET", "HEAD"):
+                status, ctype, body = 405, "application/json", b'{"error":"method not allowed"}'
+            elif url.path.startswith("/api/"):
+                try:
+                    status, ctype, body = 200, "application/json", await self.api(url.path, url.query)
+                except ApiError as e:
+                    status, ctype, body = e.status, "application/json", json.dumps({"error": str(e)}).encode("utf-8")
+                except Exception as e:
+                    # A handler bug or a broken index file still gets an answer
+                    print(f"  Error in {url.path}: {e!r}")
+                    status, ctype, body = 500, "application/json", json.dumps({"error": "internal error"}).encode("utf-8")
+            else:
+                full = static_file(url.path)
+                if full is None:
+                    status, ctype, body = 404, "text/plain", b"Not Found"
+                else:
+                    with open(full, "rb") as f:
+                        body = f.read()
+                    status, ctype = 200, mimetypes.guess_type(full)[0] or "application/octet-stream"
+
+            head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+                    f"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            writer.write(head.encode("latin-1"))
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except Exception as e:
+            print(f"  Error serving request: {e}")
+        finally:
+            writer.close()
+
+async def serve(db_path, host=HOST, port=PORT, pool_size=POOL_SIZE):
+    if not os.path.exists(db_path):
+        print(f"Error: Database {db_path} not found.")
+        return
+    app = QueryServer(db_path, pool_size)
+    server = await asyncio.start_server(app.handle, host, port)
+    print(f"Serving docs/ and /api on http://{host}:{port} ({pool_size} read-only connections)")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--pool", type=int, default=POOL_SIZE)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.pool))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,46 @@
+import os
+import json
+
+# ---------------------------------------------------------
+# Shared Settings
+# ---------------------------------------------------------
+# One place for the paths every tool used to hardcode: the
+# main database, the lexicon database, the corpus folders
+# and the chat export folders. Values come from esoteric.json
+# next to this file (or $ESOTERIC_CONFIG) and fall back to
+# the historical defaults, so existing checkouts keep working
+# without a config file. Only stdlib json is imported here.
+# ---------------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.environ.get("ESOTERIC_CONFIG") or os.path.join(BASE_DIR, "esoteric.json")
+
+DEFAULTS = {
+    "db": "esoteric.db",
+    "lexicon_db": "esoteric_v5.db",
+    "library_root": ".",
+    "export_dir": "docs",
+    "corpus_roots": {
+        "Alchemy": r"e:\pdf\alchemy",
+        "Hermetic": r"e:\pdf\hermetic",
+    },
+    "chats_dirs": [
+        r"e:\pdf\esoteric studies chats",
+        "/pdf/esoteric studies chats",
+    ],
+}
+
+def load_settings(path=CONFIG_FILE):
+    settings = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            settings.update(json.load(f))
+    return settings
+
+SETTINGS = load_settings()
+DB_PATH = SETTINGS["db"]
+LEXICON_DB = SETTINGS["lexicon_db"]
+LIBRARY_ROOT = SETTINGS["library_root"]
+EXPORT_DIR = SETTINGS["export_dir"]
+CORPUS_ROOTS = SETTINGS["corpus_roots"]
+CHATS_DIRS = SETTINGS["chats_dirs"]
@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import sqlite3
+import argparse
+from datetime import datetime
+import settings
+
+# ---------------------------------------------------------
+# Delta Snapshots
+# ---------------------------------------------------------
+# Every export records a hash per row of the tables the
+# portal shows. `snapshot_rows` keeps the hashes from the
+# previous snapshot. The current rows and those hashes are
+# both streamed in key order and merged in one pass into
+# added / removed / changed sets. Each snapshot writes only
+# that delta:
+#   data/snapshots/deltas/<id>.json   keys (+ a label) per table
+#   data/snapshots/deltas/index.json  newest-first summaries
+# The portal remembers the last snapshot id it showed and
+# fetches the deltas after it, instead of re-downloading and
+# diffing whole datasets.
+# ---------------------------------------------------------
+
+DELTA_DIR = "data/snapshots/deltas"
+DELTA_KEEP = 60         # Delta files kept; older ones are pruned from disk and index
+LIST_LIMIT = 500        # Keys listed per table/kind in one delta; counts stay exact
+
+# table -> (key column, label expression shown in "what's new")
+SNAPSHOT_TABLES = {
+    "documents": ("id", "COALESCE(NULLIF(title, ''), filename)"),
+    "entities": ("id", "name"),
+    "dictionary_entries": ("id", "headword"),
+    "chats": ("id", "title"),
+    "images": ("id", "doc_id"),
+    "places": ("id", "name"),
+    "reference_sources": ("id", "short_name"),
+    "reference_notes": ("id", "subject_id"),
+}
+
+def init_snapshot_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT,
+        summary TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS snapshot_rows (
+        tbl TEXT,
+        key TEXT,
+        hash TEXT,
+        PRIMARY KEY (tbl, key)
+    )
+    ''')
+    conn.commit()
+
+def current_rows(conn, table, key, label):
+    """(key, hash, label) for every row, ordered by the key as text."""
+    cursor = conn.execute(f'SELECT CAST({key} AS TEXT), {label}, * FROM "{table}" WHERE {key} IS NOT NULL ORDER BY CAST({key} AS TEXT)')
+    for row in cursor:
+        digest = hashlib.sha1(json.dumps(row[2:], default=str, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        yield row[0], digest, row[1]
+
+def previous_rows(conn, table):
+    return conn.execute("SELECT key, hash FROM snapshot_rows WHERE tbl = ? ORDER BY key", (table,))
+
+def merge_diff(current, previous):
+    """One pass over two key-sorted streams: (added, removed, changed), each a list of (key, hash, label)."""
+    added, removed, changed = [], [], []
+    cur = next(current, None)
+    prev = next(previous, None)
+    while cur is not None or prev is not None:
+        if prev is None or (cur is not None and cur[0] < prev[0]):
+            added.append(cur)
+            cur = next(current, None)
+        elif cur is None or prev[0] < cur[0]:
+            removed.append((prev[0], prev[1], None))
+            prev = next(previous, None)
+        else:
+            if cur[1] != prev[1]:
+                changed.append(cur)
+            cur, prev = next(current, None), next(previous, None)
+    return added, removed, changed
+
+def take_snapshot(conn, delta_dir=DELTA_DIR):
+    """Diffs the tracked tables against the last snapshot, stores the new hashes and writes the delta."""
+    init_snapshot_schema(conn)
+    cursor = conn.cursor()
+    existing = {r[0] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    first = cursor.execute("SELECT MAX(id) FROM snapshots").fetchone()[0]
+
+    tables, summary = {}, {}
+    for table, (key, label) in SNAPSHOT_TABLES.items():
+        if table not in existing:
+            continue
+        # Both streams are drained by the merge before the hash table is touched
+        added, removed, changed = merge_diff(current_rows(conn, table, key, label), iter(previous_rows(conn, table)))
+        cursor.executemany("INSERT OR REPLACE INTO snapshot_rows (tbl, key, hash) VALUES (?, ?, ?)",
+                           [(table, k, h) for k, h, _ in added + changed])
+        cursor.executemany("DELETE FROM snapshot_rows WHERE tbl = ? AND key = ?", [(table, k) for k, _, _ in removed])
+        summary[table] = {"added": len(added), "removed": len(removed), "changed": len(changed)}
+        # The first snapshot of a database is a baseline, not news
+        if first is not None and (added or removed or changed):
+            tables[table] = {
+                "counts": summary[table],
+                "added": [[k, lbl] for k, _, lbl in added[:LIST_LIMIT]],
+                "changed": [[k, lbl] for k, _, lbl in changed[:LIST_LIMIT]],
+                "removed": [k for k, _, _ in removed[:LIST_LIMIT]],
+            }
+
+    created_at = datetime.now().isoformat()
+    cursor.execute("INSERT INTO snapshots (created_at, summary) VALUES (?, ?)", (created_at, json.dumps(summary)))
+    snapshot_id = cursor.lastrowid
+    conn.commit()
+
+    delta = {"id": snapshot_id, "from": first, "created_at": created_at, "tables": tables}
+    write_delta(delta, summary, delta_dir)
+    return delta
+
+def save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, path)
+
+def write_delta(delta, summary, delta_dir=DELTA_DIR):
+    os.makedirs(delta_dir, exist_ok=True)
+    save_json(os.path.join(delta_dir, f"{delta['id']}.json"), delta)
+
+    index_path = os.path.join(delta_dir, "index.json")
+    index = {"latest": None, "deltas": []}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    changes = {t: summary[t] for t in delta["tables"]}
+    index["deltas"] = [{"id": delta["id"], "from": delta["from"], "created_at": delta["created_at"], "changes": changes}] + index["deltas"]
+    for stale in index["deltas"][DELTA_KEEP:]:
+        path = os.path.join(delta_dir, f"{stale['id']}.json")
+        if os.path.exists(path):
+            os.remove(path)
+    index["deltas"] = index["deltas"][:DELTA_KEEP]
+    index["latest"] = delta["id"]
+    save_json(index_path, index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a snapshot of the portal tables and write its delta")
+    parser.add_argument("--db", default=settings.DB_PATH)
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db)
+    delta = take_snapshot(conn)
+    conn.close()
+    for table, change in delta["tables"].items():
+        counts = change["counts"]
+        print(f"  {table}: +{counts['added']} ~{counts['changed']} -{counts['removed']}")
+    print(f"📸 Snapshot #{delta['id']} (since #{delta['from']}) -> {DELTA_DIR}/{delta['id']}.json")